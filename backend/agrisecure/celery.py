@@ -3,8 +3,12 @@ AgriSecure IoT System - Celery Configuration
 """
 
 import os
+import time
+from datetime import datetime
+
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import before_task_publish, task_postrun, task_prerun, worker_process_init
 
 # Set default Django settings
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'agrisecure.settings')
@@ -26,6 +30,18 @@ app.conf.beat_schedule = {
         'schedule': 300.0,  # 5 minuti
     },
     
+    # Profondità delle code Celery ogni minuto
+    'record-queue-depths': {
+        'task': 'apps.core.tasks.record_queue_depths',
+        'schedule': 60.0,
+    },
+    
+    # Riallineamento contatori dashboard ogni 10 minuti
+    'reconcile-dashboard-counters': {
+        'task': 'apps.core.tasks.reconcile_dashboard_counters',
+        'schedule': 600.0,  # 10 minuti
+    },
+    
     # Report giornaliero alle 8:00
     'daily-report': {
         'task': 'apps.notifications.tasks.send_daily_report',
@@ -43,11 +59,65 @@ app.conf.beat_schedule = {
         'task': 'apps.sensors.tasks.aggregate_hourly_data',
         'schedule': crontab(minute=5),  # 5 minuti dopo ogni ora
     },
+    
+    # Aggregati giornalieri (dagli orari) alle 00:20, prima del report
+    'aggregate-daily-sensor-data': {
+        'task': 'apps.sensors.tasks.aggregate_daily_data',
+        'schedule': crontab(hour=0, minute=20),
+    },
 }
 
 app.conf.timezone = 'Europe/Rome'
 
 
+@worker_process_init.connect
+def reset_notification_clients(**kwargs):
+    # Ogni processo figlio apre il proprio pool di connessioni HTTP
+    from apps.notifications import http
+    http.reset()
+
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
+
+
+# ===========================================
+# Metriche per coda
+# ===========================================
+
+# Bucket (secondi) della latenza di coda: attesa tra pubblicazione ed esecuzione
+QUEUE_LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 30, 300)
+
+
+@before_task_publish.connect
+def stamp_publish_time(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('published_at', time.time())
+
+
+@task_prerun.connect
+def record_queue_latency(task=None, **kwargs):
+    from apps.core import metrics
+    
+    published_at = getattr(task.request, 'published_at', None)
+    if published_at is None:
+        return
+    
+    # Per i task con countdown/eta la latenza parte dall'orario previsto
+    eta = task.request.eta
+    if eta:
+        try:
+            published_at = max(published_at, datetime.fromisoformat(eta).timestamp())
+        except (TypeError, ValueError):
+            pass
+    
+    queue = (task.request.delivery_info or {}).get('routing_key') or 'default'
+    latency = max(0.0, time.time() - published_at)
+    metrics.observe(f"celery.{queue}.latency", latency, QUEUE_LATENCY_BUCKETS)
+
+
+@task_postrun.connect
+def flush_task_metrics(**kwargs):
+    from apps.core import metrics
+    metrics.flush_if_due()
@@ -1,238 +1,452 @@
 """
 WebSocket Consumers for AgriSecure Real-Time Updates
 """
+import asyncio
 import json
+import logging
+import time
+from collections import deque
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.utils import timezone
-from datetime import timedelta
+from django.conf import settings
+
+from apps.core import metrics
+from apps.core.jsonpatch import make_patch
+
+logger = logging.getLogger('agrisecure')
+
+
+class BackpressureMixin:
+    """
+    Per-connection bounded outbound queue
+
+    Group handlers enqueue messages and return immediately, so a slow
+    client never stalls the consumer or its channel layer inbox. A writer
+    task drains the queue to the socket.
+
+    - Messages with a `key` are snapshots: a newer one replaces the queued
+      one with the same key (coalesced).
+    - When the queue is full the oldest droppable message is dropped.
+      Messages enqueued with droppable=False (alarm events) are never
+      dropped, even past the bound.
+    - A client whose queue stays full for WEBSOCKET_SLOW_CLIENT_TIMEOUT
+      seconds is disconnected (close code 4008) and can reconnect to a
+      fresh snapshot. Droppable messages are discarded, the alarm events
+      still queued are sent before the close.
+    - A failed send closes the connection (the client reconnects).
+    """
+
+    SLOW_CLIENT_CLOSE_CODE = 4008
+    SEND_FAILED_CLOSE_CODE = 1011
+
+    def start_outbound(self):
+        """Create the queue and start the writer task (after accept)"""
+        self.outbound_size = getattr(settings, 'WEBSOCKET_OUTBOUND_QUEUE_SIZE', 32)
+        self.slow_client_timeout = getattr(settings, 'WEBSOCKET_SLOW_CLIENT_TIMEOUT', 30)
+        self._outbound = deque()
+        self._outbound_ready = asyncio.Event()
+        self._behind_since = None
+        self._close_code = None
+        self._writer = asyncio.ensure_future(self._outbound_writer())
+
+    async def stop_outbound(self):
+        """Stop the writer task (on disconnect)"""
+        writer = getattr(self, '_writer', None)
+        if writer is not None:
+            writer.cancel()
+            self._writer = None
+
+    def enqueue(self, message, key=None, droppable=True):
+        """Queue a message for the client without waiting for the socket"""
+        queue = self._outbound
+        if self._close_code is not None and droppable:
+            # Closing: only alarm events are still delivered
+            return
+
+        if key is not None:
+            for index, (queued_key, _message, _droppable) in enumerate(queue):
+                if queued_key == key:
+                    del queue[index]
+                    metrics.incr('ws.frames.coalesced')
+                    break
+
+        if len(queue) >= self.outbound_size:
+            for index, (_key, _message, queued_droppable) in enumerate(queue):
+                if queued_droppable:
+                    del queue[index]
+                    metrics.incr('ws.frames.dropped')
+                    break
+            else:
+                # Only alarm events queued: the incoming droppable message
+                # is the one to drop, the queue does not grow
+                if droppable:
+                    metrics.incr('ws.frames.dropped')
+                    self._check_behind()
+                    return
+
+        queue.append((key, message, droppable))
+        self._outbound_ready.set()
+        self._check_behind()
+
+    def _check_behind(self):
+        """Track how long the queue has been full and drop stuck clients"""
+        if len(self._outbound) < self.outbound_size:
+            self._behind_since = None
+            return
+
+        now = time.monotonic()
+        if self._behind_since is None:
+            self._behind_since = now
+        elif now - self._behind_since > self.slow_client_timeout and self._close_code is None:
+            self._behind_since = None
+            kept = [entry for entry in self._outbound if not entry[2]]
+            metrics.incr('ws.frames.dropped', len(self._outbound) - len(kept))
+            self._outbound = deque(kept)
+            metrics.incr('ws.clients.disconnected_slow')
+            # The writer drains the alarm events, then closes
+            self._close_code = self.SLOW_CLIENT_CLOSE_CODE
+            self._outbound_ready.set()
+
+    def render_outbound(self, key, message):
+        """Encode a queued message; return None to skip it"""
+        return json.dumps(message)
+
+    async def _close_quietly(self, code=None):
+        try:
+            await self.close(code=code)
+        except Exception as e:
+            logger.debug(f"WebSocket close failed: {e}")
+
+    async def _outbound_writer(self):
+        while True:
+            await self._outbound_ready.wait()
+            self._outbound_ready.clear()
+
+            while self._outbound:
+                key, message, _droppable = self._outbound.popleft()
+                text = self.render_outbound(key, message)
+                if text is None:
+                    continue
+                try:
+                    await self.send(text_data=text)
+                except Exception as e:
+                    logger.warning(f"WebSocket send failed, closing connection: {e}")
+                    metrics.incr('ws.frames.send_failed')
+                    self._outbound.clear()
+                    self._close_code = self.SEND_FAILED_CLOSE_CODE
+                    await self._close_quietly(self._close_code)
+                    return
+                metrics.incr('ws.frames.sent')
+
+            if self._close_code is not None:
+                await self._close_quietly(self._close_code)
+                return
+            self._check_behind()
+
+            if metrics.is_flush_due():
+                await sync_to_async(metrics.flush)()
+
+
+class DashboardConsumer(BackpressureMixin, AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for Dashboard real-time updates
 
+    Protocol modes (query string `?mode=`):
+    - full (default): every update carries the whole snapshot
+      {'type': 'dashboard_update', 'data': {...}}
+    - delta: the first message is a full snapshot, then only JSON-patch
+      operations against the last snapshot sent to this client
+      {'type': 'dashboard_patch', 'seq': n, 'ops': [...]}
+      Every message carries a sequence number; on a gap the client sends
+      {'action': 'resync'} and receives a full snapshot.
+
+    Patches are computed when a message leaves the outbound queue, so
+    coalesced or dropped snapshots never cause a sequence gap. A snapshot
+    that differs only in its generation timestamp is not sent.
+    """
+
+    MODE_FULL = 'full'
+    MODE_DELTA = 'delta'
+
+    # Snapshot fields that change on every tick and never justify a patch
+    VOLATILE_PATHS = ('/timestamp',)
 
-class DashboardConsumer(AsyncWebsocketConsumer):
-    """WebSocket consumer for Dashboard real-time updates"""
-    
     async def connect(self):
         """Handle WebSocket connection"""
         # Join dashboard group
         self.group_name = 'dashboard_updates'
-        
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.mode = self.MODE_DELTA if query.get('mode') == [self.MODE_DELTA] else self.MODE_FULL
+        self.seq = 0
+        self.last_snapshot = None
+        self.full_requested = True
+
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
         )
-        
+
         await self.accept()
-        
+        self.start_outbound()
+
         # Send initial data
         initial_data = await self.get_dashboard_data()
-        await self.send(text_data=json.dumps({
-            'type': 'dashboard_update',
-            'data': initial_data
-        }))
-    
+        self.enqueue_snapshot(initial_data)
+
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
+        await self.stop_outbound()
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
-    
+
     async def receive(self, text_data):
         """Handle messages from WebSocket client"""
         try:
             data = json.loads(text_data)
-            
-            # Client can request refresh
-            if data.get('action') == 'refresh':
+
+            # Client can request refresh (or resync after a sequence gap)
+            if data.get('action') in ('refresh', 'resync'):
+                self.full_requested = True
                 dashboard_data = await self.get_dashboard_data()
-                await self.send(text_data=json.dumps({
-                    'type': 'dashboard_update',
-                    'data': dashboard_data
-                }))
+                self.enqueue_snapshot(dashboard_data)
         except json.JSONDecodeError:
             pass
-    
+
     async def dashboard_update(self, event):
-        """Receive update from group and send to WebSocket"""
-        await self.send(text_data=json.dumps({
-            'type': 'dashboard_update',
-            'data': event['data']
-        }))
-    
+        """Receive update from group and queue it for the WebSocket"""
+        self.enqueue_snapshot(event['data'])
+
+    def enqueue_snapshot(self, data):
+        """Queue a snapshot, replacing any not yet sent"""
+        self.enqueue({'type': 'dashboard_update', 'data': data}, key='dashboard')
+
+    def render_outbound(self, key, message):
+        if key != 'dashboard' or self.mode != self.MODE_DELTA:
+            return super().render_outbound(key, message)
+
+        data = message['data']
+        if self.last_snapshot is not None and not self.full_requested:
+            ops = make_patch(self.last_snapshot, data)
+            if all(op['path'] in self.VOLATILE_PATHS for op in ops):
+                # Only the generation time changed: nothing to send. The
+                # base is kept, so the next patch carries the new timestamp
+                return None
+            self.seq += 1
+            self.last_snapshot = data
+            return json.dumps({
+                'type': 'dashboard_patch',
+                'seq': self.seq,
+                'ops': ops
+            })
+
+        # Full snapshot: becomes the delta base
+        self.full_requested = False
+        self.seq += 1
+        self.last_snapshot = data
+        return json.dumps(dict(message, seq=self.seq))
+
     @database_sync_to_async
     def get_dashboard_data(self):
-        """Get dashboard data from database"""
-        from apps.nodes.models import Node
-        from apps.security.models import Alarm, SystemArmState
-        from apps.sensors.models import SensorReading
-        
-        now = timezone.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Node stats
-        nodes = Node.objects.all()
-        total_nodes = nodes.count()
-        nodes_online = nodes.filter(status='online').count()
-        nodes_offline = nodes.filter(status='offline').count()
-        
-        # Alarm stats
-        active_alarms = Alarm.objects.filter(status__in=['active', 'acknowledged']).count()
-        alarms_today = Alarm.objects.filter(triggered_at__gte=today_start).count()
-        
-        # Recent alarms
-        recent_alarms = []
-        for alarm in Alarm.objects.filter(
-            status__in=['active', 'acknowledged']
-        ).select_related('node').order_by('-triggered_at')[:5]:
-            recent_alarms.append({
-                'id': alarm.id,
-                'priority': alarm.priority,
-                'classification': alarm.classification,
-                'node_name': alarm.node.name if alarm.node.name else alarm.node.node_id,
-                'triggered_at': alarm.triggered_at.strftime('%d/%m/%Y %H:%M'),
-                'status': alarm.status,
-            })
-        
-        # Arm state
-        arm_state = SystemArmState.objects.order_by('-timestamp').first()
-        system_armed = arm_state and arm_state.mode != 'disarmed' if arm_state else False
-        arm_mode = arm_state.mode if arm_state else None
-        
-        # Latest sensor readings
-        latest_reading = SensorReading.objects.order_by('-timestamp').first()
-        latest_temperature = float(latest_reading.temperature) if latest_reading and latest_reading.temperature else None
-        latest_humidity = float(latest_reading.humidity) if latest_reading and latest_reading.humidity else None
-        latest_soil = float(latest_reading.soil_moisture_percent) if latest_reading and latest_reading.soil_moisture_percent else None
-        
-        # Battery warnings
-        battery_warnings = nodes.filter(
-            battery_percentage__lt=20, 
-            battery_percentage__isnull=False
-        ).count()
-        
-        return {
-            'nodes': {
-                'total': total_nodes,
-                'online': nodes_online,
-                'offline': nodes_offline,
-            },
-            'alarms': {
-                'active': active_alarms,
-                'today': alarms_today,
-                'recent': recent_alarms,
-            },
-            'system': {
-                'armed': system_armed,
-                'arm_mode': arm_mode,
-            },
-            'sensors': {
-                'temperature': latest_temperature,
-                'humidity': latest_humidity,
-                'soil_moisture': latest_soil,
-            },
-            'battery_warnings': battery_warnings,
-            'timestamp': now.isoformat(),
-        }
-
-
-class AlarmsConsumer(AsyncWebsocketConsumer):
-    """WebSocket consumer for Alarms page real-time updates"""
-    
+        """Get dashboard data from counters and latest rows"""
+        from apps.core.dashboard import get_dashboard_data
+        return get_dashboard_data()
+
+
+class AlarmsConsumer(BackpressureMixin, AsyncWebsocketConsumer):
+    """
+    WebSocket consumer for Alarms page real-time updates
+
+    Stats are snapshots and may be coalesced; alarm events are never dropped.
+    """
+
     async def connect(self):
         """Handle WebSocket connection"""
         # Join alarms group
         self.group_name = 'alarms_updates'
-        
+
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
         )
-        
+
         await self.accept()
-        
+        self.start_outbound()
+
         # Send initial stats
         stats = await self.get_alarms_stats()
-        await self.send(text_data=json.dumps({
+        self.enqueue({
             'type': 'stats_update',
             'stats': stats
-        }))
-    
+        }, key='stats')
+
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection"""
+        await self.stop_outbound()
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
-    
+
     async def receive(self, text_data):
         """Handle messages from WebSocket client"""
         try:
             data = json.loads(text_data)
-            
+
             # Client can request refresh
             if data.get('action') == 'refresh':
                 stats = await self.get_alarms_stats()
-                await self.send(text_data=json.dumps({
+                self.enqueue({
                     'type': 'stats_update',
                     'stats': stats
-                }))
+                }, key='stats')
             elif data.get('action') == 'refresh_table':
                 # Client requests full table refresh
-                await self.send(text_data=json.dumps({
+                self.enqueue({
                     'type': 'table_refresh',
                     'message': 'refresh_required'
-                }))
+                }, key='table_refresh')
         except json.JSONDecodeError:
             pass
-    
+
     async def alarm_new(self, event):
         """New alarm notification"""
-        await self.send(text_data=json.dumps({
+        self.enqueue({
             'type': 'alarm_new',
             'alarm': event['alarm']
-        }))
-    
+        }, droppable=False)
+
     async def alarm_update(self, event):
         """Alarm status update notification"""
-        await self.send(text_data=json.dumps({
+        self.enqueue({
             'type': 'alarm_update',
             'alarm_id': event['alarm_id'],
             'status': event['status']
-        }))
-    
+        }, droppable=False)
+
     async def stats_update(self, event):
         """Stats update from group"""
-        await self.send(text_data=json.dumps({
+        self.enqueue({
             'type': 'stats_update',
             'stats': event['stats']
-        }))
-    
+        }, key='stats')
+
     @database_sync_to_async
     def get_alarms_stats(self):
         """Get alarms statistics"""
-        from apps.security.models import Alarm
-        from datetime import timedelta
-        
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        
-        stats = {
-            'active': Alarm.objects.filter(status='active').count(),
-            'acknowledged': Alarm.objects.filter(status='acknowledged').count(),
-            'resolved': Alarm.objects.filter(
-                status='resolved',
-                resolved_at__gte=thirty_days_ago
-            ).count(),
-        }
-        
-        # Calculate false positive rate
-        total = Alarm.objects.filter(triggered_at__gte=thirty_days_ago).count()
-        if total > 0:
-            false_positives = Alarm.objects.filter(
-                triggered_at__gte=thirty_days_ago,
-                status='false_pos'
-            ).count()
-            stats['false_positive_rate'] = round((false_positives / total) * 100, 1)
-        else:
-            stats['false_positive_rate'] = 0
-        
-        return stats
+        from apps.core.dashboard import get_alarms_stats
+        return get_alarms_stats()
+
+
+class NodeConsumer(BackpressureMixin, AsyncWebsocketConsumer):
+    """
+    WebSocket consumer streaming live readings and heartbeats of one node
+
+    Optional per-client server-side reduction (query string):
+    - min_interval=<seconds>: at most one reading per interval (throttling)
+    - every=<n>: forward one reading out of n (decimation)
+    Heartbeats are low-rate and always forwarded.
+    """
+
+    async def connect(self):
+        """Handle WebSocket connection"""
+        from apps.core.realtime import node_group_name
+
+        self.node_id = self.scope['url_route']['kwargs']['node_id']
+        node = await self.get_node_state()
+        if node is None:
+            await self.close(code=4404)
+            return
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.min_interval = self._query_number(query, 'min_interval', float, 0.0)
+        self.every = max(self._query_number(query, 'every', int, 1), 1)
+        self.readings_seen = 0
+        self.last_sent = None
+
+        # Join the node group: fan-out only reaches clients watching this node
+        self.group_name = node_group_name(self.node_id)
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+
+        await self.accept()
+        self.start_outbound()
+
+        self.enqueue({
+            'type': 'node_state',
+            'node': node
+        }, key='node_state')
+
+    async def disconnect(self, close_code):
+        """Handle WebSocket disconnection"""
+        await self.stop_outbound()
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name
+            )
+
+    async def receive(self, text_data):
+        """Handle messages from WebSocket client"""
+        try:
+            data = json.loads(text_data)
+
+            if data.get('action') == 'refresh':
+                node = await self.get_node_state()
+                self.enqueue({
+                    'type': 'node_state',
+                    'node': node
+                }, key='node_state')
+        except json.JSONDecodeError:
+            pass
+
+    async def node_reading(self, event):
+        """New reading for this node"""
+        self.readings_seen += 1
+        if (self.readings_seen - 1) % self.every:
+            return
+
+        now = time.monotonic()
+        if self.min_interval and self.last_sent is not None \
+                and now - self.last_sent < self.min_interval:
+            return
+        self.last_sent = now
+
+        self.enqueue({
+            'type': 'node_reading',
+            'reading': event['reading']
+        })
+
+    async def node_heartbeat(self, event):
+        """New heartbeat for this node"""
+        self.enqueue({
+            'type': 'node_heartbeat',
+            'heartbeat': event['heartbeat']
+        }, key='heartbeat')
+
+    @staticmethod
+    def _query_number(query, name, cast, default):
+        try:
+            return cast(query[name][0])
+        except (KeyError, IndexError, ValueError):
+            return default
+
+    @database_sync_to_async
+    def get_node_state(self):
+        """Get current node state, None if the node does not exist"""
+        from apps.nodes.models import Node
+
+        node = Node.objects.filter(node_id=self.node_id).values(
+            'node_id', 'name', 'node_type', 'status', 'last_seen',
+            'battery_percentage', 'rssi', 'uptime_seconds', 'mesh_neighbors'
+        ).first()
+        if node and node['last_seen']:
+            node['last_seen'] = node['last_seen'].isoformat()
+        return node
@@ -7,4 +7,5 @@ from . import consumers
 websocket_urlpatterns = [
     re_path(r'ws/dashboard/$', consumers.DashboardConsumer.as_asgi()),
     re_path(r'ws/alarms/$', consumers.AlarmsConsumer.as_asgi()),
+    re_path(r'ws/nodes/(?P<node_id>[\w.-]+)/$', consumers.NodeConsumer.as_asgi()),
 ]
@@ -204,6 +204,38 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
+# Code separate per priorità: un report o una pulizia lunga non ritarda
+# mai le notifiche di allarme (worker dedicati in scripts/install.sh)
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'apps.notifications.tasks.send_alarm_notification': {'queue': 'alarms'},
+    'apps.notifications.tasks.send_alarm_channel': {'queue': 'alarms'},
+    'apps.notifications.tasks.send_alarm_digest': {'queue': 'alarms'},
+    'apps.notifications.tasks.notify_offline_nodes': {'queue': 'alarms'},
+    'apps.notifications.tasks.notify_outbox_dead': {'queue': 'alarms'},
+    'apps.notifications.tasks.send_daily_report': {'queue': 'reports'},
+    'apps.notifications.tasks.cleanup_old_data': {'queue': 'maintenance'},
+    'apps.sensors.tasks.*': {'queue': 'maintenance'},
+    'apps.core.tasks.reconcile_dashboard_counters': {'queue': 'maintenance'},
+}
+# Un task alla volta per processo: i task lunghi non trattengono messaggi
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Outbox transazionale (manage.py outbox_relay)
+OUTBOX = {
+    'BATCH_SIZE': int(os.environ.get('OUTBOX_BATCH_SIZE', 100)),
+    'POLL_INTERVAL': float(os.environ.get('OUTBOX_POLL_INTERVAL', 0.5)),
+    'MAX_ATTEMPTS': 20,             # Poi il messaggio resta in tabella come scartato
+    'MQTT_ACK_TIMEOUT': 5,          # Attesa massima degli ack MQTT per blocco (secondi)
+    'RETENTION_DAYS': 7,            # Messaggi consegnati conservati per audit
+}
+
+# Ingestione massiva letture (POST /api/v1/sensors/readings/bulk/)
+SENSOR_INGEST = {
+    'MAX_ROWS': int(os.environ.get('SENSOR_INGEST_MAX_ROWS', 50000)),
+    'BATCH_SIZE': 5000,             # Righe per INSERT multi-valore
+}
+
 # ===========================================
 # MQTT Configuration
 # ===========================================
@@ -214,6 +246,7 @@ MQTT_CONFIG = {
     'PASSWORD': os.environ.get('MQTT_PASSWORD', ''),
     'KEEPALIVE': 60,
     'QOS': 1,
+    'DEDUP_CACHE_SIZE': 10000,      # Chiavi (nodo, timestamp) ricordate contro i replay
     'TOPICS': {
         'ROOT': 'agrisecure',
         'SENSORS': 'agrisecure/+/sensors/#',
@@ -247,6 +280,11 @@ TELEGRAM_CONFIG = {
     'CHAT_ID': os.environ.get('TELEGRAM_CHAT_ID', ''),
 }
 
+# Pool HTTP condiviso dai canali di notifica (connessioni per host)
+NOTIFICATION_HTTP = {
+    'POOL_SIZE': int(os.environ.get('NOTIFICATION_HTTP_POOL_SIZE', 10)),
+}
+
 # Email
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
@@ -372,6 +410,14 @@ CHANNEL_LAYERS = {
 WEBSOCKET_ACCEPT_ALL = False
 WEBSOCKET_HEARTBEAT_INTERVAL = 30
 
+# Intervallo minimo (secondi) tra due broadcast sullo stesso gruppo
+WEBSOCKET_BROADCAST_INTERVAL = float(os.environ.get('WEBSOCKET_BROADCAST_INTERVAL', 1.0))
+
+# Coda di uscita per connessione: messaggi in attesa prima dello scarto
+WEBSOCKET_OUTBOUND_QUEUE_SIZE = int(os.environ.get('WEBSOCKET_OUTBOUND_QUEUE_SIZE', 32))
+# Secondi con coda piena prima di disconnettere un client lento
+WEBSOCKET_SLOW_CLIENT_TIMEOUT = int(os.environ.get('WEBSOCKET_SLOW_CLIENT_TIMEOUT', 30))
+
 # ============================================================
 # Channels Configuration
 # ============================================================
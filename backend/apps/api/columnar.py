@@ -0,0 +1,117 @@
+"""
+AgriSecure IoT System - Formato colonnare per le serie temporali
+
+Con `?format=columnar` (JSON) o `?format=columnar-msgpack` (binario) le
+serie temporali vengono restituite come un array per campo invece di
+un oggetto per riga:
+
+    {
+        "count": 3,
+        "time": {"field": "timestamp", "unit": "ms",
+                 "base": 1718000000000, "deltas": [0, 60000, 60000]},
+        "columns": {
+            "node_id": {"dict": ["AMB-01"], "codes": [0, 0, 0]},
+            "temperature": [21.5, 21.6, null]
+        }
+    }
+
+- Il tempo è in millisecondi epoch, codificato a delta rispetto alla
+  riga precedente (base = prima riga)
+- Le colonne di stringhe con pochi valori distinti (node_id,
+  node_name, stati) sono codificate a dizionario
+- I decimali sono numeri, non stringhe
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+FORMATS = ('columnar', 'columnar-msgpack')
+
+
+def requested(request):
+    """True se il client ha negoziato un formato colonnare"""
+    renderer = getattr(request, 'accepted_renderer', None)
+    return getattr(renderer, 'format', None) in FORMATS
+
+
+def _epoch_ms(value):
+    return int(value.timestamp() * 1000)
+
+
+def _time_column(field, values):
+    deltas = []
+    base = previous = None
+    for value in values:
+        if value is None:
+            deltas.append(None)
+            continue
+        current = _epoch_ms(value)
+        if base is None:
+            base = previous = current
+        deltas.append(current - previous)
+        previous = current
+    return {'field': field, 'unit': 'ms', 'base': base, 'deltas': deltas}
+
+
+def _column(values):
+    sample = next((v for v in values if v is not None), None)
+    if isinstance(sample, Decimal):
+        return [float(v) if v is not None else None for v in values]
+    if isinstance(sample, datetime):
+        return [_epoch_ms(v) if v is not None else None for v in values]
+    if isinstance(sample, str):
+        distinct = {}
+        codes = [distinct.setdefault(v, len(distinct)) if v is not None else None for v in values]
+        if len(distinct) * 2 <= len(values):
+            return {'dict': list(distinct), 'codes': codes}
+    return list(values)
+
+
+def encode(columns, time_field=None):
+    """
+    Colonne (nome -> lista di valori grezzi) -> payload colonnare
+
+    Args:
+        columns: dict ordinato di liste della stessa lunghezza
+        time_field: colonna temporale da codificare a delta (opzionale)
+    """
+    count = len(next(iter(columns.values()), []))
+    payload = {'count': count}
+    if time_field is not None and time_field in columns:
+        payload['time'] = _time_column(time_field, columns[time_field])
+    payload['columns'] = {
+        name: _column(values)
+        for name, values in columns.items()
+        if name != time_field
+    }
+    return payload
+
+
+def from_rows(rows, fields, time_field=None):
+    """
+    Righe values() -> payload colonnare
+
+    Args:
+        rows: lista di dict
+        fields: lista di (nome in output, chiave della riga)
+    """
+    rows = list(rows)
+    columns = {name: [row[key] for row in rows] for name, key in fields}
+    return encode(columns, time_field)
+
+
+def renderer_classes():
+    """Renderer predefiniti più quelli colonnari"""
+    from rest_framework.settings import api_settings
+    from .renderers import ColumnarJSONRenderer, ColumnarMsgPackRenderer
+    return list(api_settings.DEFAULT_RENDERER_CLASSES) + [ColumnarJSONRenderer, ColumnarMsgPackRenderer]
+
+
+class ColumnarMixin:
+    """Abilita i formati colonnari per le sole azioni in `columnar_actions`"""
+    columnar_actions = ()
+
+    def get_renderers(self):
+        if self.action in self.columnar_actions:
+            return [renderer() for renderer in renderer_classes()]
+        return super().get_renderers()
@@ -0,0 +1,127 @@
+"""
+AgriSecure IoT System - Richieste condizionali e cache delle risposte
+
+Decoratore per i metodi delle view in polling (dashboard, nodi,
+allarmi attivi): calcola ETag e Last-Modified dalle versioni delle
+risorse (apps.core.versions) prima di eseguire la view.
+
+- If-None-Match / If-Modified-Since invariati: 304 senza query
+- cache_response=True: il corpo della risposta viene salvato in Redis con
+  chiave legata all'ETag, quindi ogni bump delle versioni lo invalida
+  (le voci vecchie scadono da sole dopo `timeout` secondi)
+
+Il decoratore va applicato ai metodi get/list/action: autenticazione,
+permessi e throttling di DRF sono già stati verificati.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.core import versions
+
+CACHE_PREFIX = 'agrisecure:api:'
+
+
+def _etag(request, token, bucket):
+    parts = [request.get_full_path(), getattr(request.accepted_renderer, 'format', ''), token]
+    if bucket:
+        parts.append(str(int(time.time() // bucket)))
+    digest = hashlib.sha1('|'.join(parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def _last_modified(changed_at):
+    """
+    Last-Modified sicuro alla risoluzione del secondo
+
+    Il secondo successivo alla modifica viene dichiarato solo quando è
+    già trascorso: una scrittura successiva avrà timestamp maggiore e
+    non potrà essere nascosta da un If-Modified-Since.
+    """
+    second = int(changed_at)
+    if time.time() >= second + 1:
+        second += 1
+    return second
+
+
+def _not_modified(request, etag, changed_at):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        return etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+    if changed_at is not None:
+        since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return since is not None and changed_at < since
+    return False
+
+
+def conditional(*resources, cache_response=False, timeout=60, bucket=None):
+    """
+    Args:
+        resources: versioni da cui dipende la risposta (apps.core.versions)
+        cache_response: salva il corpo della risposta in Redis
+        timeout: durata massima della voce in cache (secondi)
+        bucket: per dati che invecchiano col tempo (finestre "ultime N
+            ore"), l'ETag cambia comunque ogni `bucket` secondi
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            state = versions.get(*resources)
+            if state is None:
+                return method(self, request, *args, **kwargs)
+
+            token, changed_at = state
+            etag = _etag(request, token, bucket)
+            if bucket:
+                # Con la finestra mobile Last-Modified non è significativo
+                changed_at = None
+
+            headers = {'ETag': etag}
+            if changed_at is not None:
+                headers['Last-Modified'] = http_date(_last_modified(changed_at))
+
+            if _not_modified(request, etag, changed_at):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            else:
+                key = CACHE_PREFIX + etag.strip('"')
+                data = cache.get(key) if cache_response else None
+                if data is not None:
+                    response = Response(data, headers=headers)
+                else:
+                    response = method(self, request, *args, **kwargs)
+                    if response.status_code != status.HTTP_200_OK:
+                        return response
+                    if cache_response:
+                        cache.set(key, response.data, timeout)
+                    for name, value in headers.items():
+                        response[name] = value
+
+            # Il client deve sempre rivalidare (l'ETag rende la verifica economica)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+class VersionedWriteMixin:
+    """Incrementa `version_resources` dopo create/update/destroy del ViewSet"""
+    version_resources = ()
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        versions.bump(*self.version_resources)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        versions.bump(*self.version_resources)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        versions.bump(*self.version_resources)
@@ -0,0 +1,234 @@
+"""
+AgriSecure IoT System - Export dati storici
+
+Generatori di export a memoria costante: le righe vengono lette dal
+database con un cursore server-side (iterator) e codificate a blocchi in
+NDJSON, CSV o Parquet, pronte per una StreamingHttpResponse.
+"""
+
+import csv
+import io
+import json
+import zlib
+from decimal import Decimal
+
+from django.db import models
+
+from apps.nodes.models import NodeHeartbeat
+from apps.security.models import SecurityEvent
+from apps.sensors.models import SensorReading
+
+# Righe lette dal cursore server-side per ogni fetch
+CHUNK_SIZE = 5000
+
+# Dimensione minima dei blocchi inviati al client (byte)
+FLUSH_BYTES = 256 * 1024
+
+# Dataset esportabili: nome nell'URL -> modello
+DATASETS = {
+    'readings': SensorReading,
+    'security-events': SecurityEvent,
+    'heartbeats': NodeHeartbeat,
+}
+
+
+def columns(model, fields=None):
+    """
+    Colonne esportate: (nome, lookup, campo del modello)
+
+    La FK al nodo viene esportata come node_id leggibile.
+
+    Args:
+        fields: nomi delle colonne da esportare (None = tutte)
+    """
+    result = []
+    for field in model._meta.concrete_fields:
+        if field.name == 'node':
+            result.append(('node_id', 'node__node_id', field))
+        else:
+            result.append((field.name, field.name, field))
+    if fields is not None:
+        result = [column for column in result if column[0] in fields]
+    return result
+
+
+def rows(queryset, cols):
+    """Tuple di valori in ordine (timestamp, id) via cursore server-side"""
+    lookups = [lookup for _name, lookup, _field in cols]
+    return queryset.order_by('timestamp', 'id').values_list(*lookups).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _converter(field, json_as_text=False):
+    """
+    Conversione di un valore del database in un tipo JSON/CSV
+
+    Args:
+        json_as_text: JSONField serializzati come testo JSON (CSV)
+    """
+    if isinstance(field, models.DecimalField):
+        return lambda value: float(value) if value is not None else None
+    if isinstance(field, models.DateTimeField):
+        return lambda value: value.isoformat() if value is not None else None
+    if json_as_text and isinstance(field, models.JSONField):
+        # JSON valido nel CSV, non la repr Python del dict
+        return lambda value: json.dumps(value) if value is not None else None
+    return None
+
+
+def _converted(cols, source, json_as_text=False):
+    """Applica le conversioni solo alle colonne che ne hanno bisogno"""
+    converters = [
+        (index, converter)
+        for index, (_name, _lookup, field) in enumerate(cols)
+        for converter in [_converter(field, json_as_text)]
+        if converter is not None
+    ]
+    for row in source:
+        row = list(row)
+        for index, converter in converters:
+            row[index] = converter(row[index])
+        yield row
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+# ===========================================
+# Encoder
+# ===========================================
+
+def iter_ndjson(queryset, model, fields=None):
+    cols = columns(model, fields)
+    names = [name for name, _lookup, _field in cols]
+    dumps = json.JSONEncoder(default=_json_default, ensure_ascii=False, separators=(',', ':')).encode
+
+    buffer = []
+    size = 0
+    for row in _converted(cols, rows(queryset, cols)):
+        line = dumps(dict(zip(names, row)))
+        buffer.append(line)
+        size += len(line) + 1
+        if size >= FLUSH_BYTES:
+            yield ('\n'.join(buffer) + '\n').encode()
+            buffer = []
+            size = 0
+    if buffer:
+        yield ('\n'.join(buffer) + '\n').encode()
+
+
+def iter_csv(queryset, model, fields=None):
+    cols = columns(model, fields)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([name for name, _lookup, _field in cols])
+
+    for row in _converted(cols, rows(queryset, cols), json_as_text=True):
+        writer.writerow(row)
+        if output.tell() >= FLUSH_BYTES:
+            yield output.getvalue().encode()
+            output.seek(0)
+            output.truncate()
+    if output.tell():
+        yield output.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """File di sola scrittura che accumula i byte da inviare al client"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _arrow_type(pa, field):
+    if isinstance(field, (models.DecimalField, models.FloatField)):
+        return pa.float64()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return pa.int64()
+    return pa.string()
+
+
+def iter_parquet(queryset, model, fields=None):
+    """Parquet a row group (un row group per blocco del cursore)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    cols = columns(model, fields)
+    schema = pa.schema([
+        (name, pa.string() if name == 'node_id' else _arrow_type(pa, field))
+        for name, _lookup, field in cols
+    ])
+    json_columns = [
+        index for index, (_name, _lookup, field) in enumerate(cols)
+        if isinstance(field, models.JSONField)
+    ]
+    decimal_columns = [
+        index for index, (_name, _lookup, field) in enumerate(cols)
+        if isinstance(field, models.DecimalField)
+    ]
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+
+    def write(batch):
+        arrays = []
+        for index, values in enumerate(zip(*batch)):
+            if index in json_columns:
+                values = [json.dumps(value) if value is not None else None for value in values]
+            elif index in decimal_columns:
+                values = [float(value) if value is not None else None for value in values]
+            arrays.append(pa.array(values, type=schema.field(index).type))
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+    batch = []
+    for row in rows(queryset, cols):
+        batch.append(row)
+        if len(batch) >= CHUNK_SIZE:
+            write(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write(batch)
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    'ndjson': iter_ndjson,
+    'csv': iter_csv,
+    'parquet': iter_parquet,
+}
+
+
+def gzip_stream(chunks, level=5):
+    """Comprime in gzip un iteratore di blocchi di byte"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,238 @@
+"""
+AgriSecure IoT System - Serializzazione veloce per le liste
+
+Percorso alternativo ai ModelSerializer per le liste ad alto volume
+(letture, eventi sicurezza, allarmi): le righe vengono lette con
+values(), senza istanziare i modelli, e convertite in dict da
+funzioni preparate una sola volta per campo.
+
+L'output è identico a quello dei serializer DRF corrispondenti
+(decimali come stringa, datetime nel fuso locale con DATETIME_FORMAT).
+"""
+
+from django.conf import settings
+from django.db.models import DecimalField, DateTimeField, Exists, OuterRef
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+def _datetime_converter():
+    fmt = settings.REST_FRAMEWORK.get('DATETIME_FORMAT')
+
+    def convert(value):
+        if value is None:
+            return None
+        value = timezone.localtime(value)
+        return value.strftime(fmt) if fmt else value.isoformat()
+    return convert
+
+
+def _decimal_converter():
+    if not api_settings.COERCE_DECIMAL_TO_STRING:
+        return lambda value: float(value) if value is not None else None
+    return lambda value: str(value) if value is not None else None
+
+
+class FastSerializer:
+    """
+    Conversione righe values() -> dict di output
+
+    Args:
+        model: modello di origine (per i tipi dei campi)
+        fields: lista di (nome in output, lookup ORM)
+        annotations: espressioni da annotare sul queryset (nome -> expr)
+        extra: campi calcolati (nome -> funzione della riga values())
+    """
+
+    def __init__(self, model, fields, annotations=None, extra=None):
+        self.model = model
+        self.fields = fields
+        self.annotations = annotations or {}
+        self.extra = extra or {}
+        self._converters = None
+
+    def _compile(self):
+        converters = []
+        for name, lookup in self.fields:
+            field = self._resolve(lookup)
+            if isinstance(field, DecimalField):
+                converters.append((name, lookup, _decimal_converter()))
+            elif isinstance(field, DateTimeField):
+                converters.append((name, lookup, _datetime_converter()))
+            else:
+                converters.append((name, lookup, None))
+        return converters
+
+    def _resolve(self, lookup):
+        if lookup in self.annotations:
+            return None
+        model = self.model
+        parts = lookup.split('__')
+        for part in parts[:-1]:
+            model = model._meta.get_field(part).related_model
+        return model._meta.get_field(parts[-1])
+
+    @property
+    def names(self):
+        """Nomi dei campi in output"""
+        return [name for name, _lookup in self.fields] + list(self.extra)
+
+    def only(self, names):
+        """
+        Serializer ridotto ai soli campi `names` (sparse fieldset)
+
+        Le annotazioni non usate dai campi rimasti vengono scartate, così
+        la proiezione SQL contiene solo le colonne richieste. I campi
+        calcolati (extra) restano solo se selezionati.
+        """
+        fields = [(name, lookup) for name, lookup in self.fields if name in names]
+        lookups = {lookup for _name, lookup in fields}
+        return FastSerializer(
+            self.model,
+            fields,
+            annotations={k: v for k, v in self.annotations.items() if k in lookups},
+            extra={k: v for k, v in self.extra.items() if k in names},
+        )
+
+    @property
+    def lookups(self):
+        lookups = {lookup for _name, lookup in self.fields}
+        # Chiave di paginazione keyset
+        lookups.add('id')
+        return sorted(lookups)
+
+    def values(self, queryset):
+        """Queryset di dict con le sole colonne necessarie"""
+        if self.annotations:
+            queryset = queryset.annotate(**self.annotations)
+        return queryset.values(*self.lookups)
+
+    def serialize(self, rows):
+        if self._converters is None:
+            self._converters = self._compile()
+        converters = self._converters
+        extra = self.extra.items()
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, lookup, convert in converters:
+                value = row[lookup]
+                item[name] = convert(value) if convert is not None else value
+            for name, compute in extra:
+                item[name] = compute(row)
+            data.append(item)
+        return data
+
+    def columns(self, rows):
+        """Righe values() -> colonne di valori grezzi (formato colonnare)"""
+        rows = list(rows)
+        columns = {name: [row[lookup] for row in rows] for name, lookup in self.fields}
+        for name, compute in self.extra.items():
+            columns[name] = [compute(row) for row in rows]
+        return columns
+
+
+def _response_time(row):
+    if row['acknowledged_at'] is None:
+        return None
+    return (row['acknowledged_at'] - row['triggered_at']).total_seconds()
+
+
+def _security_event_annotations():
+    from apps.security.models import Alarm
+    return {'has_alarm': Exists(Alarm.objects.filter(event=OuterRef('pk')))}
+
+
+_serializers = {}
+
+
+def get(name):
+    """FastSerializer per nome (creato al primo uso, a app caricate)"""
+    if name not in _serializers:
+        _serializers[name] = _build(name)
+    return _serializers[name]
+
+
+def _build(name):
+    from apps.nodes.models import NodeHeartbeat
+    from apps.security.models import Alarm, SecurityEvent
+    from apps.sensors.models import SensorReading
+
+    if name == 'readings':
+        return FastSerializer(SensorReading, [
+            ('id', 'id'), ('node_id', 'node__node_id'), ('node_name', 'node__name'),
+            ('timestamp', 'timestamp'),
+            ('temperature', 'temperature'), ('humidity', 'humidity'), ('pressure', 'pressure'),
+            ('light_lux', 'light_lux'), ('soil_moisture_percent', 'soil_moisture_percent'),
+            ('soil_moisture_raw', 'soil_moisture_raw'),
+        ])
+    if name == 'security_events':
+        return FastSerializer(SecurityEvent, [
+            ('id', 'id'), ('node_id', 'node__node_id'), ('node_name', 'node__name'),
+            ('timestamp', 'timestamp'),
+            ('classification', 'classification'), ('priority', 'priority'),
+            ('pir_main', 'pir_main'), ('pir_backup', 'pir_backup'),
+            ('motion_confirmed', 'motion_confirmed'), ('tamper_detected', 'tamper_detected'),
+            ('confidence', 'confidence'), ('duration_ms', 'duration_ms'),
+            ('has_alarm', 'has_alarm'),
+        ], annotations=_security_event_annotations())
+    if name == 'alarms':
+        return FastSerializer(Alarm, [
+            ('id', 'id'), ('node_id', 'node__node_id'), ('node_name', 'node__name'),
+            ('triggered_at', 'triggered_at'),
+            ('status', 'status'), ('priority', 'priority'), ('classification', 'classification'),
+            ('siren_activated', 'siren_activated'), ('lights_activated', 'lights_activated'),
+            ('acknowledged_at', 'acknowledged_at'), ('acknowledged_by', 'acknowledged_by'),
+        ], extra={'response_time': _response_time})
+    if name == 'heartbeats':
+        return FastSerializer(NodeHeartbeat, [
+            ('id', 'id'), ('node_id', 'node__node_id'), ('timestamp', 'timestamp'),
+            ('uptime_seconds', 'uptime_seconds'), ('free_heap_kb', 'free_heap_kb'),
+            ('rssi', 'rssi'), ('battery_percentage', 'battery_percentage'),
+            ('mesh_neighbors', 'mesh_neighbors'),
+        ])
+    raise KeyError(name)
+
+
+class FastListMixin:
+    """
+    list() dei ViewSet tramite FastSerializer
+
+    Filtri e paginazione restano quelli del ViewSet: cambia solo il modo
+    in cui le righe vengono lette e serializzate.
+
+    Con `sparse_fields = True` la lista accetta `?fields=` (apps.api.selection):
+    id e campo di paginazione restano sempre presenti.
+    """
+    fast_serializer = None
+    sparse_fields = False
+
+    def get_fast_serializer(self):
+        serializer = get(self.fast_serializer)
+        if not self.sparse_fields:
+            return serializer
+
+        from .selection import selected
+        names = selected(self.request, serializer.names)
+        required = {'id', getattr(self, 'keyset_field', None)}
+        return serializer.only(required.union(names))
+
+    def list(self, request, *args, **kwargs):
+        from . import columnar
+
+        serializer = self.get_fast_serializer()
+        rows = serializer.values(self.filter_queryset(self.get_queryset()))
+        if columnar.requested(request):
+            time_field = getattr(self, 'keyset_field', None)
+
+            def render(rows):
+                return columnar.encode(serializer.columns(rows), time_field)
+        else:
+            render = serializer.serialize
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(render(page))
+        return Response(render(rows))
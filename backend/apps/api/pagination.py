@@ -0,0 +1,213 @@
+"""
+AgriSecure IoT System - Paginazione keyset
+
+Paginazione a cursore sulla coppia (timestamp, id) per le serie
+temporali: ogni pagina è una range scan sull'indice a partire
+dall'ultima riga vista, con costo costante anche in fondo allo storico
+(nessun OFFSET). Il cursore è opaco per il client (JSON in base64).
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(ValueError):
+    """Cursore malformato o manomesso"""
+
+
+def encode_cursor(value, pk, reverse=False):
+    """Cursore opaco che punta alla riga (value, pk)"""
+    data = {'v': value.isoformat(), 'id': pk}
+    if reverse:
+        data['r'] = 1
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Restituisce (value, pk, reverse) o solleva InvalidCursor"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data['v']), int(data['id']), bool(data.get('r'))
+    except (binascii.Error, ValueError, TypeError, KeyError) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def _position(item, field):
+    """(valore, pk) di una riga: istanza del modello o dict di values()"""
+    if isinstance(item, dict):
+        return item[field], item['id']
+    return getattr(item, field), item.pk
+
+
+class KeysetPage:
+    """Una pagina di risultati con i cursori verso le pagine adiacenti"""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def paginate(queryset, field, cursor=None, page_size=50):
+    """
+    Pagina di `queryset` in ordine (field, id) decrescente
+
+    Funziona anche su queryset values() purché includano `field` e 'id'.
+
+    Args:
+        queryset: QuerySet da paginare (i filtri restano invariati)
+        field: campo DateTimeField della serie (es. 'timestamp')
+        cursor: cursore ricevuto dal client (None = pagina più recente)
+        page_size: righe per pagina
+
+    Raises:
+        InvalidCursor: cursore non decodificabile
+    """
+    reverse = False
+    if cursor:
+        value, pk, reverse = decode_cursor(cursor)
+        if reverse:
+            # Pagina precedente: righe più recenti del cursore, lette in avanti
+            queryset = queryset.filter(
+                Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+            ).order_by(field, 'pk')
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+            ).order_by(f'-{field}', '-pk')
+    else:
+        queryset = queryset.order_by(f'-{field}', '-pk')
+
+    # Una riga in più indica se esiste la pagina successiva
+    items = list(queryset[:page_size + 1])
+    has_more = len(items) > page_size
+    items = items[:page_size]
+    if reverse:
+        items.reverse()
+
+    if not items:
+        return KeysetPage(items)
+
+    # Tornando indietro la pagina successiva esiste sempre (da lì si
+    # è arrivati); andando avanti esiste una precedente se c'era un cursore
+    has_next = True if reverse else has_more
+    has_previous = has_more if reverse else cursor is not None
+
+    next_cursor = previous_cursor = None
+    if has_next:
+        next_cursor = encode_cursor(*_position(items[-1], field))
+    if has_previous:
+        previous_cursor = encode_cursor(*_position(items[0], field), reverse=True)
+    return KeysetPage(items, next_cursor, previous_cursor)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginazione DRF a cursore per i ViewSet delle serie temporali
+
+    Il campo temporale viene letto dall'attributo `keyset_field` della
+    view (default 'timestamp'). Non viene restituito il conteggio totale:
+    su tabelle di milioni di righe costerebbe più della pagina stessa.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+    invalid_cursor_message = 'Cursore non valido'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        field = getattr(view, 'keyset_field', 'timestamp')
+        try:
+            self.page = paginate(
+                queryset,
+                field,
+                cursor=request.query_params.get(self.cursor_query_param),
+                page_size=self.get_page_size(request),
+            )
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return self.page.items
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursore opaco restituito in next/previous',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Righe per pagina (max {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
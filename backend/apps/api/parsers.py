@@ -0,0 +1,38 @@
+"""
+AgriSecure IoT System - Parser API
+
+Parser per i formati di ingestione massiva.
+"""
+
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    JSON delimitato da newline: un oggetto per riga
+
+    Restituisce una lista; le righe non decodificabili diventano None e
+    vengono riportate come errore di riga dalla validazione, senza far
+    fallire l'intera richiesta.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        reader = codecs.getreader(encoding)(stream)
+
+        rows = []
+        for line in reader:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append(None)
+        return rows
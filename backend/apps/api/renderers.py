@@ -0,0 +1,57 @@
+"""
+AgriSecure IoT System - Renderer API
+
+Renderer per la negoziazione dei formati di export (`?format=` o header
+Accept). Le view che li usano restituiscono direttamente una
+StreamingHttpResponse: il renderer serve solo a selezionare il formato.
+
+I renderer colonnari codificano invece il payload costruito da
+apps.api.columnar (JSON compatto o MessagePack).
+"""
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class StreamingFormatRenderer(BaseRenderer):
+    """Renderer pass-through per risposte già codificate in streaming"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Usato solo per le risposte di errore (dict), codificate in JSON
+        import json
+        return json.dumps(data).encode() if data is not None else b''
+
+
+class NDJSONRenderer(StreamingFormatRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVRenderer(StreamingFormatRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class ParquetRenderer(StreamingFormatRenderer):
+    media_type = 'application/vnd.apache.parquet'
+    format = 'parquet'
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """Formato colonnare (apps.api.columnar) in JSON compatto"""
+    media_type = 'application/vnd.agrisecure.columnar+json'
+    format = 'columnar'
+    compact = True
+
+
+class ColumnarMsgPackRenderer(BaseRenderer):
+    """Formato colonnare (apps.api.columnar) in MessagePack"""
+    media_type = 'application/vnd.agrisecure.columnar+msgpack'
+    format = 'columnar-msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        import msgpack
+        return msgpack.packb(data, use_bin_type=True)
@@ -0,0 +1,46 @@
+"""
+AgriSecure IoT System - Selezione di campi e metriche
+
+`?fields=temperature,humidity` (o l'alias `?metrics=`) limita i campi
+restituiti dagli endpoint delle letture. La selezione viene applicata
+alla proiezione SQL (values()) e alle aggregazioni, non solo all'output:
+una richiesta stretta legge solo le colonne richieste.
+"""
+
+from rest_framework.exceptions import ValidationError
+
+PARAMS = ('fields', 'metrics')
+
+
+def selected(request, available, default=None):
+    """
+    Nomi selezionati dal client
+
+    Args:
+        request: richiesta DRF
+        available: nomi ammessi (l'ordine è quello dell'output)
+        default: selezione se il parametro manca (None = tutti)
+
+    Returns:
+        lista di nomi nell'ordine di `available`
+
+    Raises:
+        ValidationError: nomi sconosciuti o selezione vuota
+    """
+    available = list(available)
+    for param in PARAMS:
+        values = request.query_params.getlist(param)
+        if values:
+            break
+    else:
+        return list(default) if default is not None else available
+
+    names = {name.strip() for value in values for name in value.split(',') if name.strip()}
+    unknown = names.difference(available)
+    if unknown:
+        raise ValidationError({param: [
+            f"Campi non validi: {', '.join(sorted(unknown))} (ammessi: {', '.join(available)})"
+        ]})
+    if not names:
+        raise ValidationError({param: ['Selezionare almeno un campo']})
+    return [name for name in available if name in names]
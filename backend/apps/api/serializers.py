@@ -98,9 +98,17 @@ class SensorReadingCreateSerializer(serializers.ModelSerializer):
         ]
     
     def create(self, validated_data):
+        from django.db import IntegrityError, transaction
+        
         node_id = validated_data.pop('node_id')
         node = Node.objects.get(node_id=node_id)
-        return SensorReading.objects.create(node=node, **validated_data)
+        try:
+            with transaction.atomic():
+                return SensorReading.objects.create(node=node, **validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'timestamp': 'Lettura già presente per questo nodo e timestamp'}
+            )
 
 
 class SensorAggregateSerializer(serializers.ModelSerializer):
@@ -155,6 +163,10 @@ class SecurityEventSerializer(serializers.ModelSerializer):
         ]
     
     def get_has_alarm(self, obj):
+        # Annotazione Exists() se presente, evita una query per riga
+        annotated = getattr(obj, 'alarm_exists', None)
+        if annotated is not None:
+            return annotated
         return hasattr(obj, 'alarm')
 
 
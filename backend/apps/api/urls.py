@@ -27,6 +27,7 @@ from .views import (
     SecurityZoneViewSet,
     DashboardSummaryView,
     DashboardChartsView,
+    ExportView,
 )
 
 # Router per ViewSets
@@ -47,6 +48,9 @@ urlpatterns = [
     path('dashboard/summary/', DashboardSummaryView.as_view(), name='dashboard-summary'),
     path('dashboard/charts/', DashboardChartsView.as_view(), name='dashboard-charts'),
     
+    # Export storico in streaming
+    path('export/<slug:dataset>/', ExportView.as_view(), name='export'),
+    
     # Authentication - JWT
     path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
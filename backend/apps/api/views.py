@@ -6,21 +6,31 @@ ViewSets e Views per le API REST
 
 from datetime import timedelta
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Count, Avg, Min, Max, Q
 from django.shortcuts import get_object_or_404
 
 from rest_framework import viewsets, status, views
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 
+from apps.core import counters, versions
 from apps.nodes.models import Node, NodeStatus, NodeHeartbeat, NodeEvent
 from apps.sensors.models import SensorReading, SensorAggregate, SensorAlert
 from apps.security.models import (
     SecurityEvent, Alarm, SystemArmState, SecurityZone, IntrusionClass
 )
+from . import columnar
+from .columnar import ColumnarMixin
+from .conditional import VersionedWriteMixin, conditional
+from .fast import FastListMixin
+from .pagination import KeysetPagination
+from .parsers import NDJSONParser
+from .renderers import NDJSONRenderer, CSVRenderer, ParquetRenderer
 from .serializers import (
     NodeListSerializer, NodeDetailSerializer, NodeHeartbeatSerializer, NodeEventSerializer,
     SensorReadingSerializer, SensorReadingCreateSerializer, 
@@ -35,10 +45,12 @@ from .serializers import (
 # Node ViewSets
 # ===========================================
 
-class NodeViewSet(viewsets.ModelViewSet):
+class NodeViewSet(ColumnarMixin, VersionedWriteMixin, viewsets.ModelViewSet):
     """
     API endpoint per gestione nodi IoT
     """
+    version_resources = (versions.NODES,)
+    columnar_actions = ('heartbeats',)
     queryset = Node.objects.filter(is_active=True)
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -52,6 +64,25 @@ class NodeViewSet(viewsets.ModelViewSet):
             return NodeListSerializer
         return NodeDetailSerializer
     
+    @conditional(versions.NODES)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    # Contatori dashboard (le scritture MQTT usano gli hook dedicati)
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        counters.node_changed(None, counters.node_state(serializer.instance))
+    
+    def perform_update(self, serializer):
+        before = counters.node_state(serializer.instance)
+        super().perform_update(serializer)
+        counters.node_changed(before, counters.node_state(serializer.instance))
+    
+    def perform_destroy(self, instance):
+        before = counters.node_state(instance)
+        super().perform_destroy(instance)
+        counters.node_changed(before, None)
+    
     @action(detail=True, methods=['get'])
     def heartbeats(self, request, pk=None):
         """Storico heartbeat del nodo"""
@@ -62,10 +93,20 @@ class NodeViewSet(viewsets.ModelViewSet):
         heartbeats = NodeHeartbeat.objects.filter(
             node=node,
             timestamp__gte=since
-        ).order_by('-timestamp')[:100]
+        )
         
-        serializer = NodeHeartbeatSerializer(heartbeats, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination()
+        if columnar.requested(request):
+            from . import fast
+            serializer = fast.get('heartbeats')
+            page = paginator.paginate_queryset(serializer.values(heartbeats), request, view=self)
+            return paginator.get_paginated_response(
+                columnar.encode(serializer.columns(page), 'timestamp')
+            )
+        
+        page = paginator.paginate_queryset(heartbeats, request, view=self)
+        serializer = NodeHeartbeatSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['get'])
     def events(self, request, pk=None):
@@ -77,10 +118,12 @@ class NodeViewSet(viewsets.ModelViewSet):
         events = NodeEvent.objects.filter(
             node=node,
             timestamp__gte=since
-        ).order_by('-timestamp')[:50]
+        )
         
-        serializer = NodeEventSerializer(events, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(events, request, view=self)
+        serializer = NodeEventSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def send_command(self, request, pk=None):
@@ -94,15 +137,13 @@ class NodeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Pubblica comando su MQTT
-        from apps.core.mqtt_publisher import publish_command
-        success = publish_command(node.node_id, command, request.data.get('params', {}))
+        # Accoda comando MQTT (pubblicato da outbox_relay)
+        from apps.core.mqtt_publisher import queue_command
+        message = queue_command(node.node_id, command, request.data.get('params', {}))
         
-        if success:
-            return Response({'status': 'Comando inviato'})
         return Response(
-            {'error': 'Errore invio comando'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            {'status': 'Comando accodato', 'outbox_id': message.id},
+            status=status.HTTP_202_ACCEPTED
         )
 
 
@@ -110,15 +151,29 @@ class NodeViewSet(viewsets.ModelViewSet):
 # Sensor ViewSets
 # ===========================================
 
-class SensorReadingViewSet(viewsets.ModelViewSet):
+# Metriche dei grafici: nome nell'output -> campo di SensorReading
+CHART_METRICS = {
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'pressure': 'pressure',
+    'light': 'light_lux',
+    'soil': 'soil_moisture_percent',
+}
+
+class SensorReadingViewSet(ColumnarMixin, FastListMixin, VersionedWriteMixin, viewsets.ModelViewSet):
     """
     API endpoint per letture sensori
     """
+    version_resources = (versions.READINGS,)
+    fast_serializer = 'readings'
+    sparse_fields = True
+    columnar_actions = ('list', 'chart_data')
     queryset = SensorReading.objects.select_related('node')
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend]
     filterset_fields = ['node__node_id']
-    ordering = ['-timestamp']
+    pagination_class = KeysetPagination
+    keyset_field = 'timestamp'
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -134,7 +189,33 @@ class SensorReadingViewSet(viewsets.ModelViewSet):
             since = timezone.now() - timedelta(hours=int(hours))
             queryset = queryset.filter(timestamp__gte=since)
         
-        return queryset[:500]  # Limita risultati
+        return queryset
+    
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Ingestione massiva (array JSON o NDJSON)
+        
+        Le righe valide vengono salvate, quelle non valide riportate
+        per indice in `errors`.
+        """
+        from apps.sensors import ingest
+        
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response(
+                {'error': 'Atteso un array JSON o NDJSON di letture'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(rows) > ingest.max_rows():
+            return Response(
+                {'error': f'Massimo {ingest.max_rows()} letture per richiesta'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
+        result = ingest.ingest(rows)
+        code = status.HTTP_201_CREATED if result['accepted'] else status.HTTP_400_BAD_REQUEST
+        return Response(result, status=code)
     
     @action(detail=False, methods=['get'])
     def latest(self, request):
@@ -154,14 +235,17 @@ class SensorReadingViewSet(viewsets.ModelViewSet):
                     latest_id=Max('id')
                 ).values('latest_id')
             )
-        ).select_related('node')
+        )
         
-        serializer = SensorReadingSerializer(readings, many=True)
-        return Response(serializer.data)
+        from . import fast
+        serializer = fast.get('readings')
+        return Response(serializer.serialize(serializer.values(readings)))
     
     @action(detail=False, methods=['get'])
     def chart_data(self, request):
-        """Dati per grafici"""
+        """Dati per grafici (`?metrics=` per limitare le serie)"""
+        from .selection import selected
+        
         node_id = request.query_params.get('node_id')
         hours = int(request.query_params.get('hours', 24))
         
@@ -171,32 +255,36 @@ class SensorReadingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        metrics = selected(request, CHART_METRICS)
         since = timezone.now() - timedelta(hours=hours)
         readings = SensorReading.objects.filter(
             node__node_id=node_id,
             timestamp__gte=since
         ).order_by('timestamp').values(
-            'timestamp', 'temperature', 'humidity', 
-            'pressure', 'light_lux', 'soil_moisture_percent'
+            'timestamp', *(CHART_METRICS[metric] for metric in metrics)
         )
         
+        if columnar.requested(request):
+            return Response(columnar.from_rows(
+                readings,
+                [('timestamp', 'timestamp')] + [(metric, CHART_METRICS[metric]) for metric in metrics],
+                'timestamp'
+            ))
+        
         # Formatta per Chart.js
-        data = {
-            'labels': [],
-            'temperature': [],
-            'humidity': [],
-            'pressure': [],
-            'light': [],
-            'soil': []
-        }
+        data = {'labels': []}
+        for metric in metrics:
+            data[metric] = []
         
+        decimals = [m for m in metrics if m in ('temperature', 'humidity', 'pressure')]
+        integers = [m for m in metrics if m not in decimals]
         for r in readings:
             data['labels'].append(r['timestamp'].isoformat())
-            data['temperature'].append(float(r['temperature']) if r['temperature'] else None)
-            data['humidity'].append(float(r['humidity']) if r['humidity'] else None)
-            data['pressure'].append(float(r['pressure']) if r['pressure'] else None)
-            data['light'].append(r['light_lux'])
-            data['soil'].append(r['soil_moisture_percent'])
+            for metric in decimals:
+                value = r[CHART_METRICS[metric]]
+                data[metric].append(float(value) if value else None)
+            for metric in integers:
+                data[metric].append(r[CHART_METRICS[metric]])
         
         return Response(data)
 
@@ -208,9 +296,10 @@ class SensorAlertViewSet(viewsets.ModelViewSet):
     queryset = SensorAlert.objects.select_related('node')
     serializer_class = SensorAlertSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend]
     filterset_fields = ['node__node_id', 'alert_type', 'severity', 'is_resolved']
-    ordering = ['-timestamp']
+    pagination_class = KeysetPagination
+    keyset_field = 'timestamp'
     
     @action(detail=True, methods=['post'])
     def acknowledge(self, request, pk=None):
@@ -231,52 +320,83 @@ class SensorAlertViewSet(viewsets.ModelViewSet):
 # Security ViewSets
 # ===========================================
 
-class SecurityEventViewSet(viewsets.ReadOnlyModelViewSet):
+class SecurityEventViewSet(FastListMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint per eventi sicurezza (sola lettura)
     """
     queryset = SecurityEvent.objects.select_related('node')
     serializer_class = SecurityEventSerializer
+    fast_serializer = 'security_events'
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend]
     filterset_fields = ['node__node_id', 'classification', 'priority']
-    ordering = ['-timestamp']
+    pagination_class = KeysetPagination
+    keyset_field = 'timestamp'
     
     def get_queryset(self):
         queryset = super().get_queryset()
         
-        # Filtro temporale
-        days = self.request.query_params.get('days', 7)
-        since = timezone.now() - timedelta(days=int(days))
-        queryset = queryset.filter(timestamp__gte=since)
+        # Filtro temporale (opzionale: senza filtro si scorre tutto lo storico)
+        days = self.request.query_params.get('days')
+        if days:
+            since = timezone.now() - timedelta(days=int(days))
+            queryset = queryset.filter(timestamp__gte=since)
         
-        return queryset[:200]
+        # Dettaglio: has_alarm con Exists() invece della relazione inversa
+        if self.action != 'list':
+            from django.db.models import Exists, OuterRef
+            queryset = queryset.annotate(
+                alarm_exists=Exists(Alarm.objects.filter(event=OuterRef('pk')))
+            )
+        
+        return queryset
 
 
-class AlarmViewSet(viewsets.ModelViewSet):
+class AlarmViewSet(FastListMixin, VersionedWriteMixin, viewsets.ModelViewSet):
     """
     API endpoint per allarmi
     """
+    version_resources = (versions.ALARMS,)
+    fast_serializer = 'alarms'
     queryset = Alarm.objects.select_related('node', 'event')
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend]
     filterset_fields = ['node__node_id', 'status', 'priority', 'classification']
-    ordering = ['-triggered_at']
+    pagination_class = KeysetPagination
+    keyset_field = 'triggered_at'
     
     def get_serializer_class(self):
         if self.action == 'list':
             return AlarmListSerializer
         return AlarmDetailSerializer
     
+    # Contatori dashboard (acknowledge/resolve passano dai metodi del modello)
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        counters.alarm_changed(None, counters.alarm_state(serializer.instance))
+    
+    def perform_update(self, serializer):
+        before = counters.alarm_state(serializer.instance)
+        super().perform_update(serializer)
+        counters.alarm_changed(before, counters.alarm_state(serializer.instance))
+    
+    def perform_destroy(self, instance):
+        before = counters.alarm_state(instance)
+        super().perform_destroy(instance)
+        counters.alarm_changed(before, None)
+    
     @action(detail=False, methods=['get'])
+    @conditional(versions.ALARMS, versions.NODES, cache_response=True)
     def active(self, request):
         """Lista allarmi attivi"""
-        alarms = self.queryset.filter(
+        from . import fast
+        
+        serializer = fast.get('alarms')
+        alarms = serializer.values(self.queryset.filter(
             status__in=['active', 'acknowledged']
-        ).order_by('-priority', '-triggered_at')
+        )).order_by('-priority', '-triggered_at')
         
-        serializer = AlarmListSerializer(alarms, many=True)
-        return Response(serializer.data)
+        return Response(serializer.serialize(alarms))
     
     @action(detail=True, methods=['post'])
     def perform_action(self, request, pk=None):
@@ -301,41 +421,22 @@ class AlarmViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
-        """Statistiche allarmi"""
-        days = int(request.query_params.get('days', 30))
-        since = timezone.now() - timedelta(days=days)
+        """Statistiche allarmi (una query ad aggregazione condizionale)"""
+        from apps.security.stats import alarm_statistics
         
-        alarms = Alarm.objects.filter(triggered_at__gte=since)
-        
-        stats = {
-            'total': alarms.count(),
-            'by_status': dict(alarms.values('status').annotate(count=Count('id')).values_list('status', 'count')),
-            'by_priority': dict(alarms.values('priority').annotate(count=Count('id')).values_list('priority', 'count')),
-            'by_classification': dict(alarms.values('classification').annotate(count=Count('id')).values_list('classification', 'count')),
-            'avg_response_time': None,
-            'false_positive_rate': 0
-        }
-        
-        # Tempo medio risposta
-        acknowledged = alarms.filter(acknowledged_at__isnull=False)
-        if acknowledged.exists():
-            from django.db.models import F, ExpressionWrapper, DurationField
-            avg_response = acknowledged.annotate(
-                response_time=ExpressionWrapper(
-                    F('acknowledged_at') - F('triggered_at'),
-                    output_field=DurationField()
-                )
-            ).aggregate(avg=Avg('response_time'))
-            if avg_response['avg']:
-                stats['avg_response_time'] = avg_response['avg'].total_seconds()
-        
-        # Tasso falsi positivi
-        resolved = alarms.filter(status__in=['resolved', 'false_pos'])
-        if resolved.count() > 0:
-            false_pos = alarms.filter(status='false_pos').count()
-            stats['false_positive_rate'] = round(false_pos / resolved.count() * 100, 1)
+        days = int(request.query_params.get('days', 30))
+        data = alarm_statistics(days=days)
         
-        return Response(stats)
+        return Response({
+            'total': data['total'],
+            'by_status': data['by_status'],
+            'by_priority': data['by_priority'],
+            'by_classification': data['by_classification'],
+            'avg_response_time': data['response_time']['avg'],
+            'response_time_p50': data['response_time']['p50'],
+            'response_time_p90': data['response_time']['p90'],
+            'false_positive_rate': data['false_positive_rate_closed'],
+        })
 
 
 class SystemArmViewSet(viewsets.ViewSet):
@@ -357,6 +458,7 @@ class SystemArmViewSet(viewsets.ViewSet):
             'history': SystemArmStateSerializer(history, many=True).data
         })
     
+    @transaction.atomic
     def create(self, request):
         """Cambia stato armamento"""
         serializer = ArmSystemSerializer(data=request.data)
@@ -388,10 +490,11 @@ class SystemArmViewSet(viewsets.ViewSet):
         is_armed = mode != 'disarmed'
         nodes.update(is_armed=is_armed)
         arm_state.nodes_affected.set(nodes)
+        versions.bump(versions.ARM, versions.NODES)
         
-        # Invia comando ai nodi via MQTT
-        from apps.core.mqtt_publisher import publish_arm_command
-        publish_arm_command(mode, [n.node_id for n in nodes])
+        # Comando ai nodi via outbox: pubblicato solo se lo stato viene salvato
+        from apps.core.mqtt_publisher import queue_arm_command
+        queue_arm_command(mode, [n.node_id for n in nodes])
         
         return Response({
             'status': 'success',
@@ -415,6 +518,7 @@ class SecurityZoneViewSet(viewsets.ModelViewSet):
         zone.is_armed = True
         zone.save()
         zone.nodes.update(is_armed=True)
+        versions.bump(versions.NODES)
         return Response({'status': 'Zone armed'})
     
     @action(detail=True, methods=['post'])
@@ -424,6 +528,7 @@ class SecurityZoneViewSet(viewsets.ModelViewSet):
         zone.is_armed = False
         zone.save()
         zone.nodes.update(is_armed=False)
+        versions.bump(versions.NODES)
         return Response({'status': 'Zone disarmed'})
 
 
@@ -437,20 +542,10 @@ class DashboardSummaryView(views.APIView):
     """
     permission_classes = [IsAuthenticated]
     
+    @conditional(versions.NODES, versions.ALARMS, versions.READINGS, versions.ARM, cache_response=True)
     def get(self, request):
-        now = timezone.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Conteggi nodi
-        nodes = Node.objects.filter(is_active=True)
-        total_nodes = nodes.count()
-        nodes_online = nodes.filter(status=NodeStatus.ONLINE).count()
-        nodes_offline = nodes.filter(status=NodeStatus.OFFLINE).count()
-        nodes_warning = nodes.filter(status=NodeStatus.WARNING).count()
-        
-        # Allarmi
-        active_alarms = Alarm.objects.filter(status__in=['active', 'acknowledged']).count()
-        alarms_today = Alarm.objects.filter(triggered_at__gte=today_start).count()
+        # Conteggi nodi, allarmi e batterie dai contatori incrementali
+        data = counters.get_dashboard_counters()
         
         # Stato armamento
         arm_mode = SystemArmState.get_current_mode()
@@ -458,26 +553,13 @@ class DashboardSummaryView(views.APIView):
         # Ultime letture sensori
         latest_reading = SensorReading.objects.order_by('-timestamp').first()
         
-        # Batterie basse
-        battery_warnings = nodes.filter(
-            battery_percentage__isnull=False,
-            battery_percentage__lte=20
-        ).count()
-        
-        data = {
-            'total_nodes': total_nodes,
-            'nodes_online': nodes_online,
-            'nodes_offline': nodes_offline,
-            'nodes_warning': nodes_warning,
-            'active_alarms': active_alarms,
-            'alarms_today': alarms_today,
+        data.update({
             'system_armed': arm_mode != 'disarmed',
             'arm_mode': arm_mode,
             'latest_temperature': latest_reading.temperature if latest_reading else None,
             'latest_humidity': latest_reading.humidity if latest_reading else None,
             'latest_soil_moisture': latest_reading.soil_moisture_percent if latest_reading else None,
-            'battery_warnings': battery_warnings,
-        }
+        })
         
         serializer = DashboardSummarySerializer(data)
         return Response(serializer.data)
@@ -486,37 +568,149 @@ class DashboardSummaryView(views.APIView):
 class DashboardChartsView(views.APIView):
     """
     Dati per grafici dashboard
+    
+    `?metrics=` seleziona le aggregazioni calcolate: le serie sensori
+    (temperature, humidity, pressure, light, soil, reading_count) e
+    security_events. Senza parametro: quelle storiche della dashboard.
     """
     permission_classes = [IsAuthenticated]
+    renderer_classes = columnar.renderer_classes()
+    
+    # Metrica -> (nome nell'output, aggregazione oraria su SensorReading)
+    SENSOR_METRICS = {
+        'temperature': ('avg_temp', Avg('temperature')),
+        'humidity': ('avg_humidity', Avg('humidity')),
+        'pressure': ('avg_pressure', Avg('pressure')),
+        'light': ('avg_light', Avg('light_lux')),
+        'soil': ('avg_soil', Avg('soil_moisture_percent')),
+        'reading_count': ('reading_count', Count('id')),
+    }
+    DEFAULT_METRICS = ('temperature', 'humidity', 'soil', 'reading_count', 'security_events')
     
+    @conditional(versions.READINGS, versions.SECURITY_EVENTS, cache_response=True, timeout=300, bucket=60)
     def get(self, request):
+        from django.db.models.functions import TruncHour
+        from .selection import selected
+        
         hours = int(request.query_params.get('hours', 24))
         since = timezone.now() - timedelta(hours=hours)
+        metrics = selected(
+            request, [*self.SENSOR_METRICS, 'security_events'], default=self.DEFAULT_METRICS
+        )
+        aggregates = dict(self.SENSOR_METRICS[m] for m in metrics if m in self.SENSOR_METRICS)
+        
+        data = {}
+        
+        # Aggregazione oraria sensori (solo le metriche richieste)
+        if aggregates:
+            hourly_data = SensorReading.objects.filter(
+                timestamp__gte=since
+            ).annotate(
+                hour=TruncHour('timestamp')
+            ).values('hour').annotate(**aggregates).order_by('hour')
+            
+            if columnar.requested(request):
+                data['sensor_data'] = columnar.from_rows(
+                    hourly_data, [('hour', 'hour')] + [(name, name) for name in aggregates], 'hour'
+                )
+            else:
+                data['sensor_data'] = list(hourly_data)
         
-        # Aggregazione oraria sensori
-        from django.db.models.functions import TruncHour
+        # Eventi sicurezza per ora
+        if 'security_events' in metrics:
+            security_hourly = SecurityEvent.objects.filter(
+                timestamp__gte=since
+            ).annotate(
+                hour=TruncHour('timestamp')
+            ).values('hour').annotate(
+                count=Count('id')
+            ).order_by('hour')
+            
+            if columnar.requested(request):
+                data['security_events'] = columnar.from_rows(
+                    security_hourly, [('hour', 'hour'), ('count', 'count')], 'hour'
+                )
+            else:
+                data['security_events'] = list(security_hourly)
         
-        hourly_data = SensorReading.objects.filter(
-            timestamp__gte=since
-        ).annotate(
-            hour=TruncHour('timestamp')
-        ).values('hour').annotate(
-            avg_temp=Avg('temperature'),
-            avg_humidity=Avg('humidity'),
-            avg_soil=Avg('soil_moisture_percent'),
-            reading_count=Count('id')
-        ).order_by('hour')
+        return Response(data)
+
+
+# ===========================================
+# Export Views
+# ===========================================
+
+class ExportView(views.APIView):
+    """
+    Export in streaming dello storico (letture, eventi sicurezza, heartbeat)
+    
+    GET /api/v1/export/<dataset>/?start=...&end=...&node_id=...&fields=...&format=ndjson|csv|parquet
+    
+    Nessun limite di righe: il database viene letto con un cursore
+    server-side e la risposta è generata a blocchi (memoria costante).
+    NDJSON e CSV sono compressi in gzip se il client lo accetta.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [NDJSONRenderer, CSVRenderer, ParquetRenderer]
+    
+    def get(self, request, dataset):
+        from django.http import StreamingHttpResponse
+        from django.utils.dateparse import parse_datetime
+        from . import export
+        from .selection import selected
+        
+        model = export.DATASETS.get(dataset)
+        if model is None:
+            return Response(
+                {'error': f"Dataset non valido: {', '.join(export.DATASETS)}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
-        # Eventi sicurezza per ora
-        security_hourly = SecurityEvent.objects.filter(
-            timestamp__gte=since
-        ).annotate(
-            hour=TruncHour('timestamp')
-        ).values('hour').annotate(
-            count=Count('id')
-        ).order_by('hour')
+        # Range temporale (default: ultime 24 ore)
+        params = request.query_params
+        try:
+            end = parse_datetime(params['end']) if params.get('end') else timezone.now()
+            start = parse_datetime(params['start']) if params.get('start') else end - timedelta(days=1)
+        except (ValueError, TypeError):
+            # Formato corretto ma data inesistente (es. 2024-02-30)
+            start = end = None
+        if start is None or end is None:
+            return Response(
+                {'error': 'start/end devono essere datetime ISO 8601'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        
+        queryset = model.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        if params.get('node_id'):
+            queryset = queryset.filter(node__node_id=params['node_id'])
+        
+        # Colonne esportate (?fields=, default tutte)
+        fields = selected(request, [name for name, _lookup, _field in export.columns(model)])
+        
+        fmt = request.accepted_renderer.format
+        if fmt == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                return Response(
+                    {'error': 'Export Parquet non disponibile (pyarrow non installato)'},
+                    status=status.HTTP_501_NOT_IMPLEMENTED
+                )
         
-        return Response({
-            'sensor_data': list(hourly_data),
-            'security_events': list(security_hourly)
-        })
+        stream = export.ENCODERS[fmt](queryset, model, fields)
+        response = StreamingHttpResponse(content_type=request.accepted_renderer.media_type)
+        
+        # Parquet è già compresso (snappy)
+        if fmt != 'parquet' and 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            stream = export.gzip_stream(stream)
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept-Encoding'
+        response.streaming_content = stream
+        
+        filename = f"{dataset}_{start:%Y%m%d%H%M}_{end:%Y%m%d%H%M}.{fmt}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
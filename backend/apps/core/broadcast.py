@@ -0,0 +1,103 @@
+"""
+AgriSecure IoT System - Broadcast WebSocket
+
+Broadcaster che raggruppa gli aggiornamenti verso i gruppi Channels.
+I messaggi in arrivo marcano un gruppo come "sporco"; un thread
+dedicato invia al più un aggiornamento per gruppo ogni `interval`
+secondi, calcolando lo snapshot una sola volta per tick. Il costo
+di ogni broadcast è quindi indipendente dal rate dei messaggi.
+"""
+
+import logging
+import threading
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger('agrisecure')
+
+
+class CoalescingBroadcaster:
+    """
+    Invio coalescente di snapshot ai gruppi WebSocket
+
+    Ogni gruppo è registrato con il tipo di messaggio Channels, la chiave
+    del payload e la funzione che costruisce lo snapshot:
+
+        broadcaster.register('dashboard_updates', 'dashboard_update', 'data', get_dashboard_data)
+        broadcaster.mark_dirty('dashboard_updates')
+    """
+
+    def __init__(self, channel_layer=None, interval=None):
+        if channel_layer is None:
+            from channels.layers import get_channel_layer
+            channel_layer = get_channel_layer()
+        if interval is None:
+            interval = getattr(settings, 'WEBSOCKET_BROADCAST_INTERVAL', 1.0)
+
+        self.channel_layer = channel_layer
+        self.interval = interval
+        self._groups = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Statistiche: messaggi ricevuti vs broadcast effettivi
+        self.marked = 0
+        self.sent = 0
+
+    def register(self, group, message_type, payload_key, builder):
+        """Registra un gruppo con il relativo costruttore di snapshot"""
+        self._groups[group] = (message_type, payload_key, builder)
+
+    def mark_dirty(self, *groups):
+        """Segnala che i gruppi hanno dati nuovi da inviare"""
+        with self._lock:
+            self._dirty.update(groups)
+            self.marked += len(groups)
+
+    def flush(self):
+        """Invia uno snapshot per ogni gruppo sporco"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+
+        if not dirty:
+            return
+
+        close_old_connections()
+        for group in dirty:
+            message_type, payload_key, builder = self._groups[group]
+            try:
+                payload = builder()
+                async_to_sync(self.channel_layer.group_send)(
+                    group,
+                    {'type': message_type, payload_key: payload}
+                )
+                self.sent += 1
+            except Exception as e:
+                logger.error(f"Errore broadcast su {group}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def start(self):
+        """Avvia il thread di invio periodico"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run,
+                name='ws-broadcaster',
+                daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Ferma il thread inviando gli ultimi aggiornamenti pendenti"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
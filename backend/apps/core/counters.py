@@ -0,0 +1,270 @@
+"""
+AgriSecure IoT System - Contatori Dashboard
+
+Contatori incrementali mantenuti in Redis per la dashboard:
+nodi per stato, allarmi aperti, allarmi di oggi, batterie basse.
+
+I contatori vengono aggiornati dagli eventi (ingestion, transizioni
+allarmi, health check, scritture da API e admin) dopo il commit della
+transazione e riallineati periodicamente con il database da
+`reconcile()`. La lettura è una singola MGET, indipendente dalla
+dimensione delle tabelle.
+
+Come in `reconcile()`, i contatori dei nodi considerano solo i nodi
+attivi (is_active=True).
+"""
+
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+logger = logging.getLogger('agrisecure')
+
+KEY_PREFIX = 'agrisecure:dashboard:'
+
+# Stati che contano come "allarme aperto" nella dashboard
+OPEN_ALARM_STATUSES = ('active', 'acknowledged')
+
+NODE_STATUSES = ('online', 'offline', 'warning', 'error', 'maintenance')
+
+# Il contatore giornaliero vive due giorni, poi scade da solo
+TODAY_KEY_TTL = 2 * 24 * 3600
+
+
+def _key(name):
+    return f"{KEY_PREFIX}{name}"
+
+
+def _today_key(day=None):
+    day = day or timezone.localdate()
+    return _key(f"alarms_today:{day.isoformat()}")
+
+
+def _battery_threshold():
+    return settings.AGRISECURE.get('ALARM_THRESHOLDS', {}).get('BATTERY_LOW', 20)
+
+
+def _is_battery_low(percentage):
+    return percentage is not None and percentage <= _battery_threshold()
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def _apply(deltas, today_delta=0):
+    """Applica gli incrementi in un'unica transazione Redis (MULTI/EXEC)"""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas and not today_delta:
+        return
+    try:
+        pipe = _redis().pipeline(transaction=True)
+        for name, delta in deltas.items():
+            pipe.incrby(_key(name), delta)
+        if today_delta:
+            pipe.incrby(_today_key(), today_delta)
+            pipe.expire(_today_key(), TODAY_KEY_TTL)
+        pipe.execute()
+    except Exception as e:
+        # Il reconcile periodico riallinea i contatori
+        logger.warning(f"Aggiornamento contatori dashboard fallito: {e}")
+
+
+def _after_commit(deltas, today_delta=0):
+    """Aggiorna i contatori solo se la transazione corrente va a buon fine"""
+    transaction.on_commit(lambda: _apply(deltas, today_delta))
+
+
+# ===========================================
+# Hook di aggiornamento
+# ===========================================
+
+def node_created(status='offline', is_active=True):
+    """Nuovo nodo registrato"""
+    if is_active:
+        _after_commit({'nodes:total': 1, f'nodes:{status}': 1})
+
+
+def node_status_changed(old_status, new_status, count=1, is_active=True):
+    """Transizione di stato di uno o più nodi (attivi)"""
+    if old_status == new_status or not count or not is_active:
+        return
+    _after_commit({f'nodes:{old_status}': -count, f'nodes:{new_status}': count})
+
+
+def battery_changed(old_percentage, new_percentage, is_active=True):
+    """Variazione livello batteria di un nodo"""
+    delta = int(_is_battery_low(new_percentage)) - int(_is_battery_low(old_percentage))
+    if delta and is_active:
+        _after_commit({'battery_warnings': delta})
+
+
+def node_state(node):
+    """Stato di un nodo rilevante per i contatori (per node_changed)"""
+    return (node.is_active, node.status, node.battery_percentage)
+
+
+def _node_contribution(state):
+    if state is None:
+        return {}
+    is_active, status, battery_percentage = state
+    if not is_active:
+        return {}
+    return {
+        'nodes:total': 1,
+        f'nodes:{status}': 1,
+        'battery_warnings': int(_is_battery_low(battery_percentage)),
+    }
+
+
+def node_changed(before, after):
+    """
+    Nodo creato, modificato o eliminato da API o admin
+
+    Args:
+        before, after: node_state() prima e dopo la scrittura
+            (None se il nodo non esisteva / non esiste più)
+    """
+    deltas = Counter(_node_contribution(after))
+    deltas.subtract(_node_contribution(before))
+    _after_commit(dict(deltas))
+
+
+def alarm_created(triggered_at=None):
+    """Nuovo allarme aperto"""
+    triggered_at = triggered_at or timezone.now()
+    today_delta = 1 if timezone.localdate(triggered_at) == timezone.localdate() else 0
+    _after_commit({'alarms:open': 1}, today_delta)
+
+
+def alarm_status_changed(old_status, new_status, count=1):
+    """Transizione di stato di uno o più allarmi"""
+    was_open = old_status in OPEN_ALARM_STATUSES
+    is_open = new_status in OPEN_ALARM_STATUSES
+    if was_open != is_open and count:
+        _after_commit({'alarms:open': count if is_open else -count})
+
+
+def alarms_deleted(open_count=0, today_count=0):
+    """Allarmi eliminati definitivamente"""
+    _after_commit({'alarms:open': -open_count}, -today_count)
+
+
+def alarm_state(alarm):
+    """Stato di un allarme rilevante per i contatori (per alarm_changed)"""
+    return (alarm.status, alarm.triggered_at)
+
+
+def alarm_changed(before, after):
+    """
+    Allarme modificato o eliminato da API o admin
+
+    Args:
+        before, after: alarm_state() prima e dopo la scrittura
+            (None se l'allarme non esiste più)
+    """
+    def contribution(state):
+        if state is None:
+            return 0, 0
+        status, triggered_at = state
+        is_today = triggered_at is not None and timezone.localdate(triggered_at) == timezone.localdate()
+        return int(status in OPEN_ALARM_STATUSES), int(is_today)
+
+    open_after, today_after = contribution(after)
+    open_before, today_before = contribution(before)
+    _after_commit({'alarms:open': open_after - open_before}, today_after - today_before)
+
+
+# ===========================================
+# Lettura e riconciliazione
+# ===========================================
+
+def _compute_from_db():
+    """Calcola i contatori dal database (due query aggregate)"""
+    from apps.nodes.models import Node
+    from apps.security.models import Alarm
+
+    today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    node_counts = Node.objects.filter(is_active=True).aggregate(
+        total=Count('id'),
+        battery_warnings=Count('id', filter=Q(
+            battery_percentage__isnull=False,
+            battery_percentage__lte=_battery_threshold(),
+        )),
+        **{status: Count('id', filter=Q(status=status)) for status in NODE_STATUSES}
+    )
+    alarm_counts = Alarm.objects.aggregate(
+        open=Count('id', filter=Q(status__in=OPEN_ALARM_STATUSES)),
+        today=Count('id', filter=Q(triggered_at__gte=today_start)),
+    )
+
+    values = {
+        'nodes:total': node_counts['total'],
+        'battery_warnings': node_counts['battery_warnings'],
+        'alarms:open': alarm_counts['open'],
+    }
+    for status in NODE_STATUSES:
+        values[f'nodes:{status}'] = node_counts[status]
+    return values, alarm_counts['today']
+
+
+def _as_dict(values, alarms_today):
+    return {
+        'total_nodes': values['nodes:total'],
+        'nodes_online': values['nodes:online'],
+        'nodes_offline': values['nodes:offline'],
+        'nodes_warning': values['nodes:warning'],
+        'active_alarms': values['alarms:open'],
+        'alarms_today': alarms_today,
+        'battery_warnings': values['battery_warnings'],
+    }
+
+
+def reconcile():
+    """
+    Riallinea i contatori Redis con il database
+
+    Eseguito periodicamente da Celery Beat e al primo accesso
+    se i contatori non esistono ancora.
+    """
+    values, alarms_today = _compute_from_db()
+    try:
+        pipe = _redis().pipeline(transaction=True)
+        pipe.mset({_key(name): value for name, value in values.items()})
+        pipe.set(_today_key(), alarms_today, ex=TODAY_KEY_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Riconciliazione contatori dashboard fallita: {e}")
+    return _as_dict(values, alarms_today)
+
+
+def get_dashboard_counters():
+    """
+    Legge tutti i contatori con una singola MGET
+
+    Returns:
+        dict: total_nodes, nodes_online, nodes_offline, nodes_warning,
+              active_alarms, alarms_today, battery_warnings
+    """
+    names = ['nodes:total', 'battery_warnings', 'alarms:open']
+    names += [f'nodes:{status}' for status in NODE_STATUSES]
+
+    try:
+        raw = _redis().mget([_key(name) for name in names] + [_today_key()])
+    except Exception as e:
+        logger.warning(f"Lettura contatori dashboard fallita, uso il database: {e}")
+        values, alarms_today = _compute_from_db()
+        return _as_dict(values, alarms_today)
+
+    if any(value is None for value in raw[:-1]):
+        return reconcile()
+
+    values = {name: max(int(value), 0) for name, value in zip(names, raw)}
+    alarms_today = max(int(raw[-1]), 0) if raw[-1] is not None else 0
+    return _as_dict(values, alarms_today)
@@ -0,0 +1,83 @@
+"""
+AgriSecure IoT System - Dati Dashboard
+
+Snapshot della dashboard e statistiche allarmi condivisi dai
+WebSocket consumer e dal fan-out della pipeline di ingestion.
+I conteggi arrivano dai contatori Redis (vedi apps.core.counters),
+le query rimanenti leggono solo poche righe tramite indice.
+"""
+
+from django.utils import timezone
+
+from apps.core import counters
+
+
+def get_dashboard_data():
+    """Costruisce lo snapshot della dashboard per i client WebSocket"""
+    from apps.security.models import Alarm, SystemArmState
+    from apps.sensors.models import SensorReading
+
+    now = timezone.now()
+    stats = counters.get_dashboard_counters()
+
+    # Allarmi recenti
+    recent_alarms = []
+    for alarm in Alarm.objects.filter(
+        status__in=counters.OPEN_ALARM_STATUSES
+    ).select_related('node').order_by('-triggered_at')[:5]:
+        recent_alarms.append({
+            'id': alarm.id,
+            'priority': alarm.priority,
+            'classification': alarm.classification,
+            'node_name': alarm.node.name if alarm.node.name else alarm.node.node_id,
+            'triggered_at': alarm.triggered_at.strftime('%d/%m/%Y %H:%M'),
+            'status': alarm.status,
+        })
+
+    # Stato armamento
+    arm_state = SystemArmState.objects.order_by('-timestamp').first()
+    system_armed = arm_state.mode != 'disarmed' if arm_state else False
+    arm_mode = arm_state.mode if arm_state else None
+
+    # Ultime letture sensori
+    latest_reading = SensorReading.objects.order_by('-timestamp').first()
+    latest_temperature = float(latest_reading.temperature) if latest_reading and latest_reading.temperature else None
+    latest_humidity = float(latest_reading.humidity) if latest_reading and latest_reading.humidity else None
+    latest_soil = float(latest_reading.soil_moisture_percent) if latest_reading and latest_reading.soil_moisture_percent else None
+
+    return {
+        'nodes': {
+            'total': stats['total_nodes'],
+            'online': stats['nodes_online'],
+            'offline': stats['nodes_offline'],
+        },
+        'alarms': {
+            'active': stats['active_alarms'],
+            'today': stats['alarms_today'],
+            'recent': recent_alarms,
+        },
+        'system': {
+            'armed': system_armed,
+            'arm_mode': arm_mode,
+        },
+        'sensors': {
+            'temperature': latest_temperature,
+            'humidity': latest_humidity,
+            'soil_moisture': latest_soil,
+        },
+        'battery_warnings': stats['battery_warnings'],
+        'timestamp': now.isoformat(),
+    }
+
+
+def get_alarms_stats():
+    """Statistiche allarmi per la pagina allarmi (ultimi 30 giorni)"""
+    from apps.security.stats import alarm_statistics
+
+    stats = alarm_statistics(days=30)
+    return {
+        'active': stats['active'],
+        'acknowledged': stats['acknowledged'],
+        'resolved': stats['resolved'],
+        'false_positive_rate': stats['false_positive_rate'],
+    }
@@ -0,0 +1,34 @@
+"""
+AgriSecure IoT System - Filtro dei messaggi ripetuti
+
+Cache LRU in memoria delle chiavi (tipo, nodo, timestamp) già salvate.
+Con QoS 1 e i replay del backlog dei gateway lo stesso messaggio può
+arrivare più volte: il filtro scarta le ripetizioni recenti prima di
+toccare il database. Il vincolo univoco (node, timestamp) resta la
+garanzia definitiva per quelle che sfuggono alla cache.
+"""
+
+from collections import OrderedDict
+
+
+class RecentKeys:
+    """Insieme limitato delle ultime `maxsize` chiavi viste"""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+
+    def __contains__(self, key):
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return True
+        return False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.maxsize:
+            self._keys.popitem(last=False)
@@ -0,0 +1,126 @@
+"""
+AgriSecure IoT System - Event Bus interno
+
+Bus di eventi di dominio in-process per la pipeline di ingestion.
+Gli eventi vengono consegnati ai subscriber solo dopo il commit della
+transazione che li ha generati: chi li riceve legge sempre dati già
+visibili sul database.
+
+Usage:
+    from apps.core import events
+
+    @events.subscribe(events.ReadingStored)
+    def on_reading(event):
+        ...
+
+    events.publish(events.ReadingStored(...))
+"""
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from django.db import transaction
+
+logger = logging.getLogger('agrisecure')
+
+_subscribers = defaultdict(list)
+
+
+# ===========================================
+# Eventi di dominio
+# ===========================================
+
+@dataclass(frozen=True)
+class ReadingStored:
+    """Nuova lettura sensori salvata"""
+    node_id: str
+    reading_id: int
+    timestamp: datetime
+    values: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class AlarmCreated:
+    """Nuovo allarme generato da un evento di sicurezza"""
+    alarm_id: int
+    node_id: str
+    node_name: str
+    priority: str
+    classification: str
+    triggered_at: datetime
+
+
+@dataclass(frozen=True)
+class NodeStateChanged:
+    """Stato runtime di un nodo aggiornato (status, batteria, last_seen)"""
+    node_id: str
+    old_status: str
+    new_status: str
+    last_seen: Optional[datetime] = None
+    battery_percentage: Optional[int] = None
+
+    @property
+    def status_changed(self):
+        return self.old_status != self.new_status
+
+
+@dataclass(frozen=True)
+class HeartbeatReceived:
+    """Heartbeat di un nodo salvato"""
+    node_id: str
+    timestamp: datetime
+    uptime_seconds: int = 0
+    rssi: Optional[int] = None
+    battery_percentage: Optional[int] = None
+    mesh_neighbors: int = 0
+    free_heap_kb: int = 0
+
+
+# ===========================================
+# Sottoscrizione e pubblicazione
+# ===========================================
+
+def subscribe(event_type, handler=None):
+    """
+    Registra un handler per un tipo di evento
+
+    Utilizzabile anche come decoratore.
+    """
+    if handler is None:
+        def decorator(func):
+            _subscribers[event_type].append(func)
+            return func
+        return decorator
+
+    _subscribers[event_type].append(handler)
+    return handler
+
+
+def unsubscribe(event_type, handler):
+    """Rimuove un handler registrato"""
+    if handler in _subscribers[event_type]:
+        _subscribers[event_type].remove(handler)
+
+
+def dispatch(event):
+    """Consegna subito l'evento a tutti gli handler registrati"""
+    for handler in list(_subscribers[type(event)]):
+        try:
+            handler(event)
+        except Exception as e:
+            logger.exception(f"Errore handler {getattr(handler, '__name__', handler)} per {type(event).__name__}: {e}")
+
+
+def publish(event):
+    """
+    Pubblica un evento dopo il commit della transazione corrente
+
+    Se la transazione viene annullata l'evento non viene consegnato.
+    Fuori da una transazione la consegna è immediata.
+    """
+    if not _subscribers[type(event)]:
+        return
+    transaction.on_commit(lambda: dispatch(event))
@@ -0,0 +1,38 @@
+"""
+AgriSecure IoT System - JSON Patch
+
+Generazione di patch in stile RFC 6902 tra due snapshot JSON. Usato
+dal protocollo delta della dashboard WebSocket (le patch vengono
+applicate dal client): gli oggetti vengono confrontati ricorsivamente,
+le liste sostituite per intero.
+"""
+
+
+def _escape(token):
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def make_patch(old, new, path=''):
+    """
+    Calcola le operazioni che trasformano `old` in `new`
+
+    Returns:
+        list: operazioni {'op': 'add'|'remove'|'replace', 'path': ..., 'value': ...}
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+            else:
+                ops.extend(make_patch(old[key], value, child))
+        return ops
+
+    if old == new and type(old) is type(new):
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
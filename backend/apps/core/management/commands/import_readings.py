@@ -0,0 +1,329 @@
+"""
+AgriSecure IoT System - Import storico letture sensori
+
+Management command Django che importa file CSV (anche .gz) delle
+vecchie stazioni meteo in sensor_readings tramite il protocollo COPY
+binario di PostgreSQL.
+
+Il file viene letto in streaming e scritto a blocchi: ogni blocco va
+in una tabella temporanea con COPY e da lì in sensor_readings con un
+solo INSERT ... SELECT ... ON CONFLICT DO NOTHING sul vincolo univoco
+(node, timestamp), che scarta i duplicati sia interni al blocco sia già
+presenti a database. La memoria usata non
+dipende dalla dimensione del file.
+
+Formato CSV: intestazione con node_id, timestamp e le colonne valore
+(temperature, humidity, pressure, light_lux, soil_moisture_raw,
+soil_moisture_percent, battery_voltage o gli alias dei payload MQTT).
+Timestamp ISO 8601 o epoch in secondi; quelli senza fuso orario sono
+interpretati nel fuso indicato da --timezone.
+
+Usage:
+    python manage.py import_readings FILE [FILE ...] [--chunk-size 50000]
+        [--timezone Europe/Rome] [--delimiter ,] [--create-nodes]
+"""
+
+import csv
+import gzip
+import io
+import logging
+import struct
+import sys
+import time
+from datetime import datetime, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+
+from apps.sensors import ingest
+
+logger = logging.getLogger('agrisecure')
+
+STAGE_TABLE = 'import_readings_stage'
+
+# Epoca dei timestamp nel formato binario di PostgreSQL
+PG_EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+COPY_TRAILER = struct.pack('>h', -1)
+NULL = struct.pack('>i', -1)
+
+# Codifica binaria per tipo della colonna di staging (lunghezza + valore)
+_BIGINT = struct.Struct('>iq')
+_INTEGER = struct.Struct('>ii')
+_FLOAT = struct.Struct('>id')
+
+# Righe scartate riportate per esteso (le altre sono solo contate)
+MAX_REPORTED_ERRORS = 20
+
+
+def _timestamp_micros(value):
+    delta = value - PG_EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+class Command(BaseCommand):
+    help = 'Importa letture storiche da CSV con COPY binario di PostgreSQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='File CSV (anche .gz, - per stdin)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=50000,
+            help='Righe per blocco COPY (una transazione per blocco)'
+        )
+        parser.add_argument(
+            '--timezone',
+            default=settings.TIME_ZONE,
+            help='Fuso orario dei timestamp senza offset'
+        )
+        parser.add_argument(
+            '--delimiter',
+            default=',',
+            help='Separatore di campo del CSV'
+        )
+        parser.add_argument(
+            '--create-nodes',
+            action='store_true',
+            help='Crea i nodi sconosciuti invece di scartarne le righe'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('import_readings richiede PostgreSQL (COPY)')
+        try:
+            self.tz = ZoneInfo(options['timezone'])
+        except ZoneInfoNotFoundError:
+            raise CommandError(f"Fuso orario sconosciuto: {options['timezone']}")
+
+        self.chunk_size = options['chunk_size']
+        self.delimiter = options['delimiter']
+        self.create_nodes = options['create_nodes']
+        self.checkers = ingest.get_checkers()
+
+        self._prepare()
+
+        totals = {'read': 0, 'inserted': 0, 'duplicates': 0, 'rejected': 0}
+        started = time.monotonic()
+        for path in options['files']:
+            stats = self.import_file(path)
+            for key in totals:
+                totals[key] += stats[key]
+
+        if totals['inserted']:
+            from apps.core import versions
+            versions.bump(versions.READINGS)
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Import letture: {totals['inserted']}/{totals['read']} righe inserite")
+        self.stdout.write(self.style.SUCCESS(
+            f"Import completato: {totals['inserted']} letture inserite, "
+            f"{totals['duplicates']} duplicate, {totals['rejected']} scartate "
+            f"su {totals['read']} righe in {elapsed:.1f}s"
+        ))
+
+    # ===========================================
+    # Preparazione
+    # ===========================================
+
+    def _prepare(self):
+        """Cache dei nodi, tabella di staging e SQL di inserimento"""
+        from apps.nodes.models import Node
+        from apps.sensors.models import SensorReading
+
+        self.nodes = dict(Node.objects.values_list('node_id', 'id'))
+
+        fields = [SensorReading._meta.get_field(name) for name in ingest.VALUE_FIELDS]
+        self.value_fields = [field.name for field in fields]
+        self.encoders = [
+            _FLOAT if isinstance(field, models.DecimalField) else _INTEGER
+            for field in fields
+        ]
+
+        stage_types = {_INTEGER: 'integer', _FLOAT: 'double precision'}
+        qn = connection.ops.quote_name
+        stage_columns = ['node_id', 'timestamp'] + self.value_fields
+        column_defs = ', '.join(
+            [f"{qn('node_id')} bigint", f"{qn('timestamp')} timestamptz"]
+            + [f"{qn(name)} {stage_types[encoder]}" for name, encoder in zip(self.value_fields, self.encoders)]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {qn(STAGE_TABLE)} "
+                f"({column_defs}) ON COMMIT DELETE ROWS"
+            )
+
+        # Cast dei valori verso i tipi reali (numeric arrotondato dal database)
+        select = [f"s.{qn('node_id')}", f"s.{qn('timestamp')}"]
+        for field in fields:
+            column = f"s.{qn(field.name)}"
+            if isinstance(field, models.DecimalField):
+                column = f"{column}::numeric({field.max_digits}, {field.decimal_places})"
+            select.append(column)
+
+        table = qn(SensorReading._meta.db_table)
+        target = ', '.join(
+            [qn(SensorReading._meta.get_field('node').column), qn('timestamp')]
+            + [qn(field.column) for field in fields]
+        )
+        self.copy_sql = (
+            f"COPY {qn(STAGE_TABLE)} ({', '.join(qn(c) for c in stage_columns)}) "
+            f"FROM STDIN WITH (FORMAT binary)"
+        )
+        self.insert_sql = (
+            f"INSERT INTO {table} ({target}) "
+            f"SELECT {', '.join(select)} FROM {qn(STAGE_TABLE)} s "
+            f"ON CONFLICT ({qn(SensorReading._meta.get_field('node').column)}, {qn('timestamp')}) DO NOTHING"
+        )
+
+    # ===========================================
+    # Import
+    # ===========================================
+
+    def _open(self, path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rt', encoding='utf-8', newline='')
+        return open(path, 'r', encoding='utf-8', newline='')
+
+    def import_file(self, path):
+        stats = {'read': 0, 'inserted': 0, 'duplicates': 0, 'rejected': 0}
+        self.reported = 0
+        started = time.monotonic()
+
+        try:
+            handle = self._open(path)
+        except OSError as e:
+            raise CommandError(f"Impossibile aprire {path}: {e}")
+
+        with handle:
+            reader = csv.DictReader(handle, delimiter=self.delimiter)
+            missing = {'node_id', 'timestamp'} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f"{path}: colonne mancanti {', '.join(sorted(missing))}")
+
+            buffer = io.BytesIO()
+            buffer.write(COPY_HEADER)
+            pending = 0
+
+            for row in reader:
+                stats['read'] += 1
+                record = self._encode(path, reader.line_num, row)
+                if record is None:
+                    stats['rejected'] += 1
+                    continue
+                buffer.write(record)
+                pending += 1
+
+                if pending >= self.chunk_size:
+                    self._flush(buffer, pending, stats)
+                    self._progress(path, stats, started)
+                    buffer = io.BytesIO()
+                    buffer.write(COPY_HEADER)
+                    pending = 0
+
+            if pending:
+                self._flush(buffer, pending, stats)
+            self._progress(path, stats, started)
+
+        return stats
+
+    def _flush(self, buffer, pending, stats):
+        """Un blocco: COPY in staging + INSERT deduplicato, in una transazione"""
+        buffer.write(COPY_TRAILER)
+        buffer.seek(0)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.copy_expert(self.copy_sql, buffer)
+                cursor.execute(self.insert_sql)
+                inserted = cursor.rowcount
+        stats['inserted'] += inserted
+        stats['duplicates'] += pending - inserted
+
+    def _progress(self, path, stats, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f"{path}: {stats['read']} righe lette, {stats['inserted']} inserite, "
+            f"{stats['duplicates']} duplicate, {stats['rejected']} scartate "
+            f"({stats['read'] / elapsed:.0f} righe/s)"
+        )
+
+    def _reject(self, path, line, reason):
+        if self.reported < MAX_REPORTED_ERRORS:
+            self.stderr.write(f"{path}:{line}: {reason}")
+        elif self.reported == MAX_REPORTED_ERRORS:
+            self.stderr.write(f"{path}: altri errori omessi")
+        self.reported += 1
+        return None
+
+    # ===========================================
+    # Codifica riga
+    # ===========================================
+
+    def _node_pk(self, node_id):
+        pk = self.nodes.get(node_id)
+        if pk is None and self.create_nodes:
+            from apps.core import counters
+            from apps.nodes.models import Node, NodeType
+
+            node, created = Node.objects.get_or_create(
+                node_id=node_id,
+                defaults={'name': f'Nodo {node_id}', 'node_type': NodeType.AMBIENT}
+            )
+            if created:
+                counters.node_created(node.status, node.is_active)
+            pk = self.nodes[node_id] = node.id
+        return pk
+
+    def _parse_timestamp(self, text):
+        try:
+            value = datetime.fromtimestamp(float(text), tz=dt_timezone.utc)
+        except ValueError:
+            value = datetime.fromisoformat(text)
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=self.tz)
+        return value
+
+    def _encode(self, path, line, row):
+        """Riga CSV -> tupla COPY binaria (None se scartata)"""
+        node_id = (row.get('node_id') or '').strip()
+        if not node_id:
+            return self._reject(path, line, 'node_id mancante')
+        pk = self._node_pk(node_id)
+        if pk is None:
+            return self._reject(path, line, f'nodo {node_id} non registrato')
+
+        try:
+            timestamp = self._parse_timestamp((row.get('timestamp') or '').strip())
+        except (ValueError, OverflowError, OSError):
+            return self._reject(path, line, f"timestamp non valido: {row.get('timestamp')!r}")
+
+        values = dict.fromkeys(self.value_fields)
+        for key, text in row.items():
+            name = ingest.ALIASES.get(key, key)
+            check = self.checkers.get(name)
+            if check is None or text is None or not text.strip():
+                continue
+            try:
+                values[name] = check(float(text))
+            except (ValueError, OverflowError) as e:
+                return self._reject(path, line, f'{key}: {e}')
+
+        parts = [
+            struct.pack('>h', 2 + len(self.value_fields)),
+            _BIGINT.pack(8, pk),
+            _BIGINT.pack(8, _timestamp_micros(timestamp)),
+        ]
+        for name, encoder in zip(self.value_fields, self.encoders):
+            value = values[name]
+            if value is None:
+                parts.append(NULL)
+            elif encoder is _FLOAT:
+                parts.append(encoder.pack(8, float(value)))
+            else:
+                parts.append(encoder.pack(4, value))
+        return b''.join(parts)
@@ -4,22 +4,28 @@ AgriSecure IoT System - MQTT Subscriber
 Management command Django che si connette al broker MQTT
 e processa i messaggi in arrivo dai gateway IoT.
 
+Gli eventi di dominio (letture, allarmi, stato nodi) vengono pubblicati
+sull'event bus interno dopo il commit e inoltrati ai client WebSocket.
+
 Usage:
-    python manage.py mqtt_subscriber
+    python manage.py mqtt_subscriber [--no-realtime]
 """
 
 import json
 import logging
-from datetime import datetime, timezone as dt_timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
 from decimal import Decimal
 
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
+from django.db import IntegrityError, transaction
 
 import paho.mqtt.client as mqtt
 
+from apps.core import counters, events, outbox, versions
+from apps.core.dedup import RecentKeys
+from apps.nodes import liveness
 from apps.nodes.models import Node, NodeStatus, NodeType, NodeHeartbeat, NodeEvent
 from apps.sensors.models import SensorReading, SensorAlert
 from apps.security.models import SecurityEvent, Alarm, IntrusionClass, AlarmPriority
@@ -32,10 +38,13 @@ class MQTTSubscriber:
     Gestisce la connessione MQTT e il processing dei messaggi
     """
     
-    def __init__(self):
+    def __init__(self, realtime=True):
         self.config = settings.MQTT_CONFIG
         self.client = None
         self.connected = False
+        self.fanout = None
+        self.realtime = realtime
+        self.recent = RecentKeys(self.config.get('DEDUP_CACHE_SIZE', 10000))
         
     def connect(self):
         """Stabilisce connessione al broker MQTT"""
@@ -123,6 +132,10 @@ class MQTTSubscriber:
         
         logger.info(f"Dati sensori da {node_id}")
         
+        replay_key = self._replay_key('sensors', node_id, payload)
+        if replay_key is None:
+            return
+        
         # Trova o crea nodo
         node, created = Node.objects.get_or_create(
             node_id=node_id,
@@ -134,26 +147,47 @@ class MQTTSubscriber:
         
         if created:
             logger.info(f"Nuovo nodo creato: {node_id}")
+            counters.node_created(node.status, node.is_active)
         
         # Aggiorna stato nodo
-        node.last_seen = timezone.now()
-        node.status = NodeStatus.ONLINE
-        node.save(update_fields=['last_seen', 'status', 'updated_at'])
+        self._mark_online(node)
         
-        # Crea lettura sensore
-        reading = SensorReading.objects.create(
-            node=node,
-            timestamp=self._parse_timestamp(payload.get('timestamp')),
-            temperature=self._to_decimal(payload.get('temperature')),
-            humidity=self._to_decimal(payload.get('humidity')),
-            pressure=self._to_decimal(payload.get('pressure')),
-            light_lux=payload.get('light'),
-            soil_moisture_raw=payload.get('soil_raw'),
-            soil_moisture_percent=payload.get('soil_moisture'),
-        )
+        # Crea lettura sensore (savepoint: un duplicato non annulla il resto)
+        timestamp = self._parse_timestamp(payload.get('timestamp'))
+        try:
+            with transaction.atomic():
+                reading = SensorReading.objects.create(
+                    node=node,
+                    timestamp=timestamp,
+                    temperature=self._to_decimal(payload.get('temperature')),
+                    humidity=self._to_decimal(payload.get('humidity')),
+                    pressure=self._to_decimal(payload.get('pressure')),
+                    light_lux=payload.get('light'),
+                    soil_moisture_raw=payload.get('soil_raw'),
+                    soil_moisture_percent=payload.get('soil_moisture'),
+                )
+        except IntegrityError:
+            logger.info(f"Lettura duplicata ignorata: {node_id} @ {timestamp}")
+            self._remember(replay_key)
+            return
+        self._remember(replay_key)
+        versions.bump(versions.READINGS)
         
         logger.info(f"Lettura salvata: T={reading.temperature}°C, H={reading.humidity}%")
         
+        events.publish(events.ReadingStored(
+            node_id=node.node_id,
+            reading_id=reading.id,
+            timestamp=reading.timestamp,
+            values={
+                'temperature': self._to_float(reading.temperature),
+                'humidity': self._to_float(reading.humidity),
+                'pressure': self._to_float(reading.pressure),
+                'light_lux': reading.light_lux,
+                'soil_moisture_percent': reading.soil_moisture_percent,
+            },
+        ))
+        
         # Verifica soglie e genera alert se necessario
         self._check_sensor_alerts(node, reading)
     
@@ -170,6 +204,10 @@ class MQTTSubscriber:
         
         logger.info(f"Evento sicurezza da {node_id}: {classification_raw} (priorità: {priority_raw})")
         
+        replay_key = self._replay_key('security', node_id, payload)
+        if replay_key is None:
+            return
+        
         # Trova o crea nodo
         node, created = Node.objects.get_or_create(
             node_id=node_id,
@@ -179,10 +217,11 @@ class MQTTSubscriber:
             }
         )
         
+        if created:
+            counters.node_created(node.status, node.is_active)
+        
         # Aggiorna stato nodo
-        node.last_seen = timezone.now()
-        node.status = NodeStatus.ONLINE
-        node.save(update_fields=['last_seen', 'status', 'updated_at'])
+        self._mark_online(node)
         
         # Mappa classificazione - supporta sia valori numerici che stringhe
         class_map = {
@@ -224,21 +263,47 @@ class MQTTSubscriber:
         }
         alarm_priority = priority_map.get(priority_raw, AlarmPriority.MEDIUM)
         
-        # Crea evento sicurezza
-        event = SecurityEvent.objects.create(
-            node=node,
-            timestamp=self._parse_timestamp(payload.get('timestamp')),
-            classification=intrusion_class,
-            priority=alarm_priority,
-            pir_main=payload.get('pir_main', False),
-            pir_backup=payload.get('pir_backup', False),
-            motion_confirmed=payload.get('pir_main', False) and payload.get('pir_backup', False),
-            tamper_detected=payload.get('tamper', False),
-            accel_x=self._to_decimal(payload.get('accel_x')),
-            accel_y=self._to_decimal(payload.get('accel_y')),
-            accel_z=self._to_decimal(payload.get('accel_z')),
-            raw_data=payload,
-        )
+        # Crea evento sicurezza (un replay non deve generare un secondo allarme)
+        timestamp = self._parse_timestamp(payload.get('timestamp'))
+        fields = {
+            'classification': intrusion_class,
+            'priority': alarm_priority,
+            'pir_main': payload.get('pir_main', False),
+            'pir_backup': payload.get('pir_backup', False),
+            'motion_confirmed': payload.get('pir_main', False) and payload.get('pir_backup', False),
+            'tamper_detected': payload.get('tamper', False),
+            'accel_x': self._to_decimal(payload.get('accel_x')),
+            'accel_y': self._to_decimal(payload.get('accel_y')),
+            'accel_z': self._to_decimal(payload.get('accel_z')),
+            'raw_data': payload,
+        }
+        try:
+            with transaction.atomic():
+                event = SecurityEvent.objects.create(node=node, timestamp=timestamp, **fields)
+        except IntegrityError:
+            # Eventi già salvati in quel secondo (compresi quelli spostati)
+            stored = list(SecurityEvent.objects.filter(
+                node=node,
+                timestamp__gte=timestamp,
+                timestamp__lt=timestamp + timedelta(seconds=1),
+            ).order_by('timestamp'))
+            if any(e.classification == intrusion_class and e.raw_data == payload for e in stored):
+                logger.info(f"Evento sicurezza duplicato ignorato: {node_id} @ {timestamp}")
+                self._remember(replay_key)
+                return
+            # Evento diverso nello stesso secondo (timestamp firmware a 1 s)
+            logger.warning(
+                f"Evento sicurezza {intrusion_class} da {node_id} in conflitto con "
+                f"{len(stored)} eventi @ {timestamp}: salvato comunque"
+            )
+            last = stored[-1].timestamp if stored else timestamp
+            event = SecurityEvent.objects.create(
+                node=node,
+                timestamp=last + timedelta(microseconds=1),
+                **fields
+            )
+        self._remember(replay_key)
+        versions.bump(versions.SECURITY_EVENTS)
         
         logger.info(f"Evento sicurezza salvato: {event.id} - {intrusion_class}")
         
@@ -253,6 +318,7 @@ class MQTTSubscriber:
                 siren_activated=True,
                 lights_activated=True,
             )
+            self._alarm_created(alarm, node)
             
             logger.warning(f"!!! ALLARME CRITICO {alarm.id} !!! {intrusion_class} su {node_id}")
             
@@ -269,6 +335,7 @@ class MQTTSubscriber:
                 siren_activated=False,
                 lights_activated=True,
             )
+            self._alarm_created(alarm, node)
             logger.info(f"Warning: animale grande rilevato su {node_id}")
     
     @transaction.atomic
@@ -302,6 +369,13 @@ class MQTTSubscriber:
                 node_type=node_type_map.get(raw_type, NodeType.AMBIENT),
             )
             logger.info(f"Nuovo nodo creato da heartbeat: {node_id} ({raw_type})")
+            counters.node_created(node.status, node.is_active)
+        
+        # Contatori dashboard
+        previous_status = node.status
+        counters.node_status_changed(previous_status, NodeStatus.ONLINE, is_active=node.is_active)
+        if 'battery' in payload:
+            counters.battery_changed(node.battery_percentage, payload['battery'], is_active=node.is_active)
         
         # Aggiorna dati nodo
         node.last_seen = timezone.now()
@@ -315,11 +389,21 @@ class MQTTSubscriber:
             node.battery_percentage = payload['battery']
         
         node.save()
+        liveness.touch(node.node_id, node.last_seen)
+        versions.bump(versions.NODES)
         
         logger.debug(f"Nodo {node_id} aggiornato: status=online, battery={node.battery_percentage}")
         
+        events.publish(events.NodeStateChanged(
+            node_id=node.node_id,
+            old_status=previous_status,
+            new_status=node.status,
+            last_seen=node.last_seen,
+            battery_percentage=node.battery_percentage,
+        ))
+        
         # Crea record heartbeat
-        NodeHeartbeat.objects.create(
+        heartbeat = NodeHeartbeat.objects.create(
             node=node,
             uptime_seconds=payload.get('uptime', 0),
             free_heap_kb=payload.get('heap_free', 0) // 1024 if payload.get('heap_free') else 0,
@@ -327,6 +411,48 @@ class MQTTSubscriber:
             battery_percentage=payload.get('battery'),
             mesh_neighbors=payload.get('mesh_peers', 0),
         )
+        
+        events.publish(events.HeartbeatReceived(
+            node_id=node.node_id,
+            timestamp=heartbeat.timestamp,
+            uptime_seconds=heartbeat.uptime_seconds,
+            rssi=heartbeat.rssi,
+            battery_percentage=heartbeat.battery_percentage,
+            mesh_neighbors=heartbeat.mesh_neighbors,
+            free_heap_kb=heartbeat.free_heap_kb,
+        ))
+    
+    def _mark_online(self, node):
+        """Aggiorna last_seen e porta il nodo online"""
+        previous_status = node.status
+        counters.node_status_changed(previous_status, NodeStatus.ONLINE, is_active=node.is_active)
+        node.last_seen = timezone.now()
+        node.status = NodeStatus.ONLINE
+        node.save(update_fields=['last_seen', 'status', 'updated_at'])
+        liveness.touch(node.node_id, node.last_seen)
+        versions.bump(versions.NODES)
+        
+        if previous_status != node.status:
+            events.publish(events.NodeStateChanged(
+                node_id=node.node_id,
+                old_status=previous_status,
+                new_status=node.status,
+                last_seen=node.last_seen,
+                battery_percentage=node.battery_percentage,
+            ))
+    
+    def _alarm_created(self, alarm, node):
+        """Aggiorna contatori e pubblica l'evento di nuovo allarme"""
+        counters.alarm_created(alarm.triggered_at)
+        versions.bump(versions.ALARMS)
+        events.publish(events.AlarmCreated(
+            alarm_id=alarm.id,
+            node_id=node.node_id,
+            node_name=node.name or node.node_id,
+            priority=alarm.priority,
+            classification=alarm.classification,
+            triggered_at=alarm.triggered_at,
+        ))
     
     def _check_sensor_alerts(self, node, reading):
         """Verifica soglie sensori e genera alert"""
@@ -376,13 +502,34 @@ class MQTTSubscriber:
     
     def _send_alarm_notifications(self, alarm):
         """Invia notifiche per allarme critico"""
-        # Questo sarà gestito da Celery task
-        try:
-            from apps.notifications.tasks import send_alarm_notification
-            send_alarm_notification.delay(alarm.id)
-            logger.info(f"Notifica schedulata per allarme {alarm.id}")
-        except Exception as e:
-            logger.error(f"Errore invio notifica allarme: {e}")
+        # Scritta nell'outbox nella stessa transazione dell'allarme:
+        # il task Celery parte solo dopo il commit (outbox_relay)
+        outbox.enqueue_task(
+            'apps.notifications.tasks.send_alarm_notification',
+            args=[alarm.id]
+        )
+        logger.info(f"Notifica accodata per allarme {alarm.id}")
+    
+    def _replay_key(self, kind, node_id, payload):
+        """
+        Chiave di deduplica del messaggio, None se è un replay recente
+        
+        I messaggi senza timestamp ricevono l'ora corrente e non sono
+        mai considerati duplicati (chiave vuota).
+        """
+        ts = payload.get('timestamp')
+        if ts is None or not isinstance(ts, (int, float, str)):
+            return ()
+        key = (kind, node_id, ts)
+        if key in self.recent:
+            logger.info(f"Replay ignorato: {kind} {node_id} @ {ts}")
+            return None
+        return key
+    
+    def _remember(self, key):
+        """Registra la chiave nel filtro solo a transazione confermata"""
+        if key:
+            transaction.on_commit(lambda: self.recent.add(key))
     
     def _parse_timestamp(self, ts):
         """Converte timestamp in datetime"""
@@ -395,6 +542,10 @@ class MQTTSubscriber:
             return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
         return timezone.now()
     
+    def _to_float(self, value):
+        """Converte Decimal/None in float per i payload JSON"""
+        return float(value) if value is not None else None
+    
     def _to_decimal(self, value):
         """Converte valore in Decimal"""
         if value is None:
@@ -409,6 +560,11 @@ class MQTTSubscriber:
         if not self.connect():
             return
         
+        # Fan-out WebSocket alimentato dall'event bus (post-commit)
+        if self.realtime:
+            from apps.core.realtime import WebSocketFanout
+            self.fanout = WebSocketFanout().start()
+        
         logger.info("MQTT Subscriber avviato")
         try:
             self.client.loop_forever()
@@ -416,13 +572,22 @@ class MQTTSubscriber:
             logger.info("Interruzione richiesta")
         finally:
             self.client.disconnect()
+            if self.fanout:
+                self.fanout.stop()
             logger.info("MQTT Subscriber terminato")
 
 
 class Command(BaseCommand):
     help = 'Avvia il subscriber MQTT per ricevere dati dai gateway IoT'
     
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-realtime',
+            action='store_true',
+            help='Non inviare aggiornamenti ai client WebSocket'
+        )
+    
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Avvio MQTT Subscriber...'))
-        subscriber = MQTTSubscriber()
+        subscriber = MQTTSubscriber(realtime=not options['no_realtime'])
         subscriber.run()
@@ -0,0 +1,80 @@
+"""
+AgriSecure IoT System - Node Watchdog
+
+Management command Django che applica le transizioni WARNING/OFFLINE
+entro pochi secondi dalla scadenza, leggendo l'indice di liveness Redis
+(apps.nodes.liveness) aggiornato dal subscriber MQTT.
+
+Lo stato viene sempre ricontrollato sul database (apps.nodes.health):
+un nodo tornato attivo nel frattempo non cambia stato.
+
+Usage:
+    python manage.py node_watchdog [--interval 1]
+"""
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from apps.core import outbox
+from apps.nodes import health, liveness
+
+logger = logging.getLogger('agrisecure')
+
+
+class Command(BaseCommand):
+    help = 'Rileva in tempo reale i nodi silenziosi (WARNING/OFFLINE)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Attesa massima in secondi tra due controlli'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        count = liveness.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Avvio Node Watchdog ({count} nodi monitorati)...'))
+
+        try:
+            while True:
+                try:
+                    self.check()
+                    wait = self._until_next_deadline(interval)
+                except Exception as e:
+                    logger.error(f"Errore node watchdog: {e}")
+                    close_old_connections()
+                    wait = interval * 5
+                time.sleep(wait)
+        except KeyboardInterrupt:
+            logger.info("Node watchdog terminato")
+
+    def check(self):
+        """Applica le transizioni ai nodi con scadenza superata"""
+        now = timezone.now()
+        expired = set(liveness.pop_expired(liveness.WARNING, now))
+        expired.update(liveness.pop_expired(liveness.OFFLINE, now))
+        if not expired:
+            return
+
+        # Transizioni e notifica nella stessa transazione: nessun nodo
+        # OFFLINE senza avviso in outbox
+        with transaction.atomic():
+            changes = health.sweep(node_ids=expired, now=now)
+            if changes['offline']:
+                outbox.enqueue_task(
+                    'apps.notifications.tasks.notify_offline_nodes',
+                    args=[[n['node_id'] for n in changes['offline']]]
+                )
+
+    def _until_next_deadline(self, interval):
+        deadline = liveness.next_deadline()
+        if deadline is None:
+            return interval
+        return min(interval, max(deadline - time.time(), 0.05))
@@ -0,0 +1,78 @@
+"""
+AgriSecure IoT System - Outbox Relay
+
+Management command Django che consegna i messaggi dell'outbox
+transazionale (task Celery e comandi MQTT) a blocchi, dopo il commit
+delle transazioni che li hanno scritti.
+
+Usage:
+    python manage.py outbox_relay [--batch-size 100] [--interval 0.5] [--once]
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.core import metrics, outbox
+
+logger = logging.getLogger('agrisecure')
+
+
+class Command(BaseCommand):
+    help = "Consegna i messaggi dell'outbox a Celery e al broker MQTT"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.OUTBOX.get('BATCH_SIZE', 100),
+            help='Messaggi consegnati per transazione'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.OUTBOX.get('POLL_INTERVAL', 0.5),
+            help='Attesa in secondi quando la coda è vuota'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Svuota la coda una volta e termina'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        interval = options['interval']
+
+        if options['once']:
+            total = 0
+            while True:
+                count = outbox.relay_batch(batch_size)
+                total += count
+                if count < batch_size:
+                    break
+            metrics.flush()
+            self.stdout.write(self.style.SUCCESS(f"Outbox: {total} messaggi elaborati"))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Avvio Outbox Relay...'))
+        logger.info(f"Outbox relay avviato (blocchi da {batch_size}, polling {interval}s)")
+        try:
+            while True:
+                try:
+                    count = outbox.relay_batch(batch_size)
+                except Exception as e:
+                    logger.error(f"Errore outbox relay: {e}")
+                    close_old_connections()
+                    count = 0
+                    time.sleep(interval * 10)
+
+                metrics.flush_if_due()
+                # Coda non vuota: prosegue subito con il blocco successivo
+                if count < batch_size:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            logger.info("Outbox relay terminato")
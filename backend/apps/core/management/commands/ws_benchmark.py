@@ -0,0 +1,265 @@
+"""
+AgriSecure IoT System - WebSocket Benchmark
+
+Management command Django che misura quanti client WebSocket lo stack
+ASGI (agrisecure/asgi.py) riesce a servire: apre N connessioni
+concorrenti verso ws/dashboard/ e ws/alarms/ in-process, inietta
+broadcast sui gruppi a una frequenza configurabile e riporta:
+
+- tempo di setup delle connessioni (percentili)
+- latenza di fan-out dal group_send alla ricezione (percentili)
+- frame consegnati rispetto agli attesi (accorpati/scartati dal backpressure)
+- memoria per connessione (tracemalloc)
+
+Client e server girano nello stesso processo: la memoria misurata
+include anche i communicator di test, quindi è un limite superiore.
+
+Usage:
+    python manage.py ws_benchmark --clients 2000 --rate 5 --duration 30
+    python manage.py ws_benchmark --layer redis --paths ws/alarms/
+"""
+
+import asyncio
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+LATENCY_KEY = 'bench_sent_at'
+
+# Endpoint supportati e gruppo Channels su cui vengono iniettati i broadcast
+GROUP_MESSAGES = {
+    'ws/dashboard/': 'dashboard_updates',
+    'ws/alarms/': 'alarms_updates',
+}
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """Percentili nearest-rank di una lista di valori"""
+    if not values:
+        return {p: None for p in points}
+    values = sorted(values)
+    return {
+        p: values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+        for p in points
+    }
+
+
+class BenchmarkClient:
+    """Client WebSocket simulato che registra la latenza dei frame ricevuti"""
+
+    def __init__(self, application, path):
+        from channels.testing import WebsocketCommunicator
+
+        self.path = path
+        self.communicator = WebsocketCommunicator(application, path)
+        self.connected = False
+        self.setup_time = None
+        self.latencies = []
+        self.received = 0
+        self.closed_code = None
+
+    async def connect(self, timeout):
+        start = time.perf_counter()
+        self.connected, _code = await self.communicator.connect(timeout=timeout)
+        self.setup_time = time.perf_counter() - start
+        return self.connected
+
+    async def listen(self, stop_at):
+        """Riceve frame fino a `stop_at` (perf_counter)"""
+        while True:
+            remaining = stop_at - time.perf_counter()
+            if remaining <= 0:
+                return
+            try:
+                message = await self.communicator.receive_output(timeout=remaining)
+            except asyncio.TimeoutError:
+                return
+
+            if message['type'] == 'websocket.close':
+                self.closed_code = message.get('code')
+                return
+
+            received_at = time.perf_counter()
+            self.received += 1
+            sent_at = self._sent_at(message.get('text'))
+            if sent_at is not None:
+                self.latencies.append(received_at - sent_at)
+
+    @staticmethod
+    def _sent_at(text):
+        if not text:
+            return None
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            return None
+        for key in ('data', 'alarm'):
+            body = payload.get(key)
+            if isinstance(body, dict) and LATENCY_KEY in body:
+                return body[LATENCY_KEY]
+        return None
+
+    async def disconnect(self):
+        try:
+            await self.communicator.disconnect()
+        except Exception:
+            pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark dei consumer WebSocket (connessioni concorrenti, fan-out, memoria)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000,
+                            help='Connessioni concorrenti totali (default: 1000)')
+        parser.add_argument('--paths', nargs='+', default=list(GROUP_MESSAGES),
+                            help='Endpoint tra cui ripartire i client')
+        parser.add_argument('--layer', choices=['memory', 'redis'], default='memory',
+                            help='Channel layer: in-memory o Redis configurato')
+        parser.add_argument('--rate', type=float, default=1.0,
+                            help='Broadcast al secondo per gruppo (default: 1)')
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Durata della fase di broadcast in secondi')
+        parser.add_argument('--connect-concurrency', type=int, default=200,
+                            help='Handshake contemporanei durante il setup')
+        parser.add_argument('--connect-timeout', type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        unknown = [path for path in options['paths'] if path not in GROUP_MESSAGES]
+        if unknown:
+            raise CommandError(f"Endpoint non supportati: {', '.join(unknown)}")
+        if options['clients'] < 1 or options['rate'] <= 0:
+            raise CommandError('--clients e --rate devono essere positivi')
+
+        self._configure_layer(options['layer'])
+        results = asyncio.run(self._run(options))
+        self._report(results, options)
+
+    def _configure_layer(self, layer):
+        from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+
+        if layer == 'memory':
+            channel_layers.set(DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer(capacity=1000))
+
+    async def _run(self, options):
+        from channels.layers import get_channel_layer
+        from agrisecure.asgi import application
+
+        paths = options['paths']
+        clients = [
+            BenchmarkClient(application, paths[i % len(paths)])
+            for i in range(options['clients'])
+        ]
+
+        # Setup connessioni
+        tracemalloc.start()
+        memory_before, _peak = tracemalloc.get_traced_memory()
+        semaphore = asyncio.Semaphore(options['connect_concurrency'])
+
+        async def connect(client):
+            async with semaphore:
+                try:
+                    await client.connect(options['connect_timeout'])
+                except asyncio.TimeoutError:
+                    client.connected = False
+
+        setup_start = time.perf_counter()
+        await asyncio.gather(*(connect(client) for client in clients))
+        setup_total = time.perf_counter() - setup_start
+        connected = [client for client in clients if client.connected]
+
+        # Scarta i messaggi iniziali (snapshot/stats) prima di misurare
+        await asyncio.gather(*(client.listen(time.perf_counter() + 1.0) for client in connected))
+        for client in connected:
+            client.latencies.clear()
+            client.received = 0
+
+        memory_after, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # Fase di broadcast
+        layer = get_channel_layer()
+        stop_at = time.perf_counter() + options['duration']
+        listeners = [
+            asyncio.ensure_future(client.listen(stop_at + 2.0))
+            for client in connected
+        ]
+        sent = await self._inject(layer, paths, options['rate'], stop_at)
+        await asyncio.gather(*listeners)
+
+        await asyncio.gather(*(client.disconnect() for client in connected))
+
+        return {
+            'clients': clients,
+            'connected': connected,
+            'setup_total': setup_total,
+            'memory': memory_after - memory_before,
+            'sent': sent,
+        }
+
+    async def _inject(self, layer, paths, rate, stop_at):
+        """Invia broadcast a ogni gruppo finché non scade la durata"""
+        interval = 1.0 / rate
+        sent = {path: 0 for path in paths}
+        sequence = 0
+
+        while time.perf_counter() < stop_at:
+            tick = time.perf_counter()
+            sequence += 1
+            for path in paths:
+                await layer.group_send(GROUP_MESSAGES[path], self._message(path, sequence))
+                sent[path] += 1
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - tick)))
+        return sent
+
+    @staticmethod
+    def _message(path, sequence):
+        body = {'sequence': sequence, LATENCY_KEY: time.perf_counter()}
+        if path == 'ws/alarms/':
+            return {'type': 'alarm_new', 'alarm': body}
+        return {'type': 'dashboard_update', 'data': body}
+
+    def _report(self, results, options):
+        clients = results['clients']
+        connected = results['connected']
+        write = self.stdout.write
+
+        write(self.style.SUCCESS('\n=== WebSocket Benchmark ==='))
+        write(f"Channel layer: {options['layer']}  |  rate: {options['rate']}/s per gruppo  "
+              f"|  durata: {options['duration']}s")
+        write(f"Connessioni: {len(connected)}/{len(clients)} riuscite "
+              f"in {results['setup_total']:.2f}s")
+
+        setup = percentiles([client.setup_time for client in connected])
+        write('Setup connessione (ms): ' + self._format(setup))
+
+        if connected:
+            memory = results['memory'] / len(connected)
+            write(f"Memoria per connessione: {memory / 1024:.1f} KiB "
+                  f"(totale {results['memory'] / 1024 / 1024:.1f} MiB)")
+
+        for path in options['paths']:
+            group = [client for client in connected if client.path == path]
+            if not group:
+                continue
+            expected = results['sent'][path] * len(group)
+            received = sum(client.received for client in group)
+            latencies = [latency for client in group for latency in client.latencies]
+            closed = sum(1 for client in group if client.closed_code is not None)
+
+            write(f"\n{path}  ({len(group)} client, {results['sent'][path]} broadcast)")
+            write(f"  Frame consegnati: {received}/{expected}"
+                  + (f" ({received / expected * 100:.1f}%)" if expected else ''))
+            write('  Latenza fan-out (ms): ' + self._format(percentiles(latencies)))
+            if closed:
+                write(self.style.WARNING(f"  Client disconnessi dal server: {closed}"))
+
+    @staticmethod
+    def _format(values):
+        return '  '.join(
+            f"p{point}={value * 1000:.1f}" if value is not None else f"p{point}=n/a"
+            for point, value in values.items()
+        )
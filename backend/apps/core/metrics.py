@@ -0,0 +1,105 @@
+"""
+AgriSecure IoT System - Metriche
+
+Contatori di processo accumulati in memoria e scaricati periodicamente
+su un hash Redis condiviso, così da poterli incrementare anche da
+codice asincrono senza una chiamata di rete per ogni evento.
+
+Usage:
+    from apps.core import metrics
+
+    metrics.incr('ws.frames.dropped')
+    metrics.flush_if_due()
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger('agrisecure')
+
+REDIS_KEY = 'agrisecure:metrics'
+
+# Intervallo minimo tra due flush dello stesso processo (secondi)
+FLUSH_INTERVAL = 10
+
+_pending = Counter()
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def incr(name, amount=1):
+    """Incrementa un contatore (solo in memoria, nessun I/O)"""
+    with _lock:
+        _pending[name] += amount
+
+
+def observe(name, value, buckets):
+    """
+    Registra un valore in un istogramma cumulativo
+
+    Produce `<name>.count`, `<name>.sum` e `<name>.le_<bucket>`
+    (valori <= bucket), sufficienti per medie e verifica degli SLO.
+    """
+    with _lock:
+        _pending[f"{name}.count"] += 1
+        _pending[f"{name}.sum"] += float(value)
+        for bucket in buckets:
+            if value <= bucket:
+                _pending[f"{name}.le_{bucket}"] += 1
+
+
+def gauge(name, value):
+    """Imposta subito un valore istantaneo (es. profondità di una coda)"""
+    from django_redis import get_redis_connection
+    get_redis_connection('default').hset(REDIS_KEY, name, value)
+
+
+def is_flush_due():
+    return bool(_pending) and time.monotonic() - _last_flush >= FLUSH_INTERVAL
+
+
+def flush():
+    """Scarica i contatori pendenti sull'hash Redis condiviso"""
+    global _last_flush
+
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    if not pending:
+        return
+    try:
+        from django_redis import get_redis_connection
+        pipe = get_redis_connection('default').pipeline(transaction=False)
+        for name, amount in pending.items():
+            if isinstance(amount, float):
+                pipe.hincrbyfloat(REDIS_KEY, name, amount)
+            else:
+                pipe.hincrby(REDIS_KEY, name, amount)
+        pipe.execute()
+    except Exception as e:
+        # Rimette i contatori in coda per il prossimo flush
+        with _lock:
+            _pending.update(pending)
+        logger.warning(f"Flush metriche fallito: {e}")
+
+
+def flush_if_due():
+    if is_flush_due():
+        flush()
+
+
+def snapshot():
+    """Legge tutte le metriche aggregate dei processi"""
+    from django_redis import get_redis_connection
+
+    raw = get_redis_connection('default').hgetall(REDIS_KEY)
+    values = {}
+    for name, value in raw.items():
+        name = name.decode() if isinstance(name, bytes) else name
+        value = value.decode() if isinstance(value, bytes) else value
+        values[name] = float(value) if '.' in value else int(value)
+    return dict(sorted(values.items()))
@@ -0,0 +1,61 @@
+"""
+AgriSecure IoT System - Models Core
+
+Definisce i modelli infrastrutturali condivisi:
+- Outbox transazionale per task Celery e comandi MQTT
+"""
+
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxMessage(models.Model):
+    """
+    Messaggio in uscita scritto nella stessa transazione dei dati
+
+    Il relay (manage.py outbox_relay) lo consegna a Celery o al broker
+    MQTT solo dopo il commit: se la transazione viene annullata il
+    messaggio non esiste, se il broker è giù resta in coda.
+    """
+    class Kind(models.TextChoices):
+        CELERY_TASK = 'celery_task', 'Task Celery'
+        MQTT = 'mqtt', 'Messaggio MQTT'
+
+    kind = models.CharField(
+        max_length=15,
+        choices=Kind.choices
+    )
+    destination = models.CharField(
+        max_length=200,
+        help_text="Nome del task Celery o topic MQTT"
+    )
+    payload = models.JSONField(
+        default=dict,
+        help_text="Argomenti del task o payload MQTT"
+    )
+
+    # Consegna
+    created_at = models.DateTimeField(default=timezone.now)
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Prossimo tentativo di consegna"
+    )
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        db_table = 'outbox_messages'
+        ordering = ['id']
+        verbose_name = 'Messaggio Outbox'
+        verbose_name_plural = 'Messaggi Outbox'
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(sent_at__isnull=True),
+                name='outbox_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.destination} ({'inviato' if self.sent_at else 'in coda'})"
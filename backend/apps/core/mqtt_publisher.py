@@ -67,14 +67,7 @@ def publish_command(node_id, command, params=None):
     # Costruisci topic
     # Format: agrisecure/{gateway_id}/command
     topic = f"agrisecure/{node_id}/command"
-    
-    # Payload
-    payload = {
-        'command': command,
-        'target': node_id,
-        'params': params or {},
-        'timestamp': int(__import__('time').time())
-    }
+    payload = _command_payload(node_id, command, params)
     
     try:
         result = client.publish(
@@ -107,28 +100,11 @@ def publish_arm_command(mode, node_ids):
     if not client:
         return False
     
-    command = 'arm' if mode != 'disarmed' else 'disarm'
-    
-    payload = {
-        'command': command,
-        'mode': mode,
-        'targets': node_ids,
-        'timestamp': int(__import__('time').time())
-    }
-    
-    # Pubblica su topic broadcast per tutti i gateway
-    topic = "agrisecure/+/command"
+    payload = _arm_payload(mode, node_ids)
     
     # Per ogni gateway, pubblica il comando
-    from apps.nodes.models import Node, NodeType
-    
-    gateways = Node.objects.filter(
-        node_type=NodeType.GATEWAY,
-        is_active=True
-    ).values_list('node_id', flat=True)
-    
     success = True
-    for gw_id in gateways:
+    for gw_id in _active_gateways():
         topic = f"agrisecure/{gw_id}/command"
         try:
             result = client.publish(
@@ -146,6 +122,64 @@ def publish_arm_command(mode, node_ids):
     return success
 
 
+def _command_payload(node_id, command, params=None):
+    return {
+        'command': command,
+        'target': node_id,
+        'params': params or {},
+        'timestamp': int(__import__('time').time())
+    }
+
+
+def _arm_payload(mode, node_ids):
+    return {
+        'command': 'arm' if mode != 'disarmed' else 'disarm',
+        'mode': mode,
+        'targets': node_ids,
+        'timestamp': int(__import__('time').time())
+    }
+
+
+def _active_gateways():
+    from apps.nodes.models import Node, NodeType
+    
+    return list(Node.objects.filter(
+        node_type=NodeType.GATEWAY,
+        is_active=True
+    ).values_list('node_id', flat=True))
+
+
+# ===========================================
+# Comandi via outbox transazionale
+# ===========================================
+
+def queue_command(node_id, command, params=None):
+    """
+    Accoda un comando a un nodo nell'outbox
+    
+    Il comando viene scritto nella transazione corrente e pubblicato da
+    outbox_relay dopo il commit, anche se il broker è momentaneamente giù.
+    """
+    from apps.core import outbox
+    
+    return outbox.enqueue_mqtt(
+        f"agrisecure/{node_id}/command",
+        _command_payload(node_id, command, params),
+        qos=settings.MQTT_CONFIG['QOS']
+    )
+
+
+def queue_arm_command(mode, node_ids):
+    """Accoda il comando di arma/disarma per tutti i gateway attivi"""
+    from apps.core import outbox
+    
+    payload = _arm_payload(mode, node_ids)
+    return [
+        outbox.enqueue_mqtt(f"agrisecure/{gw_id}/command", payload, qos=1)
+        for gw_id in _active_gateways()
+    ]
+
+
 def publish_config(node_id, config):
     """
     Pubblica nuova configurazione a un nodo
@@ -0,0 +1,245 @@
+"""
+AgriSecure IoT System - Outbox transazionale
+
+I produttori scrivono i messaggi in uscita (task Celery, comandi MQTT)
+nella tabella outbox, dentro la stessa transazione dei dati a cui si
+riferiscono. Il relay li legge a blocchi dopo il commit e li consegna:
+nessuna chiamata al broker dentro la transazione, nessun task che parte
+prima che la riga sia visibile, nessun messaggio perso se il broker è
+giù (consegna at-least-once; i consumer devono essere idempotenti).
+
+Usage:
+    from apps.core import outbox
+
+    with transaction.atomic():
+        alarm = Alarm.objects.create(...)
+        outbox.enqueue_task('apps.notifications.tasks.send_alarm_notification', args=[alarm.id])
+
+    python manage.py outbox_relay
+"""
+
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.models import OutboxMessage
+
+logger = logging.getLogger('agrisecure')
+
+# Attesa massima tra due tentativi di consegna falliti (secondi)
+MAX_BACKOFF = 300
+
+
+def _config(name, default):
+    return settings.OUTBOX.get(name, default)
+
+
+# ===========================================
+# Scrittura (dentro la transazione del chiamante)
+# ===========================================
+
+def enqueue_task(task_name, args=None, kwargs=None):
+    """Accoda l'esecuzione di un task Celery"""
+    return OutboxMessage.objects.create(
+        kind=OutboxMessage.Kind.CELERY_TASK,
+        destination=task_name,
+        payload={'args': list(args or []), 'kwargs': kwargs or {}},
+    )
+
+
+def enqueue_mqtt(topic, message, qos=1, retain=False):
+    """Accoda la pubblicazione di un messaggio MQTT"""
+    return OutboxMessage.objects.create(
+        kind=OutboxMessage.Kind.MQTT,
+        destination=topic,
+        payload={'message': message, 'qos': qos, 'retain': retain},
+    )
+
+
+# ===========================================
+# Relay
+# ===========================================
+
+class _Dispatcher:
+    """Consegna un blocco di messaggi riusando producer Celery e client MQTT"""
+
+    def __init__(self):
+        self._producer_context = None
+        self._producer = None
+        self._pending_mqtt = []
+
+    def deliver(self, message):
+        if message.kind == OutboxMessage.Kind.CELERY_TASK:
+            self._send_task(message)
+        else:
+            self._publish_mqtt(message)
+
+    def _send_task(self, message):
+        from agrisecure.celery import app
+
+        if self._producer is None:
+            self._producer_context = app.producer_or_acquire()
+            self._producer = self._producer_context.__enter__()
+        app.send_task(
+            message.destination,
+            args=message.payload.get('args', []),
+            kwargs=message.payload.get('kwargs', {}),
+            producer=self._producer,
+        )
+
+    def _publish_mqtt(self, message):
+        import paho.mqtt.client as mqtt
+        from apps.core.mqtt_publisher import get_mqtt_client
+
+        client = get_mqtt_client()
+        if client is None:
+            raise ConnectionError('Broker MQTT non raggiungibile')
+
+        info = client.publish(
+            message.destination,
+            json.dumps(message.payload.get('message')),
+            qos=message.payload.get('qos', 1),
+            retain=message.payload.get('retain', False),
+        )
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            raise ConnectionError(f"Pubblicazione MQTT fallita: {info.rc}")
+        self._pending_mqtt.append((message, info))
+
+    def confirm_mqtt(self, timeout=5):
+        """
+        Attende l'ack dei messaggi MQTT; restituisce quelli non confermati
+
+        `timeout` vale per l'intero blocco, non per messaggio: con il
+        broker che non risponde i lock SKIP LOCKED (compresi quelli dei
+        task Celery dello stesso blocco) restano al più `timeout` secondi.
+        """
+        deadline = time.monotonic() + timeout
+        failed = []
+        for message, info in self._pending_mqtt:
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                try:
+                    info.wait_for_publish(timeout=remaining)
+                except Exception:
+                    pass
+            if not info.is_published():
+                failed.append(message)
+        self._pending_mqtt = []
+        return failed
+
+    def close(self):
+        if self._producer_context is not None:
+            self._producer_context.__exit__(None, None, None)
+            self._producer_context = None
+            self._producer = None
+
+
+def relay_batch(batch_size=None):
+    """
+    Consegna un blocco di messaggi in attesa
+
+    Le righe vengono bloccate con SKIP LOCKED: più relay possono girare
+    in parallelo senza consegnare due volte lo stesso messaggio.
+
+    Returns:
+        int: messaggi elaborati (inviati o rinviati)
+    """
+    from apps.core import metrics
+
+    batch_size = batch_size or _config('BATCH_SIZE', 100)
+    max_attempts = _config('MAX_ATTEMPTS', 20)
+    now = timezone.now()
+
+    with transaction.atomic():
+        batch = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True).filter(
+                sent_at__isnull=True,
+                available_at__lte=now,
+                attempts__lt=max_attempts,
+            ).order_by('available_at', 'id')[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        failed = {}
+        dispatcher = _Dispatcher()
+        try:
+            for message in batch:
+                try:
+                    dispatcher.deliver(message)
+                except Exception as e:
+                    failed[message.id] = e
+            for message in dispatcher.confirm_mqtt(timeout=_config('MQTT_ACK_TIMEOUT', 5)):
+                failed[message.id] = TimeoutError('Ack MQTT non ricevuto')
+        finally:
+            dispatcher.close()
+
+        sent = []
+        retry = []
+        dead = []
+        for message in batch:
+            error = failed.get(message.id)
+            if error is None:
+                message.sent_at = now
+                sent.append(message)
+                continue
+
+            message.attempts += 1
+            message.last_error = str(error)[:1000]
+            message.available_at = now + timedelta(seconds=min(2 ** message.attempts, MAX_BACKOFF))
+            retry.append(message)
+            if message.attempts >= max_attempts:
+                dead.append(message)
+                logger.error(f"Outbox {message.id} ({message.destination}) scartato dopo {message.attempts} tentativi: {error}")
+
+        OutboxMessage.objects.bulk_update(sent, ['sent_at'])
+        OutboxMessage.objects.bulk_update(retry, ['attempts', 'last_error', 'available_at'])
+
+    metrics.incr('outbox.sent', len(sent))
+    if retry:
+        metrics.incr('outbox.failed', len(retry))
+        logger.warning(f"Outbox: {len(retry)} messaggi da ritentare")
+    if dead:
+        metrics.incr('outbox.dead', len(dead))
+        _alert_dead(dead)
+    return len(batch)
+
+
+def _alert_dead(messages):
+    """
+    Avvisa gli amministratori dei messaggi scartati
+
+    Inviato direttamente a Celery e non tramite outbox: se anche Celery è
+    giù restano il log, il contatore outbox.dead e il gauge
+    outbox.dead_pending registrato da record_queue_depths.
+    """
+    from agrisecure.celery import app
+
+    try:
+        app.send_task(
+            'apps.notifications.tasks.notify_outbox_dead',
+            args=[[message.id for message in messages]],
+        )
+    except Exception as e:
+        logger.error(f"Avviso messaggi outbox scartati non inviato: {e}")
+
+
+def dead_messages():
+    """Messaggi non consegnati che hanno esaurito i tentativi"""
+    return OutboxMessage.objects.filter(
+        sent_at__isnull=True,
+        attempts__gte=_config('MAX_ATTEMPTS', 20),
+    )
+
+
+def purge_sent(days=None):
+    """Elimina i messaggi consegnati più vecchi della retention"""
+    days = days if days is not None else _config('RETENTION_DAYS', 7)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = OutboxMessage.objects.filter(sent_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,112 @@
+"""
+AgriSecure IoT System - Fan-out WebSocket
+
+Collega l'event bus della pipeline di ingestion ai gruppi Channels.
+Sostituisce il bridge MQTT→WebSocket: nessuna seconda connessione al
+broker, nessuna seconda decodifica e nessuna lettura prima del commit.
+"""
+
+import logging
+import re
+
+from asgiref.sync import async_to_sync
+
+from apps.core import events
+from apps.core.broadcast import CoalescingBroadcaster
+from apps.core.dashboard import get_alarms_stats, get_dashboard_data
+
+logger = logging.getLogger('agrisecure')
+
+DASHBOARD_GROUP = 'dashboard_updates'
+ALARMS_GROUP = 'alarms_updates'
+
+
+def node_group_name(node_id):
+    """Nome del gruppo Channels per lo streaming di un singolo nodo"""
+    return 'node_' + re.sub(r'[^A-Za-z0-9_.-]', '_', node_id)[:90]
+
+
+class WebSocketFanout:
+    """Subscriber dell'event bus che aggiorna i client WebSocket"""
+
+    def __init__(self, channel_layer=None, interval=None):
+        self.broadcaster = CoalescingBroadcaster(channel_layer, interval)
+        self.broadcaster.register(DASHBOARD_GROUP, 'dashboard_update', 'data', get_dashboard_data)
+        self.broadcaster.register(ALARMS_GROUP, 'stats_update', 'stats', get_alarms_stats)
+        self.channel_layer = self.broadcaster.channel_layer
+
+        self._handlers = {
+            events.ReadingStored: self.on_reading_stored,
+            events.AlarmCreated: self.on_alarm_created,
+            events.NodeStateChanged: self.on_node_state_changed,
+            events.HeartbeatReceived: self.on_heartbeat_received,
+        }
+
+    def start(self):
+        """Registra gli handler sul bus e avvia il broadcaster"""
+        for event_type, handler in self._handlers.items():
+            events.subscribe(event_type, handler)
+        self.broadcaster.start()
+        logger.info(f"Fan-out WebSocket attivo (intervallo {self.broadcaster.interval}s)")
+        return self
+
+    def stop(self):
+        """Rimuove gli handler e invia gli ultimi aggiornamenti"""
+        for event_type, handler in self._handlers.items():
+            events.unsubscribe(event_type, handler)
+        self.broadcaster.stop()
+
+    def _send_to_node(self, node_id, message):
+        """Invia al gruppo del nodo: raggiunge solo i client in ascolto"""
+        try:
+            async_to_sync(self.channel_layer.group_send)(node_group_name(node_id), message)
+        except Exception as e:
+            logger.error(f"Errore streaming nodo {node_id}: {e}")
+
+    def on_reading_stored(self, event):
+        self.broadcaster.mark_dirty(DASHBOARD_GROUP)
+        self._send_to_node(event.node_id, {
+            'type': 'node_reading',
+            'reading': {
+                'id': event.reading_id,
+                'timestamp': event.timestamp.isoformat(),
+                **event.values,
+            }
+        })
+
+    def on_heartbeat_received(self, event):
+        self._send_to_node(event.node_id, {
+            'type': 'node_heartbeat',
+            'heartbeat': {
+                'timestamp': event.timestamp.isoformat(),
+                'uptime_seconds': event.uptime_seconds,
+                'rssi': event.rssi,
+                'battery_percentage': event.battery_percentage,
+                'mesh_neighbors': event.mesh_neighbors,
+                'free_heap_kb': event.free_heap_kb,
+            }
+        })
+
+    def on_node_state_changed(self, event):
+        self.broadcaster.mark_dirty(DASHBOARD_GROUP)
+
+    def on_alarm_created(self, event):
+        # Il nuovo allarme non viene mai accorpato: va inviato subito
+        try:
+            async_to_sync(self.channel_layer.group_send)(
+                ALARMS_GROUP,
+                {
+                    'type': 'alarm_new',
+                    'alarm': {
+                        'id': event.alarm_id,
+                        'node_id': event.node_id,
+                        'node_name': event.node_name,
+                        'priority': event.priority,
+                        'classification': event.classification,
+                        'triggered_at': event.triggered_at.isoformat(),
+                    }
+                }
+            )
+        except Exception as e:
+            logger.error(f"Errore invio nuovo allarme {event.alarm_id} via WebSocket: {e}")
+        self.broadcaster.mark_dirty(ALARMS_GROUP, DASHBOARD_GROUP)
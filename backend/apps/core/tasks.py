@@ -0,0 +1,53 @@
+"""
+AgriSecure IoT System - Core Tasks
+
+Task Celery di manutenzione per i componenti core
+"""
+
+import logging
+from celery import shared_task
+from django.conf import settings
+
+logger = logging.getLogger('agrisecure')
+
+
+@shared_task
+def reconcile_dashboard_counters():
+    """
+    Task schedulato: riallinea i contatori dashboard Redis con il database
+    """
+    from apps.core import counters
+    
+    stats = counters.reconcile()
+    logger.info(f"Contatori dashboard riallineati: {stats}")
+    return stats
+
+
+@shared_task
+def record_queue_depths():
+    """
+    Task schedulato: registra i messaggi in attesa su ogni coda Celery
+    """
+    from agrisecure.celery import app
+    from apps.core import metrics
+    
+    queues = {settings.CELERY_TASK_DEFAULT_QUEUE}
+    queues.update(route['queue'] for route in settings.CELERY_TASK_ROUTES.values())
+    
+    depths = {}
+    with app.connection_for_read() as connection:
+        channel = connection.default_channel
+        for queue in sorted(queues):
+            try:
+                depths[queue] = channel.queue_declare(queue, passive=True).message_count
+            except Exception:
+                # Coda non ancora creata da nessun worker
+                depths[queue] = 0
+                channel = connection.default_channel
+            metrics.gauge(f"celery.{queue}.depth", depths[queue])
+    
+    # Messaggi outbox scartati ancora in tabella (da verificare a mano)
+    from apps.core import outbox
+    metrics.gauge('outbox.dead_pending', outbox.dead_messages().count())
+    
+    return depths
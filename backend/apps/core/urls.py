@@ -40,7 +40,19 @@ def ready_check(request):
     return JsonResponse({'ready': True})
 
 
+def metrics_check(request):
+    """Contatori aggregati dei processi (WebSocket, code, ingestion)"""
+    from apps.core import metrics
+
+    metrics.flush()
+    try:
+        return JsonResponse({'metrics': metrics.snapshot()})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=503)
+
+
 urlpatterns = [
     path('', health_check, name='health-check'),
     path('ready/', ready_check, name='ready-check'),
+    path('metrics/', metrics_check, name='metrics-check'),
 ]
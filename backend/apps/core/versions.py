@@ -0,0 +1,80 @@
+"""
+AgriSecure IoT System - Versioni delle risorse
+
+Contatori di versione per risorsa (nodi, allarmi, letture, ...) in un
+hash Redis, incrementati dopo il commit di ogni scrittura. Le view in
+polling ne derivano ETag e Last-Modified (apps.api.conditional): se
+nessuna risorsa da cui dipendono è cambiata rispondono 304 senza
+interrogare il database.
+
+Il campo `epoch` cambia se l'hash viene perso (flush/restart di Redis),
+così una versione ripartita da zero non può riprodurre un vecchio ETag.
+"""
+
+import logging
+import time
+
+from django.db import transaction
+
+logger = logging.getLogger('agrisecure')
+
+KEY = 'agrisecure:versions'
+
+NODES = 'nodes'
+ALARMS = 'alarms'
+READINGS = 'readings'
+SECURITY_EVENTS = 'security_events'
+ARM = 'arm'
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def _apply(resources):
+    try:
+        now = time.time()
+        pipe = _redis().pipeline(transaction=True)
+        for resource in resources:
+            pipe.hincrby(KEY, resource, 1)
+            pipe.hset(KEY, f"{resource}:ts", now)
+        pipe.execute()
+    except Exception as e:
+        # Senza versioni aggiornate le view rispondono 200 fino al prossimo bump
+        logger.warning(f"Aggiornamento versioni {resources} fallito: {e}")
+
+
+def bump(*resources):
+    """Segna le risorse come modificate (dopo il commit della transazione)"""
+    transaction.on_commit(lambda: _apply(resources))
+
+
+def get(*resources):
+    """
+    Stato corrente delle risorse in una sola HMGET
+
+    Returns:
+        (token, last_modified): token opaco che cambia a ogni bump e
+        timestamp dell'ultima modifica; None se Redis non risponde
+    """
+    fields = ['epoch']
+    for resource in resources:
+        fields += [resource, f"{resource}:ts"]
+    try:
+        redis = _redis()
+        values = redis.hmget(KEY, fields)
+        if values[0] is None:
+            redis.hsetnx(KEY, 'epoch', int(time.time() * 1000))
+            values = redis.hmget(KEY, fields)
+    except Exception as e:
+        logger.warning(f"Lettura versioni fallita: {e}")
+        return None
+
+    # [epoch, r1, r1:ts, r2, r2:ts, ...]: contatori nel token, timestamp
+    # solo per Last-Modified
+    values = [v.decode() if isinstance(v, bytes) else v for v in values]
+    counts = [values[0]] + values[1::2]
+    stamps = [float(v) for v in values[2::2] if v is not None]
+    token = '.'.join(v or '0' for v in counts)
+    return token, max(stamps) if stamps else None
@@ -14,10 +14,10 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
 from django.utils import timezone
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.conf import settings
 
+from apps.core import counters, versions
 from apps.nodes.models import Node, NodeHeartbeat
 from apps.sensors.models import SensorReading, SensorAlert
 from apps.security.models import SecurityEvent, Alarm, SystemArmState
@@ -57,18 +57,10 @@ def logout_view(request):
 @login_required
 def dashboard(request):
     """Dashboard principale"""
-    now = timezone.now()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    # Statistiche nodi
-    nodes = Node.objects.all()
-    total_nodes = nodes.count()
-    nodes_online = nodes.filter(status='online').count()
-    nodes_offline = nodes.filter(status='offline').count()
+    # Conteggi dai contatori incrementali (singola MGET)
+    stats = counters.get_dashboard_counters()
     
-    # Allarmi
-    active_alarms = Alarm.objects.filter(status__in=['active', 'acknowledged']).count()
-    alarms_today = Alarm.objects.filter(triggered_at__gte=today_start).count()
+    # Allarmi recenti
     recent_alarms = Alarm.objects.filter(
         status__in=['active', 'acknowledged']
     ).select_related('node').order_by('-triggered_at')[:5]
@@ -84,25 +76,22 @@ def dashboard(request):
     latest_humidity = latest_reading.humidity if latest_reading else None
     latest_soil = latest_reading.soil_moisture_percent if latest_reading else None
     
-    # Batterie basse
-    battery_warnings = nodes.filter(battery_percentage__lt=20, battery_percentage__isnull=False).count()
-    
     # Dati per il grafico
     chart_data = get_chart_data(hours=24)
     
     context = {
-        'total_nodes': total_nodes,
-        'nodes_online': nodes_online,
-        'nodes_offline': nodes_offline,
-        'active_alarms': active_alarms,
-        'alarms_today': alarms_today,
+        'total_nodes': stats['total_nodes'],
+        'nodes_online': stats['nodes_online'],
+        'nodes_offline': stats['nodes_offline'],
+        'active_alarms': stats['active_alarms'],
+        'alarms_today': stats['alarms_today'],
         'recent_alarms': recent_alarms,
         'system_armed': system_armed,
         'arm_mode': arm_mode,
         'latest_temperature': latest_temperature,
         'latest_humidity': latest_humidity,
         'latest_soil': latest_soil,
-        'battery_warnings': battery_warnings,
+        'battery_warnings': stats['battery_warnings'],
         'chart_data': json.dumps(chart_data),
     }
     
@@ -233,11 +222,8 @@ def node_command(request, node_id):
         
         if command:
             try:
-                from apps.core.mqtt_publisher import mqtt_publish
-                mqtt_publish(f'agrisecure/{node.node_id}/command', {
-                    'command': command,
-                    'timestamp': timezone.now().isoformat()
-                })
+                from apps.core.mqtt_publisher import queue_command
+                queue_command(node.node_id, command)
                 messages.success(request, f'Comando "{command}" inviato a {node.name or node.node_id}')
             except Exception as e:
                 messages.error(request, f'Errore invio comando: {str(e)}')
@@ -309,22 +295,16 @@ def alarm_action(request, alarm_id, action):
         alarm = get_object_or_404(Alarm, id=alarm_id)
         
         if action == 'acknowledge':
-            alarm.status = 'acknowledged'
-            alarm.acknowledged_at = timezone.now()
-            alarm.acknowledged_by = request.user.username
+            alarm.acknowledge(by_user=request.user.username)
             messages.success(request, 'Allarme preso in carico')
         
         elif action == 'resolve':
-            alarm.status = 'resolved'
-            alarm.resolved_at = timezone.now()
+            alarm.resolve()
             messages.success(request, 'Allarme risolto')
         
         elif action == 'false_positive':
-            alarm.status = 'false_pos'
-            alarm.resolved_at = timezone.now()
+            alarm.resolve(as_false_positive=True)
             messages.success(request, 'Allarme segnato come falso positivo')
-        
-        alarm.save()
     
     return redirect('frontend:alarms')
 
@@ -352,6 +332,7 @@ def arm_system(request):
 
 
 @login_required
+@transaction.atomic
 def arm_action(request):
     """Arma/Disarma sistema"""
     if request.method == 'POST':
@@ -383,17 +364,10 @@ def arm_action(request):
                 nodes = Node.objects.filter(node_id__in=node_ids)
                 new_state.nodes_affected.set(nodes)
             
-            # Invia comando ai nodi
-            try:
-                from apps.core.mqtt_publisher import mqtt_publish
-                for node_id in node_ids:
-                    mqtt_publish(f'agrisecure/{node_id}/command', {
-                        'command': 'arm',
-                        'mode': arm_mode,
-                        'timestamp': timezone.now().isoformat()
-                    })
-            except:
-                pass
+            # Invia comando ai nodi (outbox, pubblicato dopo il commit)
+            from apps.core.mqtt_publisher import queue_arm_command
+            queue_arm_command(arm_mode, node_ids)
+            versions.bump(versions.ARM)
             
             messages.success(request, 'Sistema armato con successo')
         
@@ -406,15 +380,11 @@ def arm_action(request):
             )
             
             # Invia comando di disarmo a tutti i nodi security
-            try:
-                from apps.core.mqtt_publisher import mqtt_publish
-                for node in Node.objects.filter(node_type='SEC'):
-                    mqtt_publish(f'agrisecure/{node.node_id}/command', {
-                        'command': 'disarm',
-                        'timestamp': timezone.now().isoformat()
-                    })
-            except:
-                pass
+            from apps.core.mqtt_publisher import queue_arm_command
+            queue_arm_command('disarmed', list(
+                Node.objects.filter(node_type='SEC').values_list('node_id', flat=True)
+            ))
+            versions.bump(versions.ARM)
             
             messages.success(request, 'Sistema disarmato')
     
@@ -471,6 +441,7 @@ def cleanup_data(request):
     if request.method == 'POST' and request.user.is_superuser:
         threshold = timezone.now() - timedelta(days=30)
         deleted, _ = SensorReading.objects.filter(timestamp__lt=threshold).delete()
+        versions.bump(versions.READINGS)
         messages.success(request, f'Eliminate {deleted} letture vecchie')
     else:
         messages.error(request, 'Permessi insufficienti')
@@ -531,6 +502,13 @@ def bulk_alarm_action(request):
                 }, status=404)
             
             now = timezone.now()
+            today_start = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+            
+            # Stato precedente per aggiornare i contatori dashboard
+            before = alarms.aggregate(
+                open=Count('id', filter=Q(status__in=counters.OPEN_ALARM_STATUSES)),
+                today=Count('id', filter=Q(triggered_at__gte=today_start)),
+            )
             
             if action == 'acknowledge':
                 alarms.update(
@@ -538,6 +516,7 @@ def bulk_alarm_action(request):
                     acknowledged_at=now,
                     acknowledged_by=request.user.username
                 )
+                counters.alarm_status_changed('resolved', 'acknowledged', count - before['open'])
                 message = f'{count} allarmi presi in carico con successo'
                 
             elif action == 'resolve':
@@ -545,6 +524,7 @@ def bulk_alarm_action(request):
                     status='resolved',
                     resolved_at=now
                 )
+                counters.alarm_status_changed('active', 'resolved', before['open'])
                 message = f'{count} allarmi risolti con successo'
                 
             elif action == 'false_positive':
@@ -552,12 +532,16 @@ def bulk_alarm_action(request):
                     status='false_pos',
                     resolved_at=now
                 )
+                counters.alarm_status_changed('active', 'false_pos', before['open'])
                 message = f'{count} allarmi marcati come falsi positivi'
                 
             elif action == 'delete':
                 alarms.delete()
+                counters.alarms_deleted(before['open'], before['today'])
                 message = f'{count} allarmi eliminati definitivamente'
             
+            versions.bump(versions.ALARMS)
+            
             return JsonResponse({
                 'success': True,
                 'message': message,
@@ -616,45 +600,25 @@ def alarms(request):
                 'count': len(alarm_ids)
             })
     
-    # Pagination
+    # Pagination (keyset su triggered_at, id: nessun OFFSET sulle pagine profonde)
+    from apps.api.pagination import InvalidCursor, KeysetPage, paginate
+    
     if page_size == 'all':
         # No pagination - show all results
-        alarms = alarms_qs
-        # Create a mock page_obj for template compatibility
-        class MockPageObj:
-            def __init__(self, items):
-                self.object_list = items
-                self.number = 1
-                self.paginator = type('obj', (object,), {
-                    'num_pages': 1,
-                    'count': len(items)
-                })()
-            def has_other_pages(self):
-                return False
-            def has_previous(self):
-                return False
-            def has_next(self):
-                return False
-        page_obj = MockPageObj(alarms)
+        page_obj = KeysetPage(alarms_qs)
     else:
-        # Normal pagination
-        paginator = Paginator(alarms_qs, page_size)
-        page_number = request.GET.get('page', 1)
-        page_obj = paginator.get_page(page_number)
-        alarms = page_obj.object_list
-    
-    # Stats
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    
-    stats = {
-        'active': Alarm.objects.filter(status='active').count(),
-        'acknowledged': Alarm.objects.filter(status='acknowledged').count(),
-        'resolved': Alarm.objects.filter(
-            status='resolved',
-            resolved_at__gte=thirty_days_ago
-        ).count(),
-        'false_positive_rate': _calculate_false_positive_rate(),
-    }
+        try:
+            page_obj = paginate(
+                alarms_qs, 'triggered_at',
+                cursor=request.GET.get('cursor'), page_size=page_size
+            )
+        except InvalidCursor:
+            page_obj = paginate(alarms_qs, 'triggered_at', page_size=page_size)
+    alarms = page_obj.items
+    
+    # Stats (una query, in cache fino alla prossima transizione)
+    from apps.core.dashboard import get_alarms_stats
+    stats = get_alarms_stats()
     
     context = {
         'alarms': alarms,
@@ -664,19 +628,3 @@ def alarms(request):
     }
     
     return render(request, 'security/alarms.html', context)
-
-
-def _calculate_false_positive_rate():
-    """Calculate false positive rate (last 30 days)"""
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    
-    total = Alarm.objects.filter(triggered_at__gte=thirty_days_ago).count()
-    if total == 0:
-        return 0
-    
-    false_positives = Alarm.objects.filter(
-        triggered_at__gte=thirty_days_ago,
-        status='false_pos'
-    ).count()
-    
-    return round((false_positives / total) * 100, 1)
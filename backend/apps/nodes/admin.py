@@ -1,5 +1,6 @@
 """AgriSecure - Admin per Nodi IoT"""
 from django.contrib import admin
+from apps.core import counters, versions
 from .models import Node, NodeHeartbeat, NodeEvent
 
 
@@ -44,6 +45,28 @@ class NodeAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    # Contatori dashboard e versioni aggiornati come per le scritture da API
+    def save_model(self, request, obj, form, change):
+        before = None
+        if change:
+            before = counters.node_state(Node.objects.get(pk=obj.pk))
+        super().save_model(request, obj, form, change)
+        counters.node_changed(before, counters.node_state(obj))
+        versions.bump(versions.NODES)
+    
+    def delete_model(self, request, obj):
+        before = counters.node_state(obj)
+        super().delete_model(request, obj)
+        counters.node_changed(before, None)
+        versions.bump(versions.NODES)
+    
+    def delete_queryset(self, request, queryset):
+        states = [counters.node_state(node) for node in queryset]
+        super().delete_queryset(request, queryset)
+        for before in states:
+            counters.node_changed(before, None)
+        versions.bump(versions.NODES)
 
 
 @admin.register(NodeHeartbeat)
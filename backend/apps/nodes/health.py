@@ -0,0 +1,117 @@
+"""
+AgriSecure IoT System - Salute nodi
+
+Rilevamento dei nodi silenziosi (WARNING/OFFLINE) con operazioni
+set-based: le transizioni vengono calcolate con una query, applicate
+con un UPDATE per stato di destinazione e gli eventi inseriti con
+bulk_create, indipendentemente dal numero di nodi della flotta.
+"""
+
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, F, Value, When
+from django.utils import timezone
+
+from apps.nodes.models import Node, NodeEvent, NodeStatus
+
+logger = logging.getLogger('agrisecure')
+
+
+def timeouts():
+    """Soglie (warning, critical) in secondi da AGRISECURE"""
+    return (
+        settings.AGRISECURE.get('NODE_TIMEOUT_WARNING', 3600),
+        settings.AGRISECURE.get('NODE_TIMEOUT_CRITICAL', 7200),
+    )
+
+
+def _transitions(queryset, now):
+    """
+    Annota lo stato di destinazione e restituisce i nodi che cambiano
+
+    - oltre la soglia critica: OFFLINE (se non lo è già)
+    - oltre la soglia warning: WARNING (solo se ONLINE)
+    """
+    timeout_warning, timeout_critical = timeouts()
+    warning_cutoff = now - timedelta(seconds=timeout_warning)
+    critical_cutoff = now - timedelta(seconds=timeout_critical)
+
+    return list(
+        queryset.filter(
+            is_active=True,
+            last_seen__lt=warning_cutoff,
+        ).annotate(
+            new_status=Case(
+                When(last_seen__lt=critical_cutoff, then=Value(NodeStatus.OFFLINE)),
+                When(status=NodeStatus.ONLINE, then=Value(NodeStatus.WARNING)),
+                default=F('status'),
+                output_field=CharField(),
+            )
+        ).exclude(
+            new_status=F('status')
+        ).select_for_update(
+            skip_locked=True, of=('self',)
+        ).values('id', 'node_id', 'name', 'status', 'last_seen', 'new_status')
+    )
+
+
+def sweep(node_ids=None, now=None):
+    """
+    Applica le transizioni di stato ai nodi silenziosi
+
+    Le righe bloccate dall'ingestion (nodo che sta trasmettendo) vengono
+    saltate: non sono silenziose.
+
+    Args:
+        node_ids: limita il controllo a questi nodi (default: tutti)
+        now: istante di riferimento (default: adesso)
+
+    Returns:
+        dict: {'offline': [...], 'warning': [...]} con i nodi cambiati
+    """
+    from apps.core import counters, versions
+
+    now = now or timezone.now()
+    queryset = Node.objects.all()
+    if node_ids is not None:
+        queryset = queryset.filter(node_id__in=node_ids)
+
+    with transaction.atomic():
+        changes = _transitions(queryset, now)
+        if not changes:
+            return {'offline': [], 'warning': []}
+
+        by_status = {NodeStatus.OFFLINE: [], NodeStatus.WARNING: []}
+        for change in changes:
+            by_status[change['new_status']].append(change)
+
+        for new_status, nodes in by_status.items():
+            if nodes:
+                Node.objects.filter(id__in=[n['id'] for n in nodes]).update(status=new_status)
+
+        NodeEvent.objects.bulk_create([
+            NodeEvent(
+                node_id=node['id'],
+                timestamp=now,
+                event_type=NodeEvent.EventType.OFFLINE,
+                message=f"Nodo offline da {int((now - node['last_seen']).total_seconds() / 60)} minuti"
+            )
+            for node in by_status[NodeStatus.OFFLINE]
+        ])
+
+        for (old, new), count in Counter((c['status'], c['new_status']) for c in changes).items():
+            counters.node_status_changed(old, new, count)
+        versions.bump(versions.NODES)
+
+    logger.info(
+        f"Salute nodi: {len(by_status[NodeStatus.OFFLINE])} offline, "
+        f"{len(by_status[NodeStatus.WARNING])} warning"
+    )
+    return {
+        'offline': by_status[NodeStatus.OFFLINE],
+        'warning': by_status[NodeStatus.WARNING],
+    }
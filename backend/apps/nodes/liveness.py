@@ -0,0 +1,100 @@
+"""
+AgriSecure IoT System - Indice di liveness nodi
+
+Due sorted set Redis (node_id -> scadenza) aggiornati a ogni messaggio
+ricevuto da un nodo: la scadenza WARNING è last_seen +
+NODE_TIMEOUT_WARNING, quella OFFLINE last_seen + NODE_TIMEOUT_CRITICAL.
+Il watchdog (manage.py node_watchdog) estrae i membri scaduti in
+O(log n) e applica le transizioni entro pochi secondi dalla scadenza,
+invece di attendere il polling di check_node_health.
+"""
+
+import logging
+
+from django.db import transaction
+
+from apps.nodes import health
+
+logger = logging.getLogger('agrisecure')
+
+KEY_PREFIX = 'agrisecure:liveness'
+WARNING = 'warning'
+OFFLINE = 'offline'
+
+# Estrae e rimuove atomicamente i membri con scadenza < ARGV[1]
+_POP_EXPIRED = """
+local members = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1], 'LIMIT', 0, ARGV[2])
+if #members > 0 then
+    redis.call('ZREM', KEYS[1], unpack(members))
+end
+return members
+"""
+_pop_script = None
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def _key(kind):
+    return f"{KEY_PREFIX}:{kind}"
+
+
+def _add(pipe, node_id, last_seen):
+    timeout_warning, timeout_critical = health.timeouts()
+    seen = last_seen.timestamp()
+    pipe.zadd(_key(WARNING), {node_id: seen + timeout_warning})
+    pipe.zadd(_key(OFFLINE), {node_id: seen + timeout_critical})
+
+
+def _write(node_id, last_seen):
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        _add(pipe, node_id, last_seen)
+        pipe.execute()
+    except Exception as e:
+        # check_node_health resta la rete di sicurezza
+        logger.warning(f"Aggiornamento liveness {node_id} fallito: {e}")
+
+
+def touch(node_id, last_seen):
+    """Sposta in avanti le scadenze di un nodo (dopo il commit)"""
+    transaction.on_commit(lambda: _write(node_id, last_seen))
+
+
+def pop_expired(kind, now, limit=500):
+    """Estrae i node_id con scadenza `kind` superata"""
+    global _pop_script
+
+    if _pop_script is None:
+        _pop_script = _redis().register_script(_POP_EXPIRED)
+    members = _pop_script(keys=[_key(kind)], args=[now.timestamp(), limit])
+    return [m.decode() if isinstance(m, bytes) else m for m in members]
+
+
+def next_deadline():
+    """Prossima scadenza (timestamp) tra i due indici, None se vuoti"""
+    pipe = _redis().pipeline(transaction=False)
+    pipe.zrange(_key(WARNING), 0, 0, withscores=True)
+    pipe.zrange(_key(OFFLINE), 0, 0, withscores=True)
+    scores = [entries[0][1] for entries in pipe.execute() if entries]
+    return min(scores) if scores else None
+
+
+def rebuild():
+    """Ricostruisce gli indici dai nodi attivi (avvio del watchdog)"""
+    from apps.nodes.models import Node, NodeStatus
+
+    redis = _redis()
+    pipe = redis.pipeline(transaction=True)
+    pipe.delete(_key(WARNING), _key(OFFLINE))
+    count = 0
+    nodes = Node.objects.filter(
+        is_active=True, last_seen__isnull=False
+    ).exclude(status=NodeStatus.OFFLINE).values_list('node_id', 'last_seen')
+    for node_id, last_seen in nodes.iterator():
+        _add(pipe, node_id, last_seen)
+        count += 1
+    pipe.execute()
+    return count
@@ -206,7 +206,9 @@ class Node(models.Model):
     def update_status(self):
         """Aggiorna lo stato del nodo basandosi sui dati"""
         from django.conf import settings
+        from apps.core import counters, versions
         
+        previous_status = self.status
         if not self.last_seen:
             self.status = NodeStatus.OFFLINE
         else:
@@ -224,6 +226,8 @@ class Node(models.Model):
                 self.status = NodeStatus.ONLINE
         
         self.save(update_fields=['status', 'updated_at'])
+        counters.node_status_changed(previous_status, self.status, is_active=self.is_active)
+        versions.bump(versions.NODES)
 
 
 class NodeHeartbeat(models.Model):
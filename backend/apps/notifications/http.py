@@ -0,0 +1,92 @@
+"""
+AgriSecure IoT System - Client HTTP notifiche
+
+Sessione HTTP e client dei provider condivisi da tutti i canali di
+notifica dello stesso processo worker: le connessioni restano aperte
+(keep-alive) e un burst di allarmi riusa connessioni TLS già stabilite
+invece di rifare l'handshake a ogni messaggio.
+
+I client vengono creati alla prima richiesta e ricreati dopo il fork
+dei worker Celery (prefork), perché i socket non vanno condivisi tra
+processi.
+
+Usage:
+    from apps.notifications import http
+
+    http.post(url, json=payload)
+    http.get_twilio_client().messages.create(...)
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+# Timeout di default (connessione, lettura) in secondi
+DEFAULT_TIMEOUT = (5, 10)
+
+_lock = threading.Lock()
+_session = None
+_twilio_client = None
+
+
+def _pool_size():
+    return settings.NOTIFICATION_HTTP.get('POOL_SIZE', 10)
+
+
+def get_session():
+    """Sessione requests condivisa con pool di connessioni keep-alive"""
+    global _session
+
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=_pool_size(),
+                    pool_block=True,
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def post(url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """POST sulla sessione condivisa"""
+    return get_session().post(url, timeout=timeout, **kwargs)
+
+
+def get_twilio_client():
+    """Client Twilio creato una volta per processo, con connessioni in pool"""
+    global _twilio_client
+
+    if _twilio_client is None:
+        with _lock:
+            if _twilio_client is None:
+                from twilio.rest import Client
+                from twilio.http.http_client import TwilioHttpClient
+
+                config = settings.TWILIO_CONFIG
+                _twilio_client = Client(
+                    config['ACCOUNT_SID'],
+                    config['AUTH_TOKEN'],
+                    http_client=TwilioHttpClient(
+                        pool_connections=True,
+                        timeout=DEFAULT_TIMEOUT[1],
+                    ),
+                )
+    return _twilio_client
+
+
+def reset():
+    """Chiude e scarta i client del processo corrente"""
+    global _session, _twilio_client
+
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _twilio_client = None
@@ -8,73 +8,181 @@ Task Celery per invio notifiche asincrone:
 - Telegram
 """
 
+import hashlib
 import logging
 from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 
-import requests
+from apps.notifications import http
 
 logger = logging.getLogger('agrisecure')
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def send_alarm_notification(self, alarm_id):
+# Canali di notifica allarmi: ciascuno viene inviato da un task separato
+ALARM_CHANNELS = ('push', 'telegram', 'sms', 'email')
+
+# Durata del registro dei destinatari SMS già raggiunti (copre i retry)
+SMS_SENT_TIMEOUT = 3600
+
+
+@shared_task
+def send_alarm_notification(alarm_id):
     """
     Invia notifiche per un allarme critico
+
+    Fan-out: ogni canale parte come task indipendente, con i propri retry,
+    così il primo avviso arriva con la latenza del canale più veloce e un
+    server SMTP lento non ritarda push e Telegram.
+
+    Per ogni (nodo, classificazione, canale) vale il cooldown di
+    NOTIFICATION_COOLDOWN: gli allarmi in finestra vengono riassunti in
+    un digest inviato alla chiusura della finestra.
     """
+    from celery import group
+    from apps.notifications import throttle
     from apps.security.models import Alarm
     
-    try:
-        alarm = Alarm.objects.select_related('node', 'event').get(id=alarm_id)
-    except Alarm.DoesNotExist:
+    alarm = Alarm.objects.filter(id=alarm_id).values(
+        'priority', 'classification', 'node__node_id'
+    ).first()
+    if alarm is None:
         logger.error(f"Allarme {alarm_id} non trovato")
         return
     
-    logger.info(f"Invio notifiche per allarme {alarm_id}")
+    node_id = alarm['node__node_id']
+    classification = alarm['classification']
+    cooldown = throttle.cooldown_seconds(alarm['priority'])
     
-    channels_sent = []
+    channels = []
+    for channel in ALARM_CHANNELS:
+        # SMS solo per allarmi critici
+        if channel == 'sms' and alarm['priority'] != 'critical':
+            continue
+        
+        if throttle.acquire(node_id, classification, channel, cooldown):
+            channels.append(channel)
+            continue
+        
+        try:
+            suppressed, remaining = throttle.suppress(node_id, classification, channel, cooldown)
+        except Exception as e:
+            logger.warning(f"Conteggio notifiche soppresse fallito: {e}")
+            continue
+        
+        # Il primo allarme soppresso della finestra programma il digest
+        if suppressed == 1:
+            send_alarm_digest.apply_async(
+                (node_id, classification, channel, cooldown),
+                countdown=remaining
+            )
     
-    # Prepara messaggio
-    message = _format_alarm_message(alarm)
+    if not channels:
+        logger.info(f"Notifiche allarme {alarm_id} in cooldown su tutti i canali")
+        return channels
+    
+    logger.info(f"Invio notifiche per allarme {alarm_id} su: {channels}")
+    group(send_alarm_channel.s(alarm_id, channel) for channel in channels).apply_async()
+    return channels
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def send_alarm_channel(self, alarm_id, channel):
+    """
+    Invia la notifica di un allarme su un singolo canale
+
+    Un errore di invio ritenta solo questo canale: i sender sollevano
+    un'eccezione per gli errori transitori (rete, 429/5xx, destinatari
+    SMS non raggiunti). Un canale non configurato o un rifiuto
+    definitivo (False) non viene ritentato.
+    """
+    from apps.security.models import Alarm
     
-    # Push notification
     try:
-        if _send_push_notification(alarm, message):
-            channels_sent.append('push')
-    except Exception as e:
-        logger.error(f"Errore push notification: {e}")
+        alarm = Alarm.objects.select_related('node').get(id=alarm_id)
+    except Alarm.DoesNotExist:
+        logger.error(f"Allarme {alarm_id} non trovato")
+        return False
     
-    # Telegram
+    if channel in alarm.notifications_sent:
+        return True
+    
+    message = _format_alarm_message(alarm)
     try:
-        if _send_telegram_notification(alarm, message):
-            channels_sent.append('telegram')
+        sent = _get_sender(channel)(alarm, message)
     except Exception as e:
-        logger.error(f"Errore Telegram: {e}")
+        logger.error(f"Errore notifica {channel} allarme {alarm_id}: {e}")
+        raise self.retry(exc=e)
     
-    # SMS (solo per allarmi critici)
-    if alarm.priority == 'critical':
-        try:
-            if _send_sms_notification(alarm, message):
-                channels_sent.append('sms')
-        except Exception as e:
-            logger.error(f"Errore SMS: {e}")
+    if sent:
+        _record_channel_sent(alarm_id, channel)
+    return sent
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def send_alarm_digest(self, node_id, classification, channel, window):
+    """
+    Invia il riepilogo degli allarmi soppressi da una finestra di cooldown
+
+    Esempio: "Altri 5 eventi PERSON su SEC-002 negli ultimi 60 s"
+    """
+    from apps.notifications import throttle
+    from apps.security.models import Alarm
+    
+    count = throttle.pop_suppressed(node_id, classification, channel)
+    if not count:
+        return 0
+    
+    alarm = Alarm.objects.select_related('node').filter(
+        node__node_id=node_id,
+        classification=classification
+    ).order_by('-triggered_at').first()
+    if alarm is None:
+        return 0
+    
+    message = _format_alarm_message(alarm)
+    message['title'] = f"{message['title']} (+{count})"
+    message['body'] = (
+        f"Altri {count} eventi {classification.upper()} su {node_id} "
+        f"negli ultimi {window} s\n\n" + message['body']
+    )
+    message['data']['suppressed_count'] = count
     
-    # Email
     try:
-        if _send_email_notification(alarm, message):
-            channels_sent.append('email')
+        _get_sender(channel)(alarm, message)
     except Exception as e:
-        logger.error(f"Errore email: {e}")
+        logger.error(f"Errore digest {channel} per {node_id}: {e}")
+        throttle.restore_suppressed(node_id, classification, channel, count, window)
+        raise self.retry(exc=e)
     
-    # Aggiorna allarme
-    alarm.notification_sent = True
-    alarm.notifications_sent = channels_sent
-    alarm.save(update_fields=['notification_sent', 'notifications_sent'])
+    logger.info(f"Digest {channel} inviato: {count} allarmi {classification} su {node_id}")
+    return count
+
+
+def _record_channel_sent(alarm_id, channel):
+    """Registra il canale inviato (i task dei canali girano in parallelo)"""
+    from django.db import transaction
+    from apps.security.models import Alarm
+    
+    with transaction.atomic():
+        alarm = Alarm.objects.select_for_update().only('notifications_sent').get(id=alarm_id)
+        if channel not in alarm.notifications_sent:
+            alarm.notifications_sent = alarm.notifications_sent + [channel]
+            alarm.save(update_fields=['notifications_sent'])
     
-    logger.info(f"Notifiche inviate su: {channels_sent}")
-    return channels_sent
+    logger.info(f"Notifica {channel} inviata per allarme {alarm_id}")
+
+
+def _get_sender(channel):
+    """Funzione di invio per un canale di ALARM_CHANNELS"""
+    return {
+        'push': _send_push_notification,
+        'telegram': _send_telegram_notification,
+        'sms': _send_sms_notification,
+        'email': _send_email_notification,
+    }[channel]
 
 
 def _format_alarm_message(alarm):
@@ -144,14 +252,17 @@ def _send_telegram_notification(alarm, message):
         'parse_mode': 'Markdown'
     }
     
-    response = requests.post(url, json=payload, timeout=10)
+    response = http.post(url, json=payload)
     
     if response.status_code == 200:
         logger.info("Notifica Telegram inviata")
         return True
-    else:
-        logger.error(f"Errore Telegram: {response.text}")
-        return False
+    
+    logger.error(f"Errore Telegram {response.status_code}: {response.text}")
+    if response.status_code == 429 or response.status_code >= 500:
+        # Transitorio: il task del canale ritenta
+        response.raise_for_status()
+    return False
 
 
 def _send_sms_notification(alarm, message):
@@ -162,9 +273,7 @@ def _send_sms_notification(alarm, message):
         logger.warning("Twilio non configurato")
         return False
     
-    from twilio.rest import Client
-    
-    client = Client(config['ACCOUNT_SID'], config['AUTH_TOKEN'])
+    client = http.get_twilio_client()
     
     # Numeri destinatari (da configurare)
     recipients = settings.AGRISECURE.get('SMS_RECIPIENTS', [])
@@ -175,17 +284,33 @@ def _send_sms_notification(alarm, message):
     
     sms_text = f"{message['title']}\n{message['body']}"
     
+    # Destinatari già raggiunti da un tentativo precedente dello stesso
+    # messaggio: un retry non li ricontatta
+    digest = hashlib.sha1(sms_text.encode()).hexdigest()[:16]
+    sent_key = f"agrisecure:sms_sent:{alarm.id}:{digest}"
+    delivered = set(cache.get(sent_key) or ())
+    
+    failed = []
     for phone in recipients:
+        if phone in delivered:
+            continue
         try:
             client.messages.create(
                 body=sms_text[:160],  # Limite SMS
                 from_=config['FROM_NUMBER'],
                 to=phone
             )
+            delivered.add(phone)
             logger.info(f"SMS inviato a {phone}")
         except Exception as e:
+            failed.append(phone)
             logger.error(f"Errore SMS a {phone}: {e}")
     
+    if failed:
+        cache.set(sent_key, sorted(delivered), SMS_SENT_TIMEOUT)
+        raise RuntimeError(f"SMS non inviati a {len(failed)}/{len(recipients)} destinatari")
+    
+    cache.delete(sent_key)
     return True
 
 
@@ -207,61 +332,121 @@ def _send_email_notification(alarm, message):
     
     text_content = f"{message['title']}\n\n{message['body']}"
     
-    try:
-        send_mail(
-            subject=subject,
-            message=text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=recipients,
-            html_message=html_content,
-            fail_silently=False,
-        )
-        logger.info(f"Email inviata a {len(recipients)} destinatari")
-        return True
-    except Exception as e:
-        logger.error(f"Errore invio email: {e}")
-        return False
+    # Gli errori SMTP vengono propagati per il retry del canale
+    send_mail(
+        subject=subject,
+        message=text_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=recipients,
+        html_message=html_content,
+        fail_silently=False,
+    )
+    logger.info(f"Email inviata a {len(recipients)} destinatari")
+    return True
 
 
 @shared_task
 def send_daily_report():
     """
     Task schedulato: report giornaliero
+    
+    Costruito dagli aggregati giornalieri e orari (SensorAggregate) e con
+    predicati di range sugli indici timestamp: nessuna scansione delle
+    letture grezze. L'uptime di un nodo è la quota di ore del giorno con
+    almeno una lettura.
     """
     from datetime import timedelta
+    from django.db.models import Count, Q
     from django.utils import timezone
     from apps.nodes.models import Node
-    from apps.sensors.models import SensorReading, SensorAlert
-    from apps.security.models import Alarm
-    
-    yesterday = timezone.now() - timedelta(days=1)
+    from apps.sensors.models import SensorAggregate, SensorAlert
+    from apps.sensors.tasks import METRICS, aggregate_daily_data, day_range
+    from apps.security.models import Alarm, AlarmPriority, IntrusionClass
+    
+    day = timezone.localdate() - timedelta(days=1)
+    start, end = day_range(day)
+    hours_in_day = (end - start).total_seconds() / 3600  # 23/25 al cambio ora
+    
+    daily = SensorAggregate.objects.filter(
+        aggregate_type=SensorAggregate.AggregateType.DAILY,
+        period_start=start
+    ).select_related('node').order_by('node__node_id')
+    if not daily.exists():
+        # Rollup non ancora eseguito: calcolato ora dagli aggregati orari
+        aggregate_daily_data(day.isoformat())
+    daily = list(daily)
+    
+    # Ore coperte da letture per nodo (uptime)
+    hours_covered = dict(SensorAggregate.objects.filter(
+        aggregate_type=SensorAggregate.AggregateType.HOURLY,
+        period_start__gte=start,
+        period_start__lt=end,
+        reading_count__gt=0
+    ).values('node_id').annotate(hours=Count('id')).values_list('node_id', 'hours'))
+    
+    # Allarmi: totale e ripartizioni in un'unica aggregazione condizionale
+    breakdown = {'total': Count('id')}
+    breakdown.update({
+        f"priority_{priority}": Count('id', filter=Q(priority=priority))
+        for priority in AlarmPriority.values
+    })
+    breakdown.update({
+        f"classification_{classification}": Count('id', filter=Q(classification=classification))
+        for classification in IntrusionClass.values
+    })
+    breakdown['false_positives'] = Count('id', filter=Q(status=Alarm.AlarmStatus.FALSE_POSITIVE))
+    alarms = Alarm.objects.filter(triggered_at__gte=start, triggered_at__lt=end).aggregate(**breakdown)
+    
+    nodes = []
+    for aggregate in daily:
+        row = {
+            'node_id': aggregate.node.node_id,
+            'name': aggregate.node.name,
+            'readings': aggregate.reading_count,
+            'uptime_percent': round(
+                hours_covered.get(aggregate.node_id, 0) / hours_in_day * 100, 1
+            ),
+        }
+        for name in METRICS:
+            row[name] = {
+                'min': getattr(aggregate, f"{name}_min"),
+                'max': getattr(aggregate, f"{name}_max"),
+                'avg': getattr(aggregate, f"{name}_avg"),
+            }
+        nodes.append(row)
+    
+    # Temperatura complessiva: media pesata sulle letture di ogni nodo
+    with_temp = [a for a in daily if a.temperature_avg is not None]
+    weight = sum(a.reading_count for a in with_temp)
     
-    # Statistiche
     stats = {
-        'date': yesterday.date(),
+        'date': day,
         'nodes_active': Node.objects.filter(is_active=True).count(),
-        'readings_count': SensorReading.objects.filter(
-            timestamp__date=yesterday.date()
-        ).count(),
+        'readings_count': sum(a.reading_count for a in daily),
         'alerts_count': SensorAlert.objects.filter(
-            timestamp__date=yesterday.date()
-        ).count(),
-        'alarms_count': Alarm.objects.filter(
-            triggered_at__date=yesterday.date()
+            timestamp__gte=start,
+            timestamp__lt=end
         ).count(),
+        'alarms_count': alarms['total'],
+        'alarms': {
+            'by_priority': {
+                priority: alarms[f"priority_{priority}"] for priority in AlarmPriority.values
+            },
+            'by_classification': {
+                classification: alarms[f"classification_{classification}"]
+                for classification in IntrusionClass.values
+                if alarms[f"classification_{classification}"]
+            },
+            'false_positives': alarms['false_positives'],
+        },
+        'min_temp': min((a.temperature_min for a in with_temp), default=None),
+        'max_temp': max((a.temperature_max for a in with_temp), default=None),
+        'avg_temp': round(
+            sum(float(a.temperature_avg) * a.reading_count for a in with_temp) / weight, 2
+        ) if weight else None,
+        'nodes': nodes,
     }
     
-    # Temperature min/max
-    temp_stats = SensorReading.objects.filter(
-        timestamp__date=yesterday.date(),
-        temperature__isnull=False
-    ).aggregate(
-        min_temp=Min('temperature'),
-        max_temp=Max('temperature'),
-        avg_temp=Avg('temperature')
-    )
-    stats.update(temp_stats)
-    
     # Invia report
     recipients = settings.AGRISECURE.get('REPORT_RECIPIENTS', [])
     if recipients:
@@ -277,7 +462,7 @@ def send_daily_report():
             html_message=html_content,
         )
     
-    logger.info(f"Report giornaliero generato: {stats}")
+    logger.info(f"Report giornaliero generato: {day}, {len(nodes)} nodi, {alarms['total']} allarmi")
     return stats
 
 
@@ -285,55 +470,43 @@ def send_daily_report():
 def check_node_health():
     """
     Task schedulato: verifica salute nodi
-    """
-    from django.utils import timezone
-    from apps.nodes.models import Node, NodeStatus, NodeEvent
     
-    timeout_warning = settings.AGRISECURE.get('NODE_TIMEOUT_WARNING', 3600)
-    timeout_critical = settings.AGRISECURE.get('NODE_TIMEOUT_CRITICAL', 7200)
-    now = timezone.now()
+    Sweep set-based (apps.nodes.health): una query per le transizioni,
+    un UPDATE per stato e bulk_create degli eventi.
+    """
+    from apps.nodes import health
     
-    offline_nodes = []
-    warning_nodes = []
-    
-    for node in Node.objects.filter(is_active=True):
-        if not node.last_seen:
-            continue
-        
-        seconds_since = (now - node.last_seen).total_seconds()
-        
-        if seconds_since > timeout_critical and node.status != NodeStatus.OFFLINE:
-            node.status = NodeStatus.OFFLINE
-            node.save(update_fields=['status'])
-            offline_nodes.append(node)
-            
-            NodeEvent.objects.create(
-                node=node,
-                event_type=NodeEvent.EventType.OFFLINE,
-                message=f"Nodo offline da {int(seconds_since/60)} minuti"
-            )
-            
-        elif seconds_since > timeout_warning and node.status == NodeStatus.ONLINE:
-            node.status = NodeStatus.WARNING
-            node.save(update_fields=['status'])
-            warning_nodes.append(node)
+    changes = health.sweep()
     
     # Notifica se ci sono nodi offline
-    if offline_nodes:
-        _notify_offline_nodes(offline_nodes)
+    if changes['offline']:
+        _notify_offline_nodes(changes['offline'])
     
     return {
-        'offline': [n.node_id for n in offline_nodes],
-        'warning': [n.node_id for n in warning_nodes]
+        'offline': [n['node_id'] for n in changes['offline']],
+        'warning': [n['node_id'] for n in changes['warning']]
     }
 
 
+@shared_task
+def notify_offline_nodes(node_ids):
+    """
+    Notifica nodi andati offline (rilevati dal node watchdog)
+    """
+    from apps.nodes.models import Node
+    
+    nodes = list(Node.objects.filter(node_id__in=node_ids).values('node_id', 'name'))
+    if nodes:
+        _notify_offline_nodes(nodes)
+    return [n['node_id'] for n in nodes]
+
+
 def _notify_offline_nodes(nodes):
     """Notifica nodi offline"""
     message = {
         'title': '⚠️ Nodi Offline',
         'body': f"{len(nodes)} nodi non rispondono:\n" + 
-                "\n".join([f"- {n.node_id}: {n.name}" for n in nodes]),
+                "\n".join([f"- {n['node_id']}: {n['name']}" for n in nodes]),
         'data': {'type': 'node_offline'}
     }
     
@@ -341,11 +514,52 @@ def _notify_offline_nodes(nodes):
     config = settings.TELEGRAM_CONFIG
     if config.get('BOT_TOKEN') and config.get('CHAT_ID'):
         url = f"https://api.telegram.org/bot{config['BOT_TOKEN']}/sendMessage"
-        requests.post(url, json={
+        http.post(url, json={
             'chat_id': config['CHAT_ID'],
             'text': f"*{message['title']}*\n\n{message['body']}",
             'parse_mode': 'Markdown'
-        }, timeout=10)
+        })
+
+
+@shared_task
+def notify_outbox_dead(message_ids):
+    """
+    Notifica i messaggi outbox scartati dopo MAX_ATTEMPTS tentativi
+
+    Possono essere notifiche di allarme mai partite: vanno verificate.
+    """
+    from apps.core.models import OutboxMessage
+    
+    messages = list(
+        OutboxMessage.objects.filter(id__in=message_ids).values('id', 'destination', 'last_error')
+    )
+    if not messages:
+        return 0
+    
+    body = f"{len(messages)} messaggi non consegnati:\n" + "\n".join(
+        f"- #{m['id']} {m['destination']}: {m['last_error'][:100]}" for m in messages
+    )
+    logger.error(f"Messaggi outbox scartati: {[m['id'] for m in messages]}")
+    
+    config = settings.TELEGRAM_CONFIG
+    if config.get('BOT_TOKEN') and config.get('CHAT_ID'):
+        url = f"https://api.telegram.org/bot{config['BOT_TOKEN']}/sendMessage"
+        http.post(url, json={
+            'chat_id': config['CHAT_ID'],
+            'text': f"⚠️ Outbox: messaggi scartati\n\n{body}",
+        })
+    
+    recipients = settings.AGRISECURE.get('EMAIL_RECIPIENTS', [])
+    if recipients:
+        send_mail(
+            subject='[AgriSecure] Messaggi outbox scartati',
+            message=body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=recipients,
+            fail_silently=True,
+        )
+    
+    return len(messages)
 
 
 @shared_task
@@ -370,9 +584,14 @@ def cleanup_old_data():
     cutoff = timezone.now() - timedelta(days=heartbeat_days)
     deleted_heartbeats = NodeHeartbeat.objects.filter(timestamp__lt=cutoff).delete()
     
-    logger.info(f"Cleanup: {deleted_sensors[0]} letture, {deleted_heartbeats[0]} heartbeats")
+    # Pulizia messaggi outbox già consegnati
+    from apps.core import outbox
+    deleted_outbox = outbox.purge_sent()
+    
+    logger.info(f"Cleanup: {deleted_sensors[0]} letture, {deleted_heartbeats[0]} heartbeats, {deleted_outbox} outbox")
     
     return {
         'sensor_readings_deleted': deleted_sensors[0],
-        'heartbeats_deleted': deleted_heartbeats[0]
+        'heartbeats_deleted': deleted_heartbeats[0],
+        'outbox_deleted': deleted_outbox
     }
@@ -0,0 +1,95 @@
+"""
+AgriSecure IoT System - Limitazione notifiche
+
+Cooldown per (nodo, classificazione, canale) memorizzato in Redis e
+condiviso da tutti i worker, con durata presa da
+AGRISECURE['NOTIFICATION_COOLDOWN'] in base alla priorità dell'allarme.
+
+Gli allarmi soppressi durante il cooldown vengono contati e riassunti
+in un unico messaggio di digest inviato alla chiusura della finestra.
+Se Redis non è raggiungibile le notifiche passano comunque: un allarme
+non deve mai andare perso per un problema del limitatore.
+"""
+
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger('agrisecure')
+
+KEY_PREFIX = 'agrisecure:notify'
+
+# Priorità allarme -> livello di NOTIFICATION_COOLDOWN
+PRIORITY_TIERS = {
+    'critical': 'CRITICAL',
+    'high': 'WARNING',
+    'medium': 'WARNING',
+    'low': 'INFO',
+}
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def _key(kind, node_id, classification, channel):
+    return f"{KEY_PREFIX}:{kind}:{node_id}:{classification}:{channel}"
+
+
+def cooldown_seconds(priority):
+    """Durata del cooldown per una priorità allarme"""
+    cooldowns = settings.AGRISECURE.get('NOTIFICATION_COOLDOWN', {})
+    return int(cooldowns.get(PRIORITY_TIERS.get(priority, 'INFO'), 0))
+
+
+def acquire(node_id, classification, channel, cooldown):
+    """
+    Apre una finestra di cooldown se non ce n'è una attiva
+
+    Returns:
+        bool: True se la notifica può essere inviata
+    """
+    if cooldown <= 0:
+        return True
+    try:
+        return bool(_redis().set(
+            _key('cooldown', node_id, classification, channel), 1, nx=True, ex=cooldown
+        ))
+    except Exception as e:
+        logger.warning(f"Limitatore notifiche non disponibile: {e}")
+        return True
+
+
+def suppress(node_id, classification, channel, cooldown):
+    """
+    Conta un allarme soppresso nella finestra corrente
+
+    Returns:
+        tuple: (allarmi soppressi nella finestra, secondi alla chiusura)
+    """
+    pipe = _redis().pipeline()
+    pipe.incr(_key('suppressed', node_id, classification, channel))
+    pipe.expire(_key('suppressed', node_id, classification, channel), cooldown * 2)
+    pipe.ttl(_key('cooldown', node_id, classification, channel))
+    count, _expire, ttl = pipe.execute()
+    return count, max(ttl, 1)
+
+
+def pop_suppressed(node_id, classification, channel):
+    """Legge e azzera il conteggio degli allarmi soppressi"""
+    key = _key('suppressed', node_id, classification, channel)
+    pipe = _redis().pipeline()
+    pipe.get(key)
+    pipe.delete(key)
+    count, _deleted = pipe.execute()
+    return int(count or 0)
+
+
+def restore_suppressed(node_id, classification, channel, count, cooldown):
+    """Rimette il conteggio se l'invio del digest fallisce"""
+    key = _key('suppressed', node_id, classification, channel)
+    pipe = _redis().pipeline()
+    pipe.incrby(key, count)
+    pipe.expire(key, cooldown * 2)
+    pipe.execute()
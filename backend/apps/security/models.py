@@ -119,6 +119,9 @@ class SecurityEvent(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Evento Sicurezza'
         verbose_name_plural = 'Eventi Sicurezza'
+        constraints = [
+            models.UniqueConstraint(fields=['node', 'timestamp'], name='security_events_node_ts_uniq'),
+        ]
         indexes = [
             models.Index(fields=['node', '-timestamp']),
             models.Index(fields=['classification', '-timestamp']),
@@ -230,13 +233,21 @@ class Alarm(models.Model):
     
     def acknowledge(self, by_user='system'):
         """Prende in carico l'allarme"""
+        from apps.core import counters, versions
+        
+        previous_status = self.status
         self.status = self.AlarmStatus.ACKNOWLEDGED
         self.acknowledged_at = timezone.now()
         self.acknowledged_by = by_user
         self.save(update_fields=['status', 'acknowledged_at', 'acknowledged_by'])
+        counters.alarm_status_changed(previous_status, self.status)
+        versions.bump(versions.ALARMS)
     
     def resolve(self, notes='', as_false_positive=False):
         """Risolve l'allarme"""
+        from apps.core import counters, versions
+        
+        previous_status = self.status
         if as_false_positive:
             self.status = self.AlarmStatus.FALSE_POSITIVE
         else:
@@ -244,6 +255,8 @@ class Alarm(models.Model):
         self.resolved_at = timezone.now()
         self.resolution_notes = notes
         self.save(update_fields=['status', 'resolved_at', 'resolution_notes'])
+        counters.alarm_status_changed(previous_status, self.status)
+        versions.bump(versions.ALARMS)
 
 
 class SystemArmState(models.Model):
@@ -0,0 +1,134 @@
+"""
+AgriSecure IoT System - Statistiche allarmi
+
+Tutte le statistiche della pagina allarmi, del WebSocket allarmi e
+dell'endpoint API in una sola query ad aggregazione condizionale,
+compresi i percentili del tempo di presa in carico (percentile_cont
+calcolato da PostgreSQL).
+
+Il risultato è in cache Redis con chiave legata alla versione degli
+allarmi (apps.core.versions): ogni transizione la invalida, mentre
+senza modifiche viene ricalcolato al più una volta al minuto (la
+finestra "ultimi N giorni" avanza col tempo).
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Aggregate, Avg, Count, F, FloatField, Func, Q
+from django.utils import timezone
+
+from apps.core import versions
+
+logger = logging.getLogger('agrisecure')
+
+CACHE_PREFIX = 'agrisecure:alarm_stats:'
+CACHE_TIMEOUT = 300
+WINDOW_BUCKET = 60
+
+
+class PercentileCont(Aggregate):
+    """percentile_cont(p) WITHIN GROUP (ORDER BY expr) di PostgreSQL"""
+    function = 'percentile_cont'
+    template = '%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, percentile, **extra):
+        super().__init__(expression, percentile=float(percentile), **extra)
+
+
+class EpochSeconds(Func):
+    """Durata (interval) in secondi"""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = FloatField()
+
+
+def _compute(days):
+    from apps.security.models import Alarm, AlarmPriority, IntrusionClass
+
+    Status = Alarm.AlarmStatus
+    since = timezone.now() - timedelta(days=days)
+    recent = Q(triggered_at__gte=since)
+    response_time = EpochSeconds(F('acknowledged_at') - F('triggered_at'))
+
+    aggregates = {
+        # Stato corrente (tutti gli allarmi aperti, non solo la finestra)
+        'active': Count('id', filter=Q(status=Status.ACTIVE)),
+        'acknowledged': Count('id', filter=Q(status=Status.ACKNOWLEDGED)),
+        'resolved': Count('id', filter=Q(status=Status.RESOLVED, resolved_at__gte=since)),
+        # Finestra temporale
+        'total': Count('id', filter=recent),
+        'avg_response': Avg(response_time, filter=recent),
+        'p50_response': PercentileCont(response_time, 0.5, filter=recent),
+        'p90_response': PercentileCont(response_time, 0.9, filter=recent),
+    }
+    groups = {
+        'by_status': ('status', Status.values),
+        'by_priority': ('priority', AlarmPriority.values),
+        'by_classification': ('classification', IntrusionClass.values),
+    }
+    for group, (field, values) in groups.items():
+        for value in values:
+            aggregates[f'{group}_{value}'] = Count('id', filter=recent & Q(**{field: value}))
+
+    # Solo le righe che contribuiscono a qualche contatore
+    row = Alarm.objects.filter(
+        recent
+        | Q(status__in=[Status.ACTIVE, Status.ACKNOWLEDGED])
+        | Q(status=Status.RESOLVED, resolved_at__gte=since)
+    ).aggregate(**aggregates)
+
+    stats = {
+        'days': days,
+        'active': row['active'],
+        'acknowledged': row['acknowledged'],
+        'resolved': row['resolved'],
+        'total': row['total'],
+        'response_time': {
+            'avg': row['avg_response'],
+            'p50': row['p50_response'],
+            'p90': row['p90_response'],
+        },
+    }
+    for group, (_field, values) in groups.items():
+        stats[group] = {
+            value: row[f'{group}_{value}'] for value in values if row[f'{group}_{value}']
+        }
+
+    false_positives = stats['by_status'].get(Status.FALSE_POSITIVE, 0)
+    closed = false_positives + stats['by_status'].get(Status.RESOLVED, 0)
+    stats['false_positives'] = false_positives
+    stats['closed'] = closed
+    # Sul totale della finestra (pagina allarmi) e sugli allarmi chiusi
+    stats['false_positive_rate'] = round(false_positives / stats['total'] * 100, 1) if stats['total'] else 0
+    stats['false_positive_rate_closed'] = round(false_positives / closed * 100, 1) if closed else 0
+    return stats
+
+
+def alarm_statistics(days=30):
+    """
+    Statistiche allarmi degli ultimi `days` giorni
+
+    Returns:
+        dict con active, acknowledged, resolved, total, by_status,
+        by_priority, by_classification, response_time {avg, p50, p90}
+        (secondi), false_positives, closed, false_positive_rate(_closed)
+    """
+    state = versions.get(versions.ALARMS)
+    if state is None:
+        return _compute(days)
+
+    token, _changed_at = state
+    key = f"{CACHE_PREFIX}{days}:{token}:{int(time.time() // WINDOW_BUCKET)}"
+    try:
+        stats = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Lettura cache statistiche allarmi fallita: {e}")
+        return _compute(days)
+
+    if stats is None:
+        stats = _compute(days)
+        cache.set(key, stats, CACHE_TIMEOUT)
+    return stats
@@ -0,0 +1,234 @@
+"""
+AgriSecure IoT System - Ingestione massiva letture sensori
+
+Percorso veloce per i backfill via HTTP (gateway, stazioni di terze
+parti): validazione senza serializer DRF, risoluzione dei node_id con
+una sola query e scrittura con bulk_create a lotti.
+
+La scrittura è idempotente (ON CONFLICT DO NOTHING sul vincolo
+univoco node, timestamp): un backfill ripetuto non duplica le letture.
+
+Le righe non valide non bloccano le altre: vengono riportate con il
+loro indice e il dettaglio degli errori.
+"""
+
+import logging
+from datetime import datetime, timezone as dt_timezone
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger('agrisecure')
+
+# Campi valore accettati; gli alias sono i nomi usati nei payload MQTT
+VALUE_FIELDS = (
+    'temperature', 'humidity', 'pressure', 'light_lux',
+    'soil_moisture_raw', 'soil_moisture_percent', 'battery_voltage',
+)
+ALIASES = {
+    'light': 'light_lux',
+    'soil_raw': 'soil_moisture_raw',
+    'soil_moisture': 'soil_moisture_percent',
+}
+
+# Errori riportati per esteso nella risposta (gli altri sono solo contati)
+MAX_REPORTED_ERRORS = 1000
+
+_checkers = None
+
+
+def _setting(name, default):
+    return getattr(settings, 'SENSOR_INGEST', {}).get(name, default)
+
+
+def max_rows():
+    return _setting('MAX_ROWS', 50000)
+
+
+def _decimal_checker(field):
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    quantum = Decimal(1).scaleb(-field.decimal_places)
+
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError('Numero atteso')
+        try:
+            number = Decimal(str(value)).quantize(quantum, rounding=ROUND_HALF_UP)
+        except InvalidOperation:
+            raise ValueError('Numero non valido')
+        if not number.is_finite() or abs(number) >= limit:
+            raise ValueError(f'Fuori range (|valore| < {limit})')
+        return number
+    return check
+
+
+def _integer_checker(field):
+    low, high = connection.ops.integer_field_range(field.get_internal_type())
+
+    def check(value):
+        if isinstance(value, bool):
+            raise ValueError('Intero atteso')
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if not isinstance(value, int):
+            raise ValueError('Intero atteso')
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise ValueError(f'Fuori range [{low}, {high}]')
+        return value
+    return check
+
+
+def get_checkers():
+    """Validatori per campo, derivati una volta dai vincoli del modello"""
+    global _checkers
+
+    if _checkers is None:
+        from apps.sensors.models import SensorReading
+
+        checkers = {}
+        for name in VALUE_FIELDS:
+            field = SensorReading._meta.get_field(name)
+            if isinstance(field, models.DecimalField):
+                checkers[name] = _decimal_checker(field)
+            else:
+                checkers[name] = _integer_checker(field)
+        _checkers = checkers
+    return _checkers
+
+
+def parse_timestamp(value):
+    """
+    Timestamp ISO 8601 o epoch (secondi); senza fuso = ora locale
+
+    Obbligatorio: (nodo, timestamp) identifica la lettura, un default
+    comune al lotto farebbe scartare come duplicate le righe dello
+    stesso nodo.
+    """
+    if value is None:
+        raise ValueError('Campo obbligatorio')
+    if isinstance(value, bool):
+        raise ValueError('Timestamp non valido')
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    if not isinstance(value, str):
+        raise ValueError('Timestamp non valido')
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError('Timestamp non valido (ISO 8601 atteso)')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def validate_row(row, checkers):
+    """
+    Valida una riga grezza
+
+    Returns:
+        (node_id, valori) oppure (None, errori per campo)
+    """
+    if not isinstance(row, dict):
+        return None, {'non_field_errors': 'Oggetto JSON atteso'}
+
+    errors = {}
+    node_id = row.get('node_id')
+    if not isinstance(node_id, str) or not node_id:
+        errors['node_id'] = 'Campo obbligatorio'
+
+    values = {}
+    try:
+        values['timestamp'] = parse_timestamp(row.get('timestamp'))
+    except (ValueError, OverflowError, OSError) as e:
+        errors['timestamp'] = str(e)
+
+    for key, value in row.items():
+        name = ALIASES.get(key, key)
+        check = checkers.get(name)
+        if check is None or value is None:
+            continue
+        try:
+            values[name] = check(value)
+        except ValueError as e:
+            errors[key] = str(e)
+
+    if errors:
+        return None, errors
+    return node_id, values
+
+
+def ingest(rows):
+    """
+    Valida e salva un lotto di letture
+
+    Args:
+        rows: lista di dict (node_id, timestamp, valori)
+
+    Returns:
+        dict con received, accepted (righe valide, comprese quelle già
+        presenti e ignorate), error_count ed errors (lista di
+        {'index', 'errors'}, troncata a MAX_REPORTED_ERRORS)
+    """
+    from apps.nodes.models import Node
+    from apps.sensors.models import SensorReading
+
+    checkers = get_checkers()
+    errors = []
+    error_count = 0
+
+    def reject(index, detail):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'index': index, 'errors': detail})
+
+    valid = []
+    for index, row in enumerate(rows):
+        node_id, result = validate_row(row, checkers)
+        if node_id is None:
+            reject(index, result)
+        else:
+            valid.append((index, node_id, result))
+
+    # Risoluzione node_id -> pk con una sola query
+    node_ids = {node_id for _index, node_id, _values in valid}
+    node_pks = dict(
+        Node.objects.filter(node_id__in=node_ids).values_list('node_id', 'id')
+    )
+
+    readings = []
+    seen = set()
+    for index, node_id, values in valid:
+        pk = node_pks.get(node_id)
+        if pk is None:
+            reject(index, {'node_id': f'Nodo {node_id} non registrato'})
+            continue
+        # Due righe dello stesso lotto con stessa chiave: la seconda
+        # verrebbe ignorata dal database, va segnalata
+        key = (pk, values['timestamp'])
+        if key in seen:
+            reject(index, {'timestamp': 'Lettura duplicata nel lotto (stesso nodo e timestamp)'})
+            continue
+        seen.add(key)
+        readings.append(SensorReading(node_id=pk, **values))
+
+    with transaction.atomic():
+        SensorReading.objects.bulk_create(
+            readings,
+            batch_size=_setting('BATCH_SIZE', 5000),
+            ignore_conflicts=True,
+        )
+    if readings:
+        from apps.core import versions
+        versions.bump(versions.READINGS)
+
+    errors.sort(key=lambda error: error['index'])
+    logger.info(f"Ingestione massiva: {len(readings)}/{len(rows)} letture accettate")
+    return {
+        'received': len(rows),
+        'accepted': len(readings),
+        'error_count': error_count,
+        'errors': errors,
+    }
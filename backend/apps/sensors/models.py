@@ -86,6 +86,9 @@ class SensorReading(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Lettura Sensore'
         verbose_name_plural = 'Letture Sensori'
+        constraints = [
+            models.UniqueConstraint(fields=['node', 'timestamp'], name='sensor_readings_node_ts_uniq'),
+        ]
         indexes = [
             models.Index(fields=['node', '-timestamp']),
             models.Index(fields=['-timestamp']),
@@ -139,33 +142,39 @@ class SensorAggregate(models.Model):
     period_start = models.DateTimeField(db_index=True)
     period_end = models.DateTimeField()
     
-    # Conteggi
+    # Conteggi (per grandezza: letture con valore non nullo, peso delle
+    # medie nei livelli superiori; null negli aggregati meno recenti)
     reading_count = models.PositiveIntegerField(default=0)
     
     # Temperatura
     temperature_min = models.DecimalField(max_digits=5, decimal_places=2, null=True)
     temperature_max = models.DecimalField(max_digits=5, decimal_places=2, null=True)
     temperature_avg = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    temperature_count = models.PositiveIntegerField(null=True)
     
     # Umidità aria
     humidity_min = models.DecimalField(max_digits=5, decimal_places=2, null=True)
     humidity_max = models.DecimalField(max_digits=5, decimal_places=2, null=True)
     humidity_avg = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    humidity_count = models.PositiveIntegerField(null=True)
     
     # Pressione
     pressure_min = models.DecimalField(max_digits=6, decimal_places=2, null=True)
     pressure_max = models.DecimalField(max_digits=6, decimal_places=2, null=True)
     pressure_avg = models.DecimalField(max_digits=6, decimal_places=2, null=True)
+    pressure_count = models.PositiveIntegerField(null=True)
     
     # Luminosità
     light_min = models.PositiveIntegerField(null=True)
     light_max = models.PositiveIntegerField(null=True)
     light_avg = models.PositiveIntegerField(null=True)
+    light_count = models.PositiveIntegerField(null=True)
     
     # Suolo
     soil_min = models.PositiveSmallIntegerField(null=True)
     soil_max = models.PositiveSmallIntegerField(null=True)
     soil_avg = models.PositiveSmallIntegerField(null=True)
+    soil_count = models.PositiveIntegerField(null=True)
     
     class Meta:
         db_table = 'sensor_aggregates'
@@ -0,0 +1,178 @@
+"""
+AgriSecure IoT System - Sensor Tasks
+
+Task Celery di aggregazione dati sensori:
+- Aggregati orari calcolati dalle letture (SensorReading)
+- Aggregati giornalieri calcolati dagli orari, senza toccare i dati grezzi
+
+Gli aggregati vengono scritti in upsert: rieseguire un periodo (dati in
+ritardo, recupero dopo un fermo) aggiorna le righe esistenti.
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+
+from celery import shared_task
+from django.db.models import Avg, Case, Count, F, FloatField, Max, Min, Sum, When
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+
+logger = logging.getLogger('agrisecure')
+
+# Grandezza aggregata -> campo di SensorReading
+METRICS = {
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'pressure': 'pressure',
+    'light': 'light_lux',
+    'soil': 'soil_moisture_percent',
+}
+
+# Grandezze salvate come interi negli aggregati
+INTEGER_METRICS = ('light', 'soil')
+
+
+def day_range(day):
+    """Inizio e fine (esclusa) di un giorno nel fuso orario locale"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+def _upsert(aggregates):
+    from apps.sensors.models import SensorAggregate
+
+    update_fields = ['period_end', 'reading_count'] + [
+        f"{name}_{stat}" for name in METRICS for stat in ('min', 'max', 'avg', 'count')
+    ]
+    SensorAggregate.objects.bulk_create(
+        aggregates,
+        update_conflicts=True,
+        unique_fields=['node', 'aggregate_type', 'period_start'],
+        update_fields=update_fields,
+    )
+
+
+def _avg_value(name, value):
+    if value is None:
+        return None
+    return round(value) if name in INTEGER_METRICS else value
+
+
+@shared_task
+def aggregate_hourly_data(start=None, end=None):
+    """
+    Task schedulato: aggregati orari per nodo
+
+    Di default ricalcola le ultime due ore complete, così le letture
+    arrivate in ritardo rientrano nell'aggregato corretto.
+
+    Args:
+        start, end: intervallo ISO 8601 da aggregare (opzionali)
+    """
+    from apps.sensors.models import SensorAggregate, SensorReading
+
+    if start and end:
+        start = datetime.fromisoformat(start)
+        end = datetime.fromisoformat(end)
+    else:
+        end = timezone.now().replace(minute=0, second=0, microsecond=0)
+        start = end - timedelta(hours=2)
+
+    stats = {}
+    for name, field in METRICS.items():
+        stats[f"{name}_min"] = Min(field)
+        stats[f"{name}_max"] = Max(field)
+        stats[f"{name}_avg"] = Avg(field)
+        stats[f"{name}_count"] = Count(field)
+
+    rows = SensorReading.objects.filter(
+        timestamp__gte=start,
+        timestamp__lt=end,
+    ).annotate(
+        period=TruncHour('timestamp')
+    ).values('node_id', 'period').annotate(
+        reading_count=Count('id'),
+        **stats
+    ).order_by()
+
+    aggregates = []
+    for row in rows:
+        aggregate = SensorAggregate(
+            node_id=row['node_id'],
+            aggregate_type=SensorAggregate.AggregateType.HOURLY,
+            period_start=row['period'],
+            period_end=row['period'] + timedelta(hours=1),
+            reading_count=row['reading_count'],
+        )
+        for name in METRICS:
+            setattr(aggregate, f"{name}_min", row[f"{name}_min"])
+            setattr(aggregate, f"{name}_max", row[f"{name}_max"])
+            setattr(aggregate, f"{name}_avg", _avg_value(name, row[f"{name}_avg"]))
+            setattr(aggregate, f"{name}_count", row[f"{name}_count"])
+        aggregates.append(aggregate)
+
+    _upsert(aggregates)
+    logger.info(f"Aggregati orari {start} - {end}: {len(aggregates)} righe")
+    return len(aggregates)
+
+
+@shared_task
+def aggregate_daily_data(day=None):
+    """
+    Task schedulato: aggregati giornalieri per nodo dagli aggregati orari
+
+    Le medie sono pesate sul numero di letture con valore non nullo di
+    ogni ora ({name}_count); per gli aggregati orari calcolati prima che
+    il conteggio esistesse si usa reading_count.
+
+    Args:
+        day: giorno ISO 8601 (default: ieri)
+    """
+    from apps.sensors.models import SensorAggregate
+
+    if day:
+        day = datetime.fromisoformat(day).date()
+    else:
+        day = timezone.localdate() - timedelta(days=1)
+    start, end = day_range(day)
+
+    stats = {'reading_count': Sum('reading_count')}
+    for name in METRICS:
+        stats[f"{name}_min"] = Min(f"{name}_min")
+        stats[f"{name}_max"] = Max(f"{name}_max")
+        count = Coalesce(f"{name}_count", 'reading_count')
+        stats[f"{name}_weighted"] = Sum(
+            F(f"{name}_avg") * count, output_field=FloatField()
+        )
+        stats[f"{name}_weight"] = Sum(Case(
+            When(**{f"{name}_avg__isnull": False}, then=count)
+        ))
+
+    rows = SensorAggregate.objects.filter(
+        aggregate_type=SensorAggregate.AggregateType.HOURLY,
+        period_start__gte=start,
+        period_start__lt=end,
+    ).values('node_id').annotate(**stats).order_by()
+
+    aggregates = []
+    for row in rows:
+        aggregate = SensorAggregate(
+            node_id=row['node_id'],
+            aggregate_type=SensorAggregate.AggregateType.DAILY,
+            period_start=start,
+            period_end=end,
+            reading_count=row['reading_count'] or 0,
+        )
+        for name in METRICS:
+            weight = row[f"{name}_weight"]
+            average = row[f"{name}_weighted"] / weight if weight else None
+            setattr(aggregate, f"{name}_min", row[f"{name}_min"])
+            setattr(aggregate, f"{name}_max", row[f"{name}_max"])
+            setattr(aggregate, f"{name}_avg", _avg_value(name, average))
+            setattr(aggregate, f"{name}_count", weight or 0)
+        aggregates.append(aggregate)
+
+    _upsert(aggregates)
+    logger.info(f"Aggregati giornalieri {day}: {len(aggregates)} righe")
+    return len(aggregates)
@@ -415,34 +415,6 @@ StandardError=journal
 WantedBy=multi-user.target
 EOF
 
-# ============================================================================
-# Servizio MQTT to WebSocket Bridge - NUOVO!
-# ============================================================================
-cat > /etc/systemd/system/agrisecure-mqtt-bridge.service << EOF
-[Unit]
-Description=AgriSecure MQTT to WebSocket Bridge
-After=network.target mosquitto.service redis.service agrisecure-daphne.service
-Requires=mosquitto.service redis.service
-
-[Service]
-Type=simple
-User=$USER
-Group=$USER
-WorkingDirectory=$BACKEND_DIR
-Environment="PATH=$VENV_DIR/bin"
-Environment="PYTHONPATH=$BACKEND_DIR"
-Environment="DJANGO_SETTINGS_MODULE=agrisecure.settings"
-EnvironmentFile=$BACKEND_DIR/.env
-ExecStart=$VENV_DIR/bin/python scripts/mqtt_websocket_bridge.py
-Restart=always
-RestartSec=10
-StandardOutput=journal
-StandardError=journal
-
-[Install]
-WantedBy=multi-user.target
-EOF
-
 # ============================================================================
 # Servizio Celery Worker
 # ============================================================================
@@ -458,12 +430,17 @@ Group=$USER
 WorkingDirectory=$BACKEND_DIR
 Environment="PATH=$VENV_DIR/bin"
 EnvironmentFile=$BACKEND_DIR/.env
-ExecStart=$VENV_DIR/bin/celery -A agrisecure multi start worker \\
+# Un worker per coda: alarms ha processi dedicati e non attende mai
+# report o pulizie (routing in CELERY_TASK_ROUTES)
+ExecStart=$VENV_DIR/bin/celery -A agrisecure multi start alarms default bulk \\
+    -Q:alarms alarms -c:alarms 4 \\
+    -Q:default default -c:default 2 \\
+    -Q:bulk maintenance,reports -c:bulk 1 \\
+    --prefetch-multiplier=1 \\
     --pidfile=$BACKEND_DIR/logs/celery-%n.pid \\
     --logfile=$BACKEND_DIR/logs/celery-%n.log \\
-    --loglevel=INFO \\
-    --concurrency=2
-ExecStop=$VENV_DIR/bin/celery -A agrisecure multi stopwait worker \\
+    --loglevel=INFO
+ExecStop=$VENV_DIR/bin/celery -A agrisecure multi stopwait alarms default bulk \\
     --pidfile=$BACKEND_DIR/logs/celery-%n.pid
 Restart=always
 RestartSec=10
@@ -499,12 +476,12 @@ WantedBy=multi-user.target
 EOF
 
 # ============================================================================
-# Servizio MQTT Subscriber (per salvataggio DB)
+# Servizio MQTT Subscriber (salvataggio DB + aggiornamenti WebSocket)
 # ============================================================================
 cat > /etc/systemd/system/agrisecure-mqtt.service << EOF
 [Unit]
 Description=AgriSecure MQTT Subscriber
-After=network.target postgresql.service mosquitto.service
+After=network.target postgresql.service mosquitto.service redis.service
 
 [Service]
 Type=simple
@@ -521,7 +498,53 @@ RestartSec=10
 WantedBy=multi-user.target
 EOF
 
-print_success "Servizi systemd creati (inclusi Daphne e MQTT Bridge)"
+# ============================================================================
+# Servizio Outbox Relay (notifiche allarmi e comandi MQTT dopo il commit)
+# ============================================================================
+cat > /etc/systemd/system/agrisecure-outbox.service << EOF
+[Unit]
+Description=AgriSecure Outbox Relay
+After=network.target postgresql.service mosquitto.service redis.service
+
+[Service]
+Type=simple
+User=$USER
+Group=$USER
+WorkingDirectory=$BACKEND_DIR
+Environment="PATH=$VENV_DIR/bin"
+EnvironmentFile=$BACKEND_DIR/.env
+ExecStart=$VENV_DIR/bin/python manage.py outbox_relay
+Restart=always
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+# ============================================================================
+# Servizio Node Watchdog (rilevamento nodi offline in tempo reale)
+# ============================================================================
+cat > /etc/systemd/system/agrisecure-watchdog.service << EOF
+[Unit]
+Description=AgriSecure Node Watchdog
+After=network.target postgresql.service redis.service
+
+[Service]
+Type=simple
+User=$USER
+Group=$USER
+WorkingDirectory=$BACKEND_DIR
+Environment="PATH=$VENV_DIR/bin"
+EnvironmentFile=$BACKEND_DIR/.env
+ExecStart=$VENV_DIR/bin/python manage.py node_watchdog
+Restart=always
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+print_success "Servizi systemd creati (inclusi Daphne e MQTT Subscriber)"
 
 # ============================================================================
 # Step 12: Configurazione Nginx
@@ -615,13 +638,21 @@ echo -e "${BLUE}Avvio servizi...${NC}"
 
 systemctl daemon-reload
 
+# Il bridge MQTT→WebSocket è stato integrato nel subscriber MQTT
+if [ -f /etc/systemd/system/agrisecure-mqtt-bridge.service ]; then
+    systemctl disable --now agrisecure-mqtt-bridge 2>/dev/null || true
+    rm -f /etc/systemd/system/agrisecure-mqtt-bridge.service
+    systemctl daemon-reload
+fi
+
 # Abilita tutti i servizi
 systemctl enable agrisecure-web
 systemctl enable agrisecure-daphne
-systemctl enable agrisecure-mqtt-bridge
 systemctl enable agrisecure-celery
 systemctl enable agrisecure-celery-beat
 systemctl enable agrisecure-mqtt
+systemctl enable agrisecure-outbox
+systemctl enable agrisecure-watchdog
 
 # Avvia servizi in ordine
 echo "  Avvio agrisecure-web..."
@@ -632,10 +663,6 @@ echo "  Avvio agrisecure-daphne..."
 systemctl start agrisecure-daphne
 sleep 1
 
-echo "  Avvio agrisecure-mqtt-bridge..."
-systemctl start agrisecure-mqtt-bridge
-sleep 1
-
 echo "  Avvio agrisecure-celery..."
 systemctl start agrisecure-celery
 sleep 1
@@ -646,6 +673,14 @@ sleep 1
 
 echo "  Avvio agrisecure-mqtt..."
 systemctl start agrisecure-mqtt
+sleep 1
+
+echo "  Avvio agrisecure-outbox..."
+systemctl start agrisecure-outbox
+sleep 1
+
+echo "  Avvio agrisecure-watchdog..."
+systemctl start agrisecure-watchdog
 
 # Attendi che i servizi si stabilizzino
 sleep 3
@@ -660,7 +695,7 @@ echo -e "╚══════════════════════
 echo ""
 
 echo -e "${BLUE}Stato servizi:${NC}"
-for service in agrisecure-web agrisecure-daphne agrisecure-mqtt-bridge agrisecure-celery agrisecure-celery-beat agrisecure-mqtt; do
+for service in agrisecure-web agrisecure-daphne agrisecure-celery agrisecure-celery-beat agrisecure-mqtt agrisecure-outbox agrisecure-watchdog; do
     if systemctl is-active --quiet $service; then
         echo -e "  ${GREEN}✓${NC} $service: ${GREEN}attivo${NC}"
     else
@@ -719,7 +754,7 @@ echo -e "${BLUE}Comandi utili:${NC}"
 echo -e "  Stato servizi:     ${GREEN}systemctl status agrisecure-*${NC}"
 echo -e "  Log web:           ${GREEN}journalctl -u agrisecure-web -f${NC}"
 echo -e "  Log WebSocket:     ${GREEN}journalctl -u agrisecure-daphne -f${NC}"
-echo -e "  Log MQTT Bridge:   ${GREEN}journalctl -u agrisecure-mqtt-bridge -f${NC}"
+echo -e "  Log MQTT:          ${GREEN}journalctl -u agrisecure-mqtt -f${NC}"
 echo -e "  Riavvia tutto:     ${GREEN}systemctl restart agrisecure-*${NC}"
 echo ""
 echo -e "${BLUE}Test WebSocket:${NC}"
@@ -70,12 +70,16 @@ Group=$USER
 WorkingDirectory=$BACKEND_DIR
 Environment="PATH=$VENV_DIR/bin"
 EnvironmentFile=$BACKEND_DIR/.env
-ExecStart=$VENV_DIR/bin/celery -A agrisecure multi start worker \\
+# Un worker per coda (routing in CELERY_TASK_ROUTES)
+ExecStart=$VENV_DIR/bin/celery -A agrisecure multi start alarms default bulk \\
+    -Q:alarms alarms -c:alarms 4 \\
+    -Q:default default -c:default 2 \\
+    -Q:bulk maintenance,reports -c:bulk 1 \\
+    --prefetch-multiplier=1 \\
     --pidfile=$BACKEND_DIR/logs/celery-%n.pid \\
     --logfile=$BACKEND_DIR/logs/celery-%n.log \\
-    --loglevel=INFO \\
-    --concurrency=2
-ExecStop=$VENV_DIR/bin/celery -A agrisecure multi stopwait worker \\
+    --loglevel=INFO
+ExecStop=$VENV_DIR/bin/celery -A agrisecure multi stopwait alarms default bulk \\
     --pidfile=$BACKEND_DIR/logs/celery-%n.pid
 Restart=always
 RestartSec=10
@@ -137,6 +141,52 @@ RestartSec=10
 WantedBy=multi-user.target
 EOF
 
+# ============================================
+# Servizio Outbox Relay
+# ============================================
+sudo tee /etc/systemd/system/agrisecure-outbox.service > /dev/null << EOF
+[Unit]
+Description=AgriSecure Outbox Relay
+After=network.target postgresql.service mosquitto.service redis.service
+
+[Service]
+Type=simple
+User=$USER
+Group=$USER
+WorkingDirectory=$BACKEND_DIR
+Environment="PATH=$VENV_DIR/bin"
+EnvironmentFile=$BACKEND_DIR/.env
+ExecStart=$VENV_DIR/bin/python manage.py outbox_relay
+Restart=always
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+# ============================================
+# Servizio Node Watchdog
+# ============================================
+sudo tee /etc/systemd/system/agrisecure-watchdog.service > /dev/null << EOF
+[Unit]
+Description=AgriSecure Node Watchdog
+After=network.target postgresql.service redis.service
+
+[Service]
+Type=simple
+User=$USER
+Group=$USER
+WorkingDirectory=$BACKEND_DIR
+Environment="PATH=$VENV_DIR/bin"
+EnvironmentFile=$BACKEND_DIR/.env
+ExecStart=$VENV_DIR/bin/python manage.py node_watchdog
+Restart=always
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 # ============================================
 # Configurazione Nginx
 # ============================================
@@ -223,6 +273,8 @@ sudo systemctl enable agrisecure-web
 sudo systemctl enable agrisecure-celery
 sudo systemctl enable agrisecure-celery-beat
 sudo systemctl enable agrisecure-mqtt
+sudo systemctl enable agrisecure-outbox
+sudo systemctl enable agrisecure-watchdog
 
 # Riavvia Nginx
 sudo systemctl restart nginx
@@ -236,6 +288,8 @@ echo -e "Comandi utili:"
 echo -e "  ${YELLOW}sudo systemctl start agrisecure-web${NC}      # Avvia Django"
 echo -e "  ${YELLOW}sudo systemctl start agrisecure-celery${NC}   # Avvia Celery"
 echo -e "  ${YELLOW}sudo systemctl start agrisecure-mqtt${NC}     # Avvia MQTT Subscriber"
+echo -e "  ${YELLOW}sudo systemctl start agrisecure-outbox${NC}   # Avvia Outbox Relay"
+echo -e "  ${YELLOW}sudo systemctl start agrisecure-watchdog${NC} # Avvia Node Watchdog"
 echo ""
 echo -e "  ${YELLOW}sudo systemctl status agrisecure-*${NC}       # Stato tutti i servizi"
 echo -e "  ${YELLOW}sudo journalctl -u agrisecure-web -f${NC}     # Log in tempo reale"
@@ -7,6 +7,8 @@ sudo systemctl start agrisecure-web
 sudo systemctl start agrisecure-celery
 sudo systemctl start agrisecure-celery-beat
 sudo systemctl start agrisecure-mqtt
+sudo systemctl start agrisecure-outbox
+sudo systemctl start agrisecure-watchdog
 
 sleep 2
 
@@ -16,6 +18,8 @@ sudo systemctl status agrisecure-web --no-pager -l | head -5
 sudo systemctl status agrisecure-celery --no-pager -l | head -5
 sudo systemctl status agrisecure-celery-beat --no-pager -l | head -5
 sudo systemctl status agrisecure-mqtt --no-pager -l | head -5
+sudo systemctl status agrisecure-outbox --no-pager -l | head -5
+sudo systemctl status agrisecure-watchdog --no-pager -l | head -5
 
 echo ""
 echo "Tutti i servizi avviati!"
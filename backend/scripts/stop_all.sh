@@ -3,6 +3,8 @@
 
 echo "Arresto servizi AgriSecure..."
 
+sudo systemctl stop agrisecure-watchdog
+sudo systemctl stop agrisecure-outbox
 sudo systemctl stop agrisecure-mqtt
 sudo systemctl stop agrisecure-celery-beat
 sudo systemctl stop agrisecure-celery